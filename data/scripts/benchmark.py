@@ -0,0 +1,76 @@
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+import numpy as np
+from context_index import build_context_index
+from corpus_stream import count_words
+
+
+def zipf_corpus(num_tokens, vocab_size, seed=0):
+    rng = np.random.RandomState(seed)
+    return ((rng.zipf(1.1, num_tokens) - 1) % vocab_size).astype(np.int32)
+
+
+def benchmark_contexts(sizes=(10 ** 5, 10 ** 6, 10 ** 7), vocab_size=50000, window_size=5):
+    """Context indexing time should grow linearly with the corpus size."""
+    print('%12s %10s %12s' % ('tokens', 'seconds', 'ns/token'))
+    for size in sizes:
+        idtext = zipf_corpus(size, vocab_size)
+        start = time.time()
+        build_context_index(idtext, vocab_size, window_size)
+        elapsed = time.time() - start
+        print('%12d %10.3f %12.1f' % (size, elapsed, elapsed * 1e9 / size))
+
+
+def write_text_corpus(path, num_tokens, vocab_size=50000, line_length=1000):
+    with open(path, 'w') as f:
+        for start in range(0, num_tokens, line_length):
+            ids = zipf_corpus(min(line_length, num_tokens - start), vocab_size, seed=start)
+            f.write(' '.join('w%d' % i for i in ids) + '\n')
+
+
+def peak_rss(mode, path, chunk_bytes):
+    """Counts words in a fresh process and returns its peak RSS in MB."""
+    out = subprocess.check_output([sys.executable, os.path.abspath(__file__), '_rss', mode, path, str(chunk_bytes)])
+    return int(out) / 1024.0
+
+
+def benchmark_stream(num_tokens=2 * 10 ** 7, chunk_sizes=(1 << 20, 16 << 20, 64 << 20)):
+    """Peak RSS of read().split() against the streaming reader."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'corpus.txt')
+        write_text_corpus(path, num_tokens)
+        print('corpus: %d tokens, %.1f MB' % (num_tokens, os.path.getsize(path) / 2.0 ** 20))
+        print('%-24s %14s' % ('reader', 'peak RSS (MB)'))
+        print('%-24s %14.1f' % ('read().split()', peak_rss('split', path, 0)))
+        for chunk_bytes in chunk_sizes:
+            print('%-24s %14.1f' % ('stream %d MB chunks' % (chunk_bytes >> 20), peak_rss('stream', path, chunk_bytes)))
+
+
+def _rss(mode, path, chunk_bytes):
+    if mode == 'split':
+        with open(path, 'r') as f:
+            Counter(f.read().split())
+    else:
+        count_words(path, int(chunk_bytes))
+    print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+
+
+BENCHMARKS = {
+    'contexts': benchmark_contexts,
+    'stream': benchmark_stream,
+}
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 5 and sys.argv[1] == '_rss':
+        _rss(*sys.argv[2:])
+        exit()
+    if len(sys.argv) < 2 or sys.argv[1] not in BENCHMARKS:
+        print('Usage: benchmark.py <%s>' % '|'.join(sorted(BENCHMARKS)))
+        exit()
+    BENCHMARKS[sys.argv[1]]()
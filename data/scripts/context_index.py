@@ -0,0 +1,47 @@
+import numpy as np
+
+
+def window_offsets(window_size):
+    return list(range(-window_size, 0)) + list(range(1, window_size + 1))
+
+
+def build_context_index(idtext, vocab_size, window_size):
+    """Groups the context windows of an id-encoded corpus by center word.
+
+    Walks the corpus once: center positions are bucketed by word with a stable
+    (radix) argsort, and each context is scattered straight into its word's
+    block. Returns (indptr, contexts) in CSR layout, where
+    contexts[indptr[w]:indptr[w + 1]] holds the neighbours of word w, offset by
+    offset (-window_size .. window_size), each offset listing the occurrences
+    of w in corpus order. Centers with a negative (out of vocabulary) id and the
+    window_size words at either end of the corpus are not indexed.
+    """
+    idtext = np.asarray(idtext)
+    span = 2 * window_size
+    n = max(0, len(idtext) - span)
+    centers = idtext[window_size:window_size + n]
+
+    order = np.argsort(centers, kind='stable')
+    order = order[np.count_nonzero(centers < 0):]
+    words = centers[order]
+
+    counts = np.bincount(words, minlength=vocab_size)
+    offsets = np.zeros(vocab_size + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+
+    # Occurrence q of word w, offset row r lands at span * offsets[w] + r * counts[w] + q.
+    base = span * offsets[words] + (np.arange(len(order)) - offsets[words])
+    stride = counts[words]
+    del words
+
+    contexts = np.empty(span * len(order), dtype=idtext.dtype)
+    for r, d in enumerate(window_offsets(window_size)):
+        contexts[base + r * stride] = idtext[order + (window_size + d)]
+    return span * offsets, contexts
+
+
+def extract_contexts(idtext, word_ids, window_size):
+    """Returns {word id: list of context ids} for every id in word_ids."""
+    vocab_size = max(word_ids) + 1 if len(word_ids) else 0
+    indptr, contexts = build_context_index(idtext, vocab_size, window_size)
+    return {w: contexts[indptr[w]:indptr[w + 1]].tolist() for w in word_ids}
@@ -0,0 +1,86 @@
+import numpy as np
+import scipy.sparse as sp
+from context_index import window_offsets
+
+
+class PairCounter(object):
+    """Counts int64 keys held in numpy arrays.
+
+    Updates are buffered and folded into sorted (keys, counts) arrays once
+    max_pending keys are waiting, so memory stays proportional to the number
+    of distinct keys plus the buffer.
+    """
+
+    def __init__(self, max_pending=1 << 24):
+        self.max_pending = max_pending
+        self._keys = np.zeros(0, dtype=np.int64)
+        self._counts = np.zeros(0, dtype=np.int64)
+        self._pending = []
+        self._num_pending = 0
+
+    def update(self, keys, counts=None):
+        keys = np.asarray(keys, dtype=np.int64)
+        if counts is None:
+            counts = np.ones(len(keys), dtype=np.int64)
+        self._pending.append((keys, np.asarray(counts, dtype=np.int64)))
+        self._num_pending += len(keys)
+        if self._num_pending >= self.max_pending:
+            self.compact()
+
+    def compact(self):
+        if not self._pending:
+            return
+        keys = np.concatenate([self._keys] + [k for k, _ in self._pending])
+        counts = np.concatenate([self._counts] + [c for _, c in self._pending])
+        self._pending, self._num_pending = [], 0
+        self._keys, inverse = np.unique(keys, return_inverse=True)
+        self._counts = np.bincount(inverse.ravel(), weights=counts, minlength=len(self._keys)).astype(np.int64)
+
+    def arrays(self):
+        """Sorted unique keys and their counts."""
+        self.compact()
+        return self._keys, self._counts
+
+
+def window_pair_keys(ids, vocab_size, window_size):
+    """center * vocab_size + context for every in-vocabulary pair whose center
+    lies in ids[window_size:-window_size]."""
+    n = max(0, len(ids) - 2 * window_size)
+    centers = ids[window_size:window_size + n].astype(np.int64)
+    keys = []
+    for d in window_offsets(window_size):
+        contexts = ids[window_size + d:window_size + d + n]
+        valid = (centers >= 0) & (contexts >= 0)
+        keys.append(centers[valid] * vocab_size + contexts[valid])
+    return np.concatenate(keys) if keys else np.zeros(0, dtype=np.int64)
+
+
+def count_cooccurrences(id_chunks, vocab_size, window_size, max_pending=1 << 24):
+    """Sparse [vocab_size, vocab_size] window co-occurrence counts.
+
+    id_chunks are consecutive pieces of one corpus as vocab ids (-1 for
+    unknown words). Row w counts the words seen within window_size of w,
+    exactly like the context lists of extract_labels, in CSR format.
+    """
+    counter = PairCounter(max_pending)
+    carry = np.zeros(0, dtype=np.int32)
+    for chunk in id_chunks:
+        ids = np.concatenate([carry, chunk])
+        counter.update(window_pair_keys(ids, vocab_size, window_size))
+        carry = ids[max(0, len(ids) - 2 * window_size):]
+    keys, counts = counter.arrays()
+    return sp.csr_matrix((counts, (keys // vocab_size, keys % vocab_size)), shape=(vocab_size, vocab_size))
+
+
+def save_cooccurrence(path, matrix):
+    sp.save_npz(path, matrix.tocsr())
+
+
+def load_cooccurrence(path):
+    return sp.load_npz(path).tocsr()
+
+
+def row_counts(matrix, word):
+    """(context ids, counts) of one row of a CSR matrix, without densifying."""
+    start, end = matrix.indptr[word], matrix.indptr[word + 1]
+    return matrix.indices[start:end], matrix.data[start:end]
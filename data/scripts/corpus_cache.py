@@ -0,0 +1,123 @@
+"""Binary token-id cache of a text corpus.
+
+For a corpus at <path> the cache is three files next to it:
+    <path>.ids.npy      uint32 word id of every token, memory-mappable
+    <path>.vocab.txt    "b'word' count" per line, most frequent first
+    <path>.cache.json   source size, mtime and sha1, the min_count and the tokenizer
+Id 0 is UNK and the word on line i of the vocab has id i + 1, the same layout
+the skipgram_word2vec op uses. The cache is rebuilt whenever the source
+content, min_count or tokenizer changes. models/tf_default/corpus.py reads and
+writes the same files, splitting words the same way under the same tag.
+"""
+import hashlib
+import json
+import os
+import numpy as np
+from corpus_stream import DEFAULT_CHUNK_BYTES, iter_tokens
+from vocab_builder import count_words_parallel, read_vocab_counts, sorted_vocab, write_vocab
+
+UNK_ID = 0
+
+# Words split on ASCII whitespace like the skipgram_word2vec op, see
+# corpus_stream.split_tokens.
+TOKENIZER = 'ascii-whitespace'
+
+
+def cache_paths(path):
+    return path + '.ids.npy', path + '.vocab.txt', path + '.cache.json'
+
+
+def file_sha1(path, block_bytes=DEFAULT_CHUNK_BYTES):
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_bytes), b''):
+            sha1.update(block)
+    return sha1.hexdigest()
+
+
+def read_cache_vocab(vocab_path):
+    with open(vocab_path, 'r') as f:
+        words, counts = read_vocab_counts(f)
+    return words, np.array(counts, dtype=np.int64)
+
+
+def encode_corpus(path, min_count, chunk_bytes=DEFAULT_CHUNK_BYTES, processes=None):
+    ids_path, vocab_path, meta_path = cache_paths(path)
+    stat = os.stat(path)
+
+    print('encoding', path)
+    counts = count_words_parallel(path, processes, chunk_bytes)
+    num_tokens = sum(counts.values())
+    vocab = sorted_vocab(counts, min_count)
+    del counts
+    word_id = {w: i + 1 for i, (w, _) in enumerate(vocab)}
+
+    with open(vocab_path + '.tmp', 'w') as f:
+        write_vocab(vocab, f)
+
+    ids = np.lib.format.open_memmap(ids_path + '.tmp', mode='w+', dtype=np.uint32, shape=(num_tokens,))
+    pos = 0
+    for tokens in iter_tokens(path, chunk_bytes):
+        ids[pos:pos + len(tokens)] = [word_id.get(w, UNK_ID) for w in tokens]
+        pos += len(tokens)
+    ids.flush()
+    del ids
+
+    meta = {
+        'source_size': stat.st_size,
+        'source_mtime': stat.st_mtime_ns,
+        'source_sha1': file_sha1(path),
+        'min_count': min_count,
+        'tokenizer': TOKENIZER,
+        'num_tokens': num_tokens,
+        'vocab_size': len(vocab),
+    }
+    os.replace(ids_path + '.tmp', ids_path)
+    os.replace(vocab_path + '.tmp', vocab_path)
+    with open(meta_path, 'w') as f:
+        json.dump(meta, f)
+    print('encoded %d tokens, %d words with count >= %d' % (num_tokens, len(vocab), min_count))
+
+
+def is_cache_valid(path, min_count):
+    ids_path, vocab_path, meta_path = cache_paths(path)
+    if not all(os.path.isfile(p) for p in (ids_path, vocab_path, meta_path)):
+        return False
+    with open(meta_path, 'r') as f:
+        meta = json.load(f)
+    stat = os.stat(path)
+    if (meta.get('tokenizer') != TOKENIZER or meta['min_count'] != min_count or
+            meta['source_size'] != stat.st_size):
+        return False
+    if meta['source_mtime'] != stat.st_mtime_ns:
+        # Touched but maybe not changed: trust the content hash.
+        if meta['source_sha1'] != file_sha1(path):
+            return False
+        meta['source_mtime'] = stat.st_mtime_ns
+        with open(meta_path, 'w') as f:
+            json.dump(meta, f)
+    return True
+
+
+def load_corpus(path, min_count, chunk_bytes=DEFAULT_CHUNK_BYTES, processes=None):
+    """Opens the cached corpus of path, encoding it first if the cache is stale.
+
+    Returns (ids, words, counts): ids is a read-only uint32 memory map of the
+    corpus, words[i] and counts[i] describe word id i + 1.
+    """
+    if not is_cache_valid(path, min_count):
+        encode_corpus(path, min_count, chunk_bytes, processes)
+    ids_path, vocab_path, _ = cache_paths(path)
+    words, counts = read_cache_vocab(vocab_path)
+    return np.load(ids_path, mmap_mode='r'), words, counts
+
+
+def vocab_ids(ids):
+    """Shifts cache ids to vocab line ids, with -1 for unknown words."""
+    return ids.astype(np.int32) - 1
+
+
+def iter_vocab_id_chunks(ids, chunk_tokens=1 << 24):
+    """Yields consecutive slices of ids as vocab line ids (see vocab_ids)."""
+    for start in range(0, len(ids), chunk_tokens):
+        yield vocab_ids(ids[start:start + chunk_tokens])
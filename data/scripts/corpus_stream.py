@@ -0,0 +1,92 @@
+import mmap
+import os
+import re
+from collections import Counter
+from contextlib import contextmanager
+import numpy as np
+
+DEFAULT_CHUNK_BYTES = 8 * 1024 * 1024
+
+_whitespace = re.compile(br'\s')
+
+
+@contextmanager
+def open_corpus(path):
+    """Memory-maps a corpus file read-only (an empty file maps to b'')."""
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            yield b''
+            return
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            yield mm
+        finally:
+            mm.close()
+
+
+def iter_chunk_bounds(data, chunk_bytes=DEFAULT_CHUNK_BYTES, start=0, stop=None):
+    """Yields (start, end) byte ranges of about chunk_bytes that never split a word.
+
+    A chunk ends after the last newline in its range, or after the last space if
+    the range holds no newline. A word longer than chunk_bytes gets a chunk of
+    its own.
+    """
+    size = len(data) if stop is None else stop
+    while start < size:
+        end = min(start + chunk_bytes, size)
+        if end < size:
+            cut = data.rfind(b'\n', start, end)
+            if cut < 0:
+                cut = max(data.rfind(b' ', start, end), data.rfind(b'\t', start, end))
+            if cut < 0:
+                match = _whitespace.search(data, end, size)
+                cut = match.start() if match else size - 1
+            end = cut + 1
+        yield start, end
+        start = end
+
+
+def release_pages(data, start, end):
+    """Drops the mapped pages of an already consumed byte range from RSS."""
+    if isinstance(data, mmap.mmap) and hasattr(mmap, 'MADV_DONTNEED'):
+        start -= start % mmap.PAGESIZE
+        end -= end % mmap.PAGESIZE
+        if end > start:
+            data.madvise(mmap.MADV_DONTNEED, start, end - start)
+
+
+def split_tokens(text):
+    """str tokens of utf-8 bytes split on ASCII whitespace, as the skipgram op splits.
+
+    Splitting the decoded str instead would also break words on Unicode
+    spaces, giving other words than the ones the models train on.
+    """
+    return [w.decode('utf-8') for w in text.split()]
+
+
+def iter_tokens(path, chunk_bytes=DEFAULT_CHUNK_BYTES):
+    """Yields the corpus as lists of str tokens, one list per chunk."""
+    with open_corpus(path) as data:
+        for start, end in iter_chunk_bounds(data, chunk_bytes):
+            text = data[start:end]
+            release_pages(data, start, end)
+            yield split_tokens(text)
+
+
+def iter_id_chunks(path, word_id, chunk_bytes=DEFAULT_CHUNK_BYTES):
+    """Yields the corpus as int32 arrays of word ids, -1 for unknown words."""
+    for tokens in iter_tokens(path, chunk_bytes):
+        yield np.array([word_id.get(w, -1) for w in tokens], dtype=np.int32)
+
+
+def read_ids(path, word_id, chunk_bytes=DEFAULT_CHUNK_BYTES):
+    """The whole corpus as one int32 id array (4 bytes per token)."""
+    chunks = list(iter_id_chunks(path, word_id, chunk_bytes))
+    return np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.int32)
+
+
+def count_words(path, chunk_bytes=DEFAULT_CHUNK_BYTES):
+    counts = Counter()
+    for tokens in iter_tokens(path, chunk_bytes):
+        counts.update(tokens)
+    return counts
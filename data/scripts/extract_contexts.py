@@ -1,129 +1,178 @@
 import argparse
-import spacy
-from spacy.en import English
+import itertools
 import gzip
-from collections import Counter
+from multiprocessing import Pool
+from threading import BoundedSemaphore
 import numpy as np
-import math
+import spacy
+from cooccurrence import PairCounter
+from lmi import lmi_values
+
+CATEGORIES = ('noun', 'verb', 'adj')
+TAG_CATEGORY = {'NN': 0, 'VB': 1, 'JJ': 2}
+LOW_BITS = (1 << 32) - 1
+
+_nlp = None
+
+
+def load_tagger(model):
+    """spaCy pipeline with only the tagger (and what it listens to) enabled,
+    plus a rule-based sentencizer in place of the parser."""
+    nlp = spacy.load(model)
+    nlp.select_pipes(enable=[name for name in nlp.pipe_names if name in ('tok2vec', 'tagger')])
+    nlp.add_pipe('sentencizer')
+    return nlp
+
+
+def _init_worker(model):
+    global _nlp
+    _nlp = load_tagger(model)
+
+
+def read_paragraphs(path):
+    with open(path, 'r') as fin:
+        for paragraph in fin:
+            paragraph = paragraph.strip()
+            if paragraph:
+                yield paragraph
+
+
+def iter_batches(items, size):
+    items = iter(items)
+    while True:
+        batch = list(itertools.islice(items, size))
+        if not batch:
+            return
+        yield batch
+
+
+def bounded(items, semaphore):
+    """Lets items through only while the semaphore has room, so a Pool does
+    not read the whole corpus into its task queue ahead of the workers."""
+    for item in items:
+        semaphore.acquire()
+        yield item
+
+
+def pack_pairs(targets, contexts):
+    return (np.asarray(targets, dtype=np.int64) << 32) | np.asarray(contexts, dtype=np.int64)
+
+
+def unpack_pairs(keys):
+    return keys >> 32, keys & LOW_BITS
+
+
+def count_paragraphs(args):
+    """Counts one batch of paragraphs with ids local to the batch.
+
+    Returns (len(paragraphs), words, arrays): words[i] is the word of local
+    id i and arrays holds sorted (keys, counts) for the noun, verb and adj
+    pairs followed by (ids, counts) of the word frequencies.
+    """
+    paragraphs, window_size, batch_size, max_pending = args
+    local_ids = {}
+    counters = [PairCounter(max_pending) for _ in range(len(CATEGORIES) + 1)]
+    for doc in _nlp.pipe(paragraphs, batch_size=batch_size):
+        pairs, freq = [[] for _ in CATEGORIES], []
+        for sent in doc.sents:
+            process_one_sentence(sent, window_size, local_ids, pairs, freq)
+        for counter, keys in zip(counters, pairs + [freq]):
+            counter.update(keys)
+    return len(paragraphs), list(local_ids), [counter.arrays() for counter in counters]
+
 
 def main():
     """
     TODO: extracts the relation between target and contexts in the window-size and computes LMI
-    Usage: python create_contexts.py -input <corpus_name> -output <output-file-name>
+    Usage: python extract_contexts.py -input <corpus_name> -output <output-file-name>
+        [-model en_core_web_sm] [-n_process N] [-batch_size B] [-log_every P]
     """
     parser = argparse.ArgumentParser()
     parser.add_argument('-input', type=str)
     parser.add_argument('-output', type=str)
+    parser.add_argument('-model', type=str, default='en_core_web_sm')
+    parser.add_argument('-n_process', type=int, default=1, help='parser processes')
+    parser.add_argument('-batch_size', type=int, default=256, help='paragraphs per nlp.pipe batch')
+    parser.add_argument('-task_size', type=int, default=4096, help='paragraphs handed to a process at a time')
+    parser.add_argument('-log_every', type=int, default=10000, help='report progress every this many paragraphs')
+    parser.add_argument('-max_pending', type=int, default=1 << 24, help='keys buffered before a counter is compacted')
     args = parser.parse_args()
     
-    nlp = English()
-    
     window_size = 5
-    nouns = Counter()
-    verbs = Counter()
-    adjectives = Counter()
-    freqs = Counter()
+    vocab = {}
+    counters = [PairCounter(args.max_pending) for _ in range(len(CATEGORIES) + 1)]
     
     output_dir = ''
-    with open(args.input,'r') as fin:
-        para_num = 0
-        # Read each paragraph in corpus
-        for paragraph in fin:
-            # Check empty paragraph
-            paragraph = paragraph.strip()
-            if len(paragraph) == 0: continue
-            para_num += 1
-            print('Processing para: %d' %para_num)
-            # Parse each sentence
-            parsed_para = nlp(str(paragraph))
-            for sent in parsed_para.sents:
-                noun, verb, adj, freq = process_one_sentence(sent, window_size)
-                nouns.update(noun)
-                verbs.update(verb)
-                adjectives.update(adj)
-                freqs.update(freq)
+    tasks = ((batch, window_size, args.batch_size, args.max_pending) for batch in iter_batches(read_paragraphs(args.input), args.task_size))
+    in_flight = BoundedSemaphore(2 * args.n_process)
+    if args.n_process > 1:
+        pool = Pool(args.n_process, initializer=_init_worker, initargs=(args.model,))
+        results = pool.imap_unordered(count_paragraphs, bounded(tasks, in_flight))
+    else:
+        pool = None
+        _init_worker(args.model)
+        results = map(count_paragraphs, tasks)
+
+    para_num = 0
+    for num, words, arrays in results:
+        # Local batch ids to global ids, numbered in order of appearance.
+        remap = np.array([vocab.setdefault(w, len(vocab)) for w in words], dtype=np.int64)
+        for counter, (keys, counts) in zip(counters, arrays[:-1]):
+            targets, contexts = unpack_pairs(keys)
+            counter.update(pack_pairs(remap[targets], remap[contexts]), counts)
+        counters[-1].update(remap[arrays[-1][0]], arrays[-1][1])
+        if pool is not None:
+            in_flight.release()
+        if (para_num + num) // args.log_every > para_num // args.log_every:
+            print('Processed paras: %d' % (para_num + num))
+        para_num += num
+    if pool is not None:
+        pool.close()
+        pool.join()
                 
-    print('Parsing corpus done....!')
+    print('Parsing corpus done (%d paras)....!' % para_num)
     
-    new_nouns, new_verbs, new_adjectives = calc_lmi(nouns, verbs, adjectives, freqs) 
+    freq_ids, freq_counts = counters[-1].arrays()
+    freqs = np.zeros(len(vocab), dtype=np.int64)
+    freqs[freq_ids] = freq_counts
+    scored = calc_lmi([counter.arrays() for counter in counters[:-1]], freqs)
     print('Computing LMI done.....!')
     # Write to file
-    with gzip.open(output_dir  + args.output + '_noun', 'wb') as fnoun:
-        for pair, value in new_nouns.items():
-            st = '\t'.join([pair[0], pair[1], '\t'.join([str(value[0]), str(value[1])])])
-            fnoun.write(st + '\n')
-        
-    with gzip.open(output_dir  + args.output + '_verb', 'wb') as fverb:
-        for pair, value in new_verbs.items():
-            st = '\t'.join([pair[0], pair[1], '\t'.join([str(value[0]), str(value[1])])])
-            fverb.write(st + '\n')
-            
-    with gzip.open(output_dir  + args.output + '_adj', 'wb') as fadj:
-        for pair, value in new_adjectives.items():
-            st = '\t'.join([pair[0], pair[1], '\t'.join([str(value[0]), str(value[1])])])
-            fadj.write(st + '\n')
+    words = list(vocab)
+    for category, (keys, counts, lmi) in zip(CATEGORIES, scored):
+        with gzip.open(output_dir + args.output + '_' + category, 'wt') as fout:
+            targets, contexts = unpack_pairs(keys)
+            for t, c, value, score in zip(targets.tolist(), contexts.tolist(), counts.tolist(), lmi.tolist()):
+                fout.write('\t'.join([words[t], words[c], str(value), str(score)]) + '\n')
             
     print('Done.........!')
                     
                     
-def process_one_sentence(sent, window_size):
-    noun = Counter()
-    verb = Counter()
-    adj = Counter()
-    freq = Counter()
+def process_one_sentence(sent, window_size, word_ids, pairs, freq):
+    """Appends the packed (target, context) keys of the noun, verb and adj
+    window pairs of sent to pairs[0..2] and both ids of each pair to freq.
+    word_ids maps words to ids and is extended with unseen words."""
+    ids = [word_ids.setdefault(token.text, len(word_ids)) for token in sent]
     
     for idx,token in enumerate(sent):
-        if token.tag_[:2] == 'NN' and len(token.string.strip()) > 2:
-            for idw in range(idx-window_size, idx+window_size):
-                if idw != idx and idw >= 0 and idw < len(sent): 
-                    noun[(sent[idx], sent[idw])] += 1
-                    freq[sent[idx]] += 1
-                    freq[sent[idw]] += 1
-                    
-        elif token.tag_[:2] == 'VB' and len(token.string.strip()) > 2:
-            for idw in range(idx-window_size, idx+window_size):
-                if idw != idx and idw >= 0 and idw < len(sent): 
-                    verb[(sent[idx], sent[idw])] += 1
-                    freq[sent[idx]] += 1
-                    freq[sent[idw]] += 1
-                    
-        elif token.tag_[:2] == 'JJ' and len(token.string.strip()) > 2:
-            for idw in range(idx-window_size, idx+window_size):
-                if idw != idx and idw >= 0 and idw < len(sent): 
-                    adj[(sent[idx], sent[idw])] += 1
-                    freq[sent[idx]] += 1
-                    freq[sent[idw]] += 1
-                    
-    return noun, verb, adj, freq
+        category = TAG_CATEGORY.get(token.tag_[:2])
+        if category is None or len(token.text.strip()) <= 2:
+            continue
+        for idw in range(max(0, idx-window_size), min(len(sent), idx+window_size)):
+            if idw != idx:
+                pairs[category].append((ids[idx] << 32) | ids[idw])
+                freq.append(ids[idx])
+                freq.append(ids[idw])
 
-def calc_lmi(nouns, verbs, adjectives, freqs):
-    total_freqs = np.sum(list(freqs.values()))
-    
-    for pair, value in nouns.items():
-        o_11 = value
-        r_1 = freqs[pair[0]]
-        c_1 = freqs[pair[1]]
-        e_11 = (r_1 * c_1) / float(total_freqs)
-        lmi = o_11 * math.log(o_11 / e_11)
-        nouns[pair] = [value, lmi]
-    
-    for pair, value in verbs.items():
-        o_11 = value
-        r_1 = freqs[pair[0]]
-        c_1 = freqs[pair[1]]
-        e_11 = (r_1 * c_1) / float(total_freqs)
-        lmi = o_11 * math.log(o_11 / e_11)
-        verbs[pair] = [value, lmi] 
-    
-    for pair, value in adjectives.items():
-        o_11 = value
-        r_1 = freqs[pair[0]]
-        c_1 = freqs[pair[1]]
-        e_11 = (r_1 * c_1) / float(total_freqs)
-        lmi = o_11 * math.log(o_11 / e_11)
-        adjectives[pair] = [value, lmi]
-        
-    return nouns, verbs, adjectives
+def calc_lmi(pairs, freqs):
+    """[(keys, counts, lmi)] for every (keys, counts) in pairs, with the
+    target and context marginals taken from the freqs array."""
+    total_freqs = freqs.sum()
+    scored = []
+    for keys, counts in pairs:
+        targets, contexts = unpack_pairs(keys)
+        scored.append((keys, counts, lmi_values(counts, freqs[targets], freqs[contexts], total_freqs)))
+    return scored
 
 if __name__=='__main__':
     main()
@@ -3,24 +3,56 @@ import os
 import numpy as np
 import sys
 import pickle
-import spacy
-from spacy.attrs import ORTH
-from itertools import product
-from collections import Counter
-
-
-def get_syn(words, quiet=False):
-    syns = {}
-    for w in words:
-        synlist = []
-        for ss in wn.synsets(w):
-            sl = []
-            for l in ss.lemmas():
-                ll = l.name()
-                if ll in words:
-                    sl.append(ll)
-            synlist.append(sl)
-        syns[w] = list(set(sum(synlist, [])))
+from functools import lru_cache
+from multiprocessing import Pool
+from context_index import extract_contexts
+from corpus_cache import cache_paths, load_corpus, vocab_ids
+from vocab_builder import write_vocab
+
+MIN_COUNT = 100
+
+
+_vocab = frozenset()
+
+
+def _set_vocab(words):
+    global _vocab
+    _vocab = frozenset(words)
+
+
+@lru_cache(maxsize=None)
+def synset_lemmas(word):
+    """Every lemma of every WordNet synset of word."""
+    return tuple(l for ss in wn.synsets(word) for l in ss.lemmas())
+
+
+def _syn_shard(words):
+    return {w: sorted(set(l.name() for l in synset_lemmas(w)) & _vocab) for w in words}
+
+
+def _ant_shard(words):
+    # The former get_syn([antonym]) lookup could only ever match the antonym
+    # itself, so the antonym lemma names are the whole result.
+    return {w: sorted(set(a.name() for l in synset_lemmas(w) for a in l.antonyms()) & _vocab) for w in words}
+
+
+def map_vocab_shards(shard_fn, words, processes=None, shard_size=1000):
+    """Runs shard_fn over slices of words in a process pool and merges the dicts in words order."""
+    shards = [words[i:i + shard_size] for i in range(0, len(words), shard_size)]
+    result = {}
+    if processes == 1 or len(shards) < 2:
+        _set_vocab(words)
+        for shard in shards:
+            result.update(shard_fn(shard))
+    else:
+        with Pool(processes or os.cpu_count(), initializer=_set_vocab, initargs=(words,)) as pool:
+            for part in pool.imap_unordered(shard_fn, shards):
+                result.update(part)
+    return {w: result[w] for w in words}
+
+
+def get_syn(words, quiet=False, processes=None):
+    syns = map_vocab_shards(_syn_shard, words, processes)
     vals = list(map(lambda x: len(x), syns.values()))
     if not quiet:
         print("extracted synonyms, mean %s, median %s, max %s" % (np.mean(vals), np.median(vals), max(vals)))
@@ -29,25 +61,8 @@ def get_syn(words, quiet=False):
     return syns, max(vals)
 
 
-def get_ant(words, quiet=False):
-    ants = {}
-    for w in words:
-        synlist = []
-        for ss in wn.synsets(w):
-            sl = []
-            for l in ss.lemmas():
-                for a in l.antonyms():
-                    ll = a.name()
-                    if ll in words:
-                        sl.append(ll)
-                    ant_syn = list(get_syn([ll], True)[0].values())[0]
-                    if len(ant_syn) > 1:
-                        print(len(ant_syn))
-                    for a_s in ant_syn:
-                        if a_s in words:
-                            sl.append(a_s)
-            synlist.append(sl)
-        ants[w] = list(set(sum(synlist, [])))
+def get_ant(words, quiet=False, processes=None):
+    ants = map_vocab_shards(_ant_shard, words, processes)
     vals = list(map(lambda x: len(x), ants.values()))
     if not quiet:
         print("extracted antonyms, mean %s, median %s, max %s" % (np.mean(vals), np.median(vals), max(vals)))
@@ -56,46 +71,17 @@ def get_ant(words, quiet=False):
     return ants, max(vals)
 
 
-def read_vocab(vocab_fd):
-    return list(map(lambda x: x.split(' ')[0], vocab_fd.readlines()))
-
-
-def get_context(text, i, window_size):
-    return text[i-1-window_size:i-1].tolist() + text[i+1:i+1+window_size].tolist()
-
-
-def extract_labels(vocab, text_fd, window_size):
+def extract_labels(vocab, ids, window_size):
     import time
     start = time.time()
-    text = text_fd.read().split()
 
-    print('text length:', len(text))
+    idtext = vocab_ids(ids)
+
+    print('text length:', len(idtext))
     print('vocab length:', len(vocab))
 
-    idword = {word: j for j, word in enumerate(vocab)}
-    idtext = list(map(lambda x: idword[x] if x in idword else -1, text))
-
-    print("creating array")
-    doc = np.array(list(zip([
-        idtext[:-10],
-        idtext[1:-9],
-        idtext[2:-8],
-        idtext[3:-7],
-        idtext[4:-6],
-        idtext[5:-5],
-        idtext[6:-4],
-        idtext[7:-3],
-        idtext[8:-2],
-        idtext[9:-1],
-        idtext[10:]
-    ]))).squeeze()
-
-    labels = {}
-
-    for j, word in enumerate(idword.values()):
-        if not j % 1000: print(j)
-        a = doc[:, np.where(doc[5, :] == word)[0]][[0,1,2,3,4,6,7,8,9,10], :]
-        labels[word] = a.reshape([1, a.shape[0] * a.shape[1]]).tolist()[0]
+    print("indexing contexts")
+    labels = extract_contexts(idtext, list(range(len(vocab))), window_size)
 
     print(time.time() - start)
 
@@ -104,29 +90,21 @@ def extract_labels(vocab, text_fd, window_size):
     return labels
 
 
-def build_vocab(text_fd, vocab_fd):
-    doc = text_fd.read().split()
-    counts = Counter(doc)
-    print(len(counts), 'unique words in corpus')
-    for word_id in doc:
-        if counts[word_id] >= 100:
-            vocab_fd.write(word_id + ' ' + str(counts[word_id]) + '\n')
-
-
 if __name__ == '__main__':
     if len(sys.argv) < 2:
-        print('Usage: extract_wn_syn_ant.py corpus_path.txt')
+        print('Usage: extract_wn_syn_ant.py [min_count] corpus_path.txt')
         exit()
     path = sys.argv[-1]
+    min_count = int(sys.argv[1]) if len(sys.argv) > 2 else MIN_COUNT
     path_dir = os.path.dirname(path)
 
-    vocab_name = 'vocab.txt'
-    if not os.path.isfile(os.path.join(path_dir, vocab_name)):
-        with open(os.path.join(path_dir, vocab_name), 'w') as vocab_fd, open(path, 'r') as text_fd:
-            build_vocab(text_fd, vocab_fd)
+    ids, words, counts = load_corpus(path, min_count)
 
-    with open(os.path.join(path_dir, vocab_name), 'r') as vocab_fd:
-        words = read_vocab(vocab_fd)
+    vocab_name = 'vocab.txt'
+    vocab_path = os.path.join(path_dir, vocab_name)
+    if not os.path.isfile(vocab_path) or os.path.getmtime(vocab_path) < os.path.getmtime(cache_paths(path)[1]):
+        with open(vocab_path, 'w') as vocab_fd:
+            write_vocab(zip(words, counts), vocab_fd)
 
     ant_name = 'ant.pickle'
     if not os.path.isfile(os.path.join(path_dir, ant_name)):
@@ -150,5 +128,5 @@ if __name__ == '__main__':
 
     # for pair in product(range(max_ants, max_syns)):
     #     print(pair)
-    with open(os.path.join(path_dir, 'context.pickle'), 'wb') as f, open(path, 'r') as text_fd:
-        pickle.dump(extract_labels(words, text_fd, 5), f)
+    with open(os.path.join(path_dir, 'context.pickle'), 'wb') as f:
+        pickle.dump(extract_labels(words, ids, 5), f)
@@ -0,0 +1,79 @@
+import os
+import sys
+import numpy as np
+import scipy.sparse as sp
+from cooccurrence import load_cooccurrence
+
+
+def lmi_values(o, r, c, total):
+    """Local mutual information o * log(o / e) with e = r * c / total, elementwise."""
+    o = np.asarray(o, dtype=np.float64)
+    e = np.asarray(r, dtype=np.float64) * np.asarray(c, dtype=np.float64) / float(total)
+    return o * np.log(o / e)
+
+
+def _entry_rows(matrix):
+    return np.repeat(np.arange(matrix.shape[0]), np.diff(matrix.indptr))
+
+
+def _with_data(matrix, data):
+    return sp.csr_matrix((data, matrix.indices.copy(), matrix.indptr.copy()), shape=matrix.shape)
+
+
+def marginals(counts):
+    """Row sums, column sums and grand total of a count matrix."""
+    return np.asarray(counts.sum(axis=1)).ravel(), np.asarray(counts.sum(axis=0)).ravel(), counts.sum()
+
+
+def calc_lmi(counts, top_k=None):
+    """Sparse LMI matrix with the same nonzeros as the co-occurrence counts."""
+    counts = sp.csr_matrix(counts)
+    counts.sum_duplicates()
+    r, c, total = marginals(counts)
+    lmi = _with_data(counts, lmi_values(counts.data, r[_entry_rows(counts)], c[counts.indices], total))
+    return prune_top_k(lmi, top_k) if top_k else lmi
+
+
+def calc_ppmi(counts, top_k=None):
+    """Sparse positive PMI, max(0, log(o * total / (r * c))), zeros dropped."""
+    counts = sp.csr_matrix(counts)
+    counts.sum_duplicates()
+    r, c, total = marginals(counts)
+    pmi = np.log(counts.data * float(total) / (r[_entry_rows(counts)].astype(np.float64) * c[counts.indices]))
+    ppmi = _with_data(counts, np.maximum(pmi, 0))
+    ppmi.eliminate_zeros()
+    return prune_top_k(ppmi, top_k) if top_k else ppmi
+
+
+def prune_top_k(matrix, k):
+    """Keeps the k largest entries of every row of a CSR matrix."""
+    rows = _entry_rows(matrix)
+    order = np.lexsort((-matrix.data, rows))
+    rank = np.arange(matrix.nnz) - matrix.indptr[rows[order]]
+    keep = np.sort(order[rank < k])
+    return sp.csr_matrix((matrix.data[keep], (rows[keep], matrix.indices[keep])), shape=matrix.shape)
+
+
+def lmi_path(path_dir, top_k=None):
+    return os.path.join(path_dir, 'lmi.npz' if not top_k else 'lmi_top%d.npz' % top_k)
+
+
+def load_or_compute_lmi(path_dir, top_k=None):
+    """Loads the cached LMI matrix of path_dir, recomputing it from
+    cooccurrence.npz when that is newer or the cache is missing."""
+    counts_path = os.path.join(path_dir, 'cooccurrence.npz')
+    path = lmi_path(path_dir, top_k)
+    if os.path.isfile(path) and os.path.getmtime(path) >= os.path.getmtime(counts_path):
+        return sp.load_npz(path).tocsr()
+    lmi = calc_lmi(load_cooccurrence(counts_path), top_k)
+    sp.save_npz(path, lmi)
+    return lmi
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print('Usage: lmi.py [top_k] vocabs_dir')
+        exit()
+    top_k = int(sys.argv[1]) if len(sys.argv) > 2 else None
+    lmi = load_or_compute_lmi(sys.argv[-1], top_k)
+    print(lmi.shape, lmi.nnz)
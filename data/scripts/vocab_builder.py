@@ -0,0 +1,72 @@
+import os
+import sys
+from collections import Counter
+from multiprocessing import Pool
+from corpus_stream import DEFAULT_CHUNK_BYTES, iter_chunk_bounds, open_corpus, split_tokens
+
+# The models own the vocab format's parser; appended so this directory's
+# modules still win on name clashes.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'models', 'tf_default'))
+from corpus import parse_vocab_word  # noqa: E402
+
+
+def _count_range(args):
+    path, start, end = args
+    with open_corpus(path) as data:
+        return Counter(split_tokens(data[start:end]))
+
+
+def count_words_parallel(path, processes=None, chunk_bytes=DEFAULT_CHUNK_BYTES):
+    """Counts the corpus words with one task per chunk spread over a process pool."""
+    with open_corpus(path) as data:
+        tasks = [(path, start, end) for start, end in iter_chunk_bounds(data, chunk_bytes)]
+    counts = Counter()
+    if processes == 1 or len(tasks) < 2:
+        for task in tasks:
+            counts.update(_count_range(task))
+        return counts
+    with Pool(processes or os.cpu_count()) as pool:
+        for chunk_counts in pool.imap_unordered(_count_range, tasks):
+            counts.update(chunk_counts)
+    return counts
+
+
+def sorted_vocab(counts, min_count):
+    """(word, count) pairs with count >= min_count, most frequent first, ties by word."""
+    return sorted(((w, c) for w, c in counts.items() if c >= min_count), key=lambda x: (-x[1], x[0]))
+
+
+def build_vocab(path, min_count, processes=None, chunk_bytes=DEFAULT_CHUNK_BYTES):
+    counts = count_words_parallel(path, processes, chunk_bytes)
+    print(len(counts), 'unique words in corpus')
+    return sorted_vocab(counts, min_count)
+
+
+def write_vocab(vocab, vocab_fd):
+    """Writes (word, count) pairs as "b'word' count" lines, like Word2Vec.save_vocab."""
+    for word, count in vocab:
+        vocab_fd.write('%s %d\n' % (word.encode('utf-8'), count))
+
+
+def read_vocab_counts(vocab_fd):
+    """Reads a vocab written by write_vocab (or plain 'word count' lines)."""
+    words, counts = [], []
+    for line in vocab_fd:
+        token, count = line.split(' ')
+        words.append(parse_vocab_word(token))
+        counts.append(int(count))
+    return words, counts
+
+
+def read_vocab(vocab_fd):
+    return read_vocab_counts(vocab_fd)[0]
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 3:
+        print('Usage: vocab_builder.py [min_count] corpus_path.txt vocab.txt')
+        exit()
+    min_count = int(sys.argv[1]) if len(sys.argv) > 3 else 100
+    vocab = build_vocab(sys.argv[-2], min_count)
+    with open(sys.argv[-1], 'w') as vocab_fd:
+        write_vocab(vocab, vocab_fd)
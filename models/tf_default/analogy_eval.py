@@ -0,0 +1,267 @@
+# Copyright 2015 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+"""Vectorized analogy evaluation shared by the word2vec models.
+
+A question a:b vs c:d is answered by the word nearest to c + (b - a) other
+than a, b and c. Instead of walking the top 4 words of every question in
+Python, the distances of a, b and c are pushed below any other word's, so a
+single argmax per row answers a whole chunk of questions after one matmul.
+
+Questions are grouped by the ": category" header lines of the eval file,
+and accuracy is reported per category and overall.
+
+BatchQuery answers nearby and analogy queries for arrays of words in the
+same way, a chunk of queries per run of one subgraph. The graph builders
+import TensorFlow when called; the NumPy paths, which numpy_backend uses,
+run without it.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from six.moves import xrange  # pylint: disable=redefined-builtin
+
+import numpy as np
+
+# Questions scored per matmul.
+CHUNK = 2500
+
+# Bytes of the [N, vocab_size] float32 similarities a batch query computes
+# per run.
+QUERY_BYTES = 1 << 28
+
+# Cosine similarities of c + (b - a) lie in [-3, 3], so this puts the
+# question words behind every other word.
+QUESTION_PENALTY = -10.0
+
+
+def read_analogies(eval_data, word2id):
+  """Reads through the analogy question file.
+
+  Args:
+    eval_data: path of the file, ": category" headers followed by lines of
+      four words.
+    word2id: the model's word to id dict, with bytes keys.
+
+  Returns:
+    questions: a [n, 4] int32 array of the questions' word ids.
+    categories: a [n] int32 array, the category index of each question.
+    names: the category names, in file order.
+  """
+  questions, categories, names = [], [], []
+  questions_skipped = 0
+  with open(eval_data, "rb") as analogy_f:
+    for line in analogy_f:
+      if line.startswith(b":"):  # A category header.
+        names.append(line[1:].strip().decode("utf-8"))
+        continue
+      words = line.strip().lower().split(b" ")
+      ids = [word2id.get(w.strip()) for w in words]
+      if None in ids or len(ids) != 4:
+        questions_skipped += 1
+      else:
+        if not names:
+          names.append("")
+        questions.append(ids)
+        categories.append(len(names) - 1)
+  print("Eval analogy file: ", eval_data)
+  print("Questions: ", len(questions))
+  print("Skipped: ", questions_skipped)
+  return (np.array(questions, dtype=np.int32).reshape([-1, 4]),
+          np.array(categories, dtype=np.int32), names)
+
+
+def normalized_snapshot(emb, name="nemb"):
+  """A variable holding the row-normalized emb, and the op refreshing it.
+
+  Eval and nearby queries read the snapshot, so each run costs only the
+  matmul and top_k instead of re-normalizing all of emb. The variable is in
+  no collection, which keeps it out of global_variables_initializer() and
+  of checkpoints; running the refresh op also initializes it.
+
+  Returns:
+    nemb: the [vocab_size, emb_dim] snapshot variable.
+    refresh: the op copying l2_normalize(emb, 1) into nemb.
+  """
+  import tensorflow as tf  # pylint: disable=g-import-not-at-top
+  nemb = tf.Variable(tf.zeros(emb.get_shape(), dtype=emb.dtype.base_dtype),
+                     trainable=False, collections=[], name=name)
+  refresh = tf.assign(nemb, tf.nn.l2_normalize(emb, 1))
+  return nemb, refresh
+
+
+def analogy_correct(dist, analogy_a, analogy_b, analogy_c, analogy_d):
+  """Whether each question's best answer is d, as a [N] bool tensor.
+
+  Args:
+    dist: [N, vocab_size] similarities of c + (b - a) to every word.
+    analogy_a, analogy_b, analogy_c, analogy_d: [N] int32 word ids.
+  """
+  import tensorflow as tf  # pylint: disable=g-import-not-at-top
+  question = tf.stack([analogy_a, analogy_b, analogy_c], 1)  # [N, 3]
+  rows = tf.tile(tf.expand_dims(tf.range(tf.shape(question)[0]), 1), [1, 3])
+  idx = tf.reshape(tf.stack([rows, question], 2), [-1, 2])
+  # d itself is never skipped, even when it is one of a, b and c. Repeated
+  # question words add up, which only pushes them further down.
+  skip = tf.not_equal(question, tf.expand_dims(analogy_d, 1))
+  updates = tf.where(skip, tf.fill(tf.shape(question), QUESTION_PENALTY),
+                     tf.zeros(tf.shape(question)))
+  penalty = tf.scatter_nd(idx, tf.reshape(updates, [-1]), tf.shape(dist))
+  pred = tf.cast(tf.argmax(dist + penalty, 1), tf.int32)
+  return tf.equal(pred, analogy_d)
+
+
+def analogy_correct_numpy(nemb, analogy):
+  """analogy_correct for a [N, 4] array of questions and normalized nemb."""
+  target = nemb[analogy[:, 2]] + (nemb[analogy[:, 1]] - nemb[analogy[:, 0]])
+  dist = target.dot(nemb.T)
+  rows, cols = np.nonzero(analogy[:, :3] != analogy[:, 3:])
+  dist[rows, analogy[rows, cols]] = -np.inf
+  return np.argmax(dist, axis=1) == analogy[:, 3]
+
+
+def evaluate(questions, categories, names, correct_fn):
+  """Scores questions chunk by chunk and prints the accuracy.
+
+  Args:
+    questions, categories, names: as read_analogies returns them.
+    correct_fn: maps a [N, 4] chunk of questions to a [N] bool vector.
+
+  Returns:
+    A [n] bool vector, whether each question was answered correctly.
+  """
+  correct = np.zeros(len(questions), dtype=bool)
+  for start in range(0, len(questions), CHUNK):
+    correct[start:start + CHUNK] = correct_fn(questions[start:start + CHUNK])
+  total = len(questions)
+  print()
+  print("Eval %4d/%d accuracy = %4.1f%%" % (correct.sum(), total,
+                                            correct.sum() * 100.0 /
+                                            max(total, 1)))
+  per_category = np.bincount(categories, weights=correct,
+                             minlength=len(names))
+  sizes = np.bincount(categories, minlength=len(names))
+  for name, right, size in zip(names, per_category, sizes):
+    if size:
+      print("  %-30s %4d/%d accuracy = %4.1f%%" %
+            (name, right, size, right * 100.0 / size))
+  return correct
+
+
+def word_ids(words, word2id):
+  """int32 ids of an array of word ids or of bytes words, UNK if unknown."""
+  words = np.asarray(words)
+  if words.dtype.kind in "iu":
+    return words.astype(np.int32)
+  return np.array([word2id.get(w, 0) for w in words.ravel()],
+                  dtype=np.int32).reshape(words.shape)
+
+
+def query_chunks(query_fn, n, num, vocab_size, memory_bytes=QUERY_BYTES):
+  """Runs query_fn over slices of n queries that fit in memory_bytes.
+
+  Args:
+    query_fn: maps a slice of the queries to their (ids, scores), [N, num].
+    n: the number of queries.
+    num: results per query.
+    vocab_size: columns of the similarities each query computes.
+    memory_bytes: budget for the [N, vocab_size] float32 similarities.
+
+  Returns:
+    ids: int32 [n, num] and scores: float32 [n, num], all slices together.
+  """
+  chunk = max(1, memory_bytes // (4 * vocab_size))
+  ids = np.empty([n, num], dtype=np.int32)
+  scores = np.empty([n, num], dtype=np.float32)
+  for start in xrange(0, n, chunk):
+    rows = slice(start, min(start + chunk, n))
+    ids[rows], scores[rows] = query_fn(rows)
+  return ids, scores
+
+
+def drop_question_words(ids, scores, question, num):
+  """The first num of each row's ids and scores not in its question row."""
+  asked = (ids[:, :, None] == question[:, None, :]).any(axis=2)
+  # Stable, so the other words keep their order.
+  keep = np.argsort(asked, axis=1, kind="mergesort")[:, :num]
+  return (np.take_along_axis(ids, keep, 1),
+          np.take_along_axis(scores, keep, 1))
+
+
+def query_numpy(nemb, a, b, c, k):
+  """The k words nearest to c + (b - a), best first, for [N] ids a, b, c."""
+  target = nemb[c] + (nemb[b] - nemb[a])
+  dist = target.dot(nemb.T)
+  ids = np.argpartition(-dist, k - 1, axis=1)[:, :k]
+  ids = np.take_along_axis(
+      ids, np.argsort(-np.take_along_axis(dist, ids, 1), axis=1), 1)
+  return ids, np.take_along_axis(dist, ids, 1)
+
+
+def batch_query(query_fn, a, b, c, num, vocab_size, exclude=False,
+                memory_bytes=QUERY_BYTES):
+  """Nearby (a = b = c) or analogy queries, chunked to memory_bytes.
+
+  Args:
+    query_fn: maps ([N] a, b, c, k) to the (ids, scores) of the k words
+      nearest to c + (b - a), best first.
+    a, b, c: [n] int32 word ids.
+    num: results per query.
+    vocab_size: the number of words.
+    exclude: whether to leave a, b and c out of the results.
+
+  Returns:
+    ids: int32 [n, num] word ids, best first.
+    scores: float32 [n, num] their similarities to c + (b - a).
+  """
+  num = min(num, vocab_size - 3 if exclude else vocab_size)
+  # At most 3 of the best num + 3 words are question words.
+  k = min(num + 3, vocab_size) if exclude else num
+
+  def query(rows):
+    ids, scores = query_fn(a[rows], b[rows], c[rows], k)
+    if exclude:
+      question = np.stack([a[rows], b[rows], c[rows]], 1)
+      ids, scores = drop_question_words(ids, scores, question, num)
+    return ids, scores
+
+  return query_chunks(query, len(a), num, vocab_size, memory_bytes)
+
+
+class BatchQuery(object):
+  """The subgraph of batch_query: the k words nearest to c + (b - a)."""
+
+  def __init__(self, nemb):
+    """Builds the subgraph over the [vocab_size, emb_dim] nemb."""
+    import tensorflow as tf  # pylint: disable=g-import-not-at-top
+    self.vocab_size = int(nemb.get_shape()[0])
+    self._a = tf.placeholder(dtype=tf.int32, shape=[None])
+    self._b = tf.placeholder(dtype=tf.int32, shape=[None])
+    self._c = tf.placeholder(dtype=tf.int32, shape=[None])
+    self._k = tf.placeholder(dtype=tf.int32, shape=[])
+    target = tf.gather(nemb, self._c) + (tf.gather(nemb, self._b) -
+                                         tf.gather(nemb, self._a))
+    dist = tf.matmul(target, nemb, transpose_b=True)
+    self._scores, self._ids = tf.nn.top_k(dist, self._k)
+
+  def run(self, session, a, b, c, num, exclude=False):
+    """batch_query in session; see batch_query."""
+
+    def query_fn(a, b, c, k):
+      return session.run([self._ids, self._scores], {
+          self._a: a, self._b: b, self._c: c, self._k: k})
+
+    return batch_query(query_fn, a, b, c, num, self.vocab_size, exclude)
@@ -0,0 +1,105 @@
+# Copyright 2015 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+"""Tests for analogy_eval module."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+import tensorflow as tf
+
+import analogy_eval
+
+
+class AnalogyEvalTest(tf.test.TestCase):
+
+  def setUp(self):
+    # The last question counts although its answer d is also its b.
+    self._nemb = np.array([[1.0, 0.0], [0.8, 0.6], [0.6, 0.8], [0.0, 1.0],
+                           [-1.0, 0.0]], dtype=np.float32)
+    self._questions = np.array([[0, 1, 2, 3], [0, 1, 2, 4], [2, 1, 1, 1]],
+                               dtype=np.int32)
+
+  def testAnalogyCorrectNumpy(self):
+    self.assertAllEqual(
+        analogy_eval.analogy_correct_numpy(self._nemb, self._questions),
+        [True, False, True])
+
+  def testAnalogyCorrect(self):
+    q = self._questions
+    with self.test_session():
+      target = (tf.gather(self._nemb, q[:, 2]) +
+                (tf.gather(self._nemb, q[:, 1]) -
+                 tf.gather(self._nemb, q[:, 0])))
+      dist = tf.matmul(target, self._nemb, transpose_b=True)
+      correct = analogy_eval.analogy_correct(dist, q[:, 0], q[:, 1], q[:, 2],
+                                             q[:, 3])
+      self.assertAllEqual(correct.eval(), [True, False, True])
+
+  def testWordIds(self):
+    word2id = {b"a": 1, b"b": 2}
+    self.assertAllEqual(analogy_eval.word_ids([[b"b", b"zzz", b"a"]], word2id),
+                        [[2, 0, 1]])
+    self.assertAllEqual(analogy_eval.word_ids(np.array([3, 4]), word2id),
+                        [3, 4])
+
+  def testBatchQuery(self):
+    q = self._questions[:, :3]
+    a, b, c = q[:, 0], q[:, 1], q[:, 2]
+    numpy_fn = lambda a, b, c, k: analogy_eval.query_numpy(self._nemb, a, b,
+                                                           c, k)
+    # Room for the similarities of one query per chunk.
+    ids, scores = analogy_eval.batch_query(numpy_fn, a, b, c, 2, 5,
+                                           exclude=True, memory_bytes=20)
+    self.assertAllEqual(ids, [[3, 4], [3, 4], [0, 3]])
+    self.assertAllClose(scores, [[1.4, -0.4], [1.4, -0.4], [1.0, 0.4]])
+    with self.test_session() as sess:
+      batch_query = analogy_eval.BatchQuery(tf.constant(self._nemb))
+      tf_ids, tf_scores = batch_query.run(sess, a, b, c, 2, exclude=True)
+      self.assertAllEqual(tf_ids, ids)
+      self.assertAllClose(tf_scores, scores)
+      # Nearby queries: every word is its own nearest word.
+      all_ids = np.arange(5, dtype=np.int32)
+      ids, scores = batch_query.run(sess, all_ids, all_ids, all_ids, 9)
+      self.assertAllEqual(ids.shape, [5, 5])
+      self.assertAllEqual(ids[:, 0], all_ids)
+      self.assertAllClose(scores[:, 0], np.ones(5))
+
+  def testNormalizedSnapshot(self):
+    with self.test_session() as sess:
+      emb = tf.Variable([[3.0, 4.0], [0.0, 2.0]])
+      nemb, refresh = analogy_eval.normalized_snapshot(emb)
+      sess.run([emb.initializer, refresh])
+      sess.run(emb.assign([[1.0, 0.0], [0.0, 1.0]]))
+      # The snapshot only follows emb when refreshed.
+      self.assertAllClose(nemb.eval(), [[0.6, 0.8], [0.0, 1.0]])
+      sess.run(refresh)
+      self.assertAllClose(nemb.eval(), [[1.0, 0.0], [0.0, 1.0]])
+
+  def testReadAnalogies(self):
+    path = self.get_temp_dir() + "/questions.txt"
+    with open(path, "wb") as f:
+      f.write(b": capital\na b c d\na b c zzz\n: family\nd c b A\n")
+    word2id = {b"a": 0, b"b": 1, b"c": 2, b"d": 3}
+    questions, categories, names = analogy_eval.read_analogies(path, word2id)
+    self.assertAllEqual(questions, [[0, 1, 2, 3], [3, 2, 1, 0]])
+    self.assertAllEqual(categories, [0, 1])
+    self.assertEqual(names, ["capital", "family"])
+
+
+if __name__ == "__main__":
+  tf.test.main()
@@ -0,0 +1,82 @@
+# Copyright 2015 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+"""Recall and latency of the IVF-PQ index against exact search.
+
+Builds (or loads) the index of an embeddings export, then looks up the
+--num nearest words of --queries random words by exact search and by the
+index at every --nprobes value, and prints recall@num and ms/query, e.g.
+
+  python ann_benchmark.py /tmp/model/export --nprobes=1,4,16,64
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import argparse
+import time
+
+import numpy as np
+
+import embeddings
+
+
+def timed(fn, *args, **kwargs):
+  start = time.time()
+  result = fn(*args, **kwargs)
+  return result, time.time() - start
+
+
+def main():
+  parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+  parser.add_argument("export_dir", help="<save_path>/export of a model.")
+  parser.add_argument("--queries", type=int, default=1000,
+                      help="Random query words.")
+  parser.add_argument("--num", type=int, default=10,
+                      help="Neighbors per query, the k of recall@k.")
+  parser.add_argument("--nprobes", default="1,4,16,64",
+                      help="Comma separated inverted lists to scan.")
+  parser.add_argument("--nlist", type=int, default=None,
+                      help="Inverted lists of the index, sqrt(vocab_size) "
+                      "by default.")
+  parser.add_argument("--m", type=int, default=None,
+                      help="PQ sub-vectors per word.")
+  parser.add_argument("--seed", type=int, default=0)
+  args = parser.parse_args()
+
+  emb = embeddings.Embeddings(args.export_dir)
+  build_args = {k: v for k, v in (("nlist", args.nlist), ("m", args.m))
+                if v is not None}
+  _, seconds = timed(emb.index, **build_args)
+  print("Index of %d words ready in %.2fs" % (emb.vocab_size, seconds))
+
+  rng = np.random.RandomState(args.seed)
+  ids = rng.choice(emb.vocab_size, min(args.queries, emb.vocab_size),
+                   replace=False)
+  queries = emb.normalized(ids)
+  (exact, _), seconds = timed(emb.search, queries, args.num)
+  print("%-12s recall@%d = %5.3f  %8.3f ms/query" %
+        ("exact", args.num, 1.0, 1000.0 * seconds / len(ids)))
+  for nprobe in [int(n) for n in args.nprobes.split(",")]:
+    (found, _), seconds = timed(emb.search, queries, args.num,
+                                use_index=True, nprobe=nprobe)
+    hits = sum(len(np.intersect1d(f, e)) for f, e in zip(found, exact))
+    print("nprobe=%-5d recall@%d = %5.3f  %8.3f ms/query" %
+          (nprobe, args.num, hits / exact.size,
+           1000.0 * seconds / len(ids)))
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,245 @@
+# Copyright 2015 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+"""IVF-PQ approximate nearest neighbor index over an embeddings export.
+
+The normalized embeddings are clustered by k-means into nlist inverted
+lists. Every word is stored in the list of its nearest centroid, and its
+residual from that centroid is product quantized: cut into m sub-vectors,
+each replaced by the uint8 id of the nearest of ksub sub-centroids.
+
+A query scores only the words of its nprobe best lists. The score is the
+centroid's similarity plus the residual's similarity, read from an
+[m, ksub] table, without touching the embeddings. The rerank best
+candidates are then scored exactly against the export's rows. nprobe is the
+recall/latency knob: more lists find more true neighbors and cost more
+time.
+
+The index is stored next to the export it was built from:
+  ivfpq.centroids.npy    float32 [nlist, emb_dim]
+  ivfpq.offsets.npy      int64 [nlist + 1], where list l starts and ends in ids
+  ivfpq.ids.npy          int32 [vocab_size], word ids grouped by list
+  ivfpq.codes.npy        uint8 [vocab_size, m], in the order of ids
+  ivfpq.codebooks.npy    float32 [m, ksub, emb_dim / m]
+  ivfpq.json             build parameters and the emb.npy they came from
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import json
+import os
+import time
+
+from six.moves import xrange  # pylint: disable=redefined-builtin
+
+import numpy as np
+
+# Lists probed and candidates reranked exactly per query, by default.
+NPROBE = 16
+RERANK = 256
+
+# k-means trains on up to this many points per centroid.
+TRAIN_POINTS_PER_CENTROID = 64
+
+# Rows assigned per matmul while building.
+CHUNK_ROWS = 1 << 14
+
+_ARRAYS = ("centroids", "offsets", "ids", "codes", "codebooks")
+
+
+def default_subspaces(dim):
+  """m for sub-vectors of 4 dimensions, or fewer when 4 does not divide."""
+  for sub_dim in (4, 3, 2, 1):
+    if dim % sub_dim == 0:
+      return dim // sub_dim
+
+
+def assign(x, centroids):
+  """Index of the nearest centroid to every row of x, in L2 distance."""
+  half_norms = 0.5 * np.square(centroids).sum(axis=1)
+  nearest = np.empty(len(x), dtype=np.int32)
+  for start in xrange(0, len(x), CHUNK_ROWS):
+    rows = slice(start, start + CHUNK_ROWS)
+    nearest[rows] = np.argmax(x[rows].dot(centroids.T) - half_norms, axis=1)
+  return nearest
+
+
+def kmeans(x, k, iterations, rng):
+  """Lloyd's k-means of the rows of x; returns float32 [k, dim] centroids."""
+  centroids = x[rng.choice(len(x), k, replace=False)].astype(np.float32)
+  for _ in xrange(iterations):
+    nearest = assign(x, centroids)
+    sizes = np.bincount(nearest, minlength=k)
+    nonempty = sizes > 0
+    # Sums over the rows of each nonempty cluster, in cluster order.
+    starts = np.cumsum(sizes) - sizes
+    sums = np.add.reduceat(x[np.argsort(nearest, kind="mergesort")],
+                           starts[nonempty])
+    centroids[nonempty] = sums / sizes[nonempty, None]
+    # Empty clusters restart from random points.
+    empty = np.nonzero(~nonempty)[0]
+    centroids[empty] = x[rng.choice(len(x), len(empty), replace=False)]
+  return centroids
+
+
+class IVFPQIndex(object):
+  """Inverted lists of product quantized residuals."""
+
+  def __init__(self, centroids, offsets, ids, codes, codebooks):
+    self.centroids = centroids
+    self.offsets = offsets
+    self.ids = ids
+    self.codes = codes
+    self.codebooks = codebooks
+
+  @property
+  def nlist(self):
+    return len(self.centroids)
+
+  @classmethod
+  def build(cls, normalized, vocab_size, nlist=None, m=None, ksub=256,
+            iterations=10, seed=0):
+    """Trains and fills an index.
+
+    Args:
+      normalized: maps an array of word ids to their float32 unit vectors.
+      vocab_size: the number of words to index.
+      nlist: inverted lists, sqrt(vocab_size) by default.
+      m: sub-vectors per word, see default_subspaces.
+      ksub: sub-centroids per sub-vector, at most 256.
+      iterations: k-means iterations.
+      seed: seed of the training sample and k-means.
+    """
+    rng = np.random.RandomState(seed)
+    nlist = nlist or max(1, int(np.sqrt(vocab_size)))
+    train = normalized(np.sort(rng.choice(
+        vocab_size, min(vocab_size, TRAIN_POINTS_PER_CENTROID *
+                        max(nlist, ksub)), replace=False)))
+    dim = train.shape[1]
+    m = m or default_subspaces(dim)
+    if dim % m:
+      raise ValueError("m = %d does not divide emb_dim = %d" % (m, dim))
+    ksub = min(ksub, 256, len(train))
+    nlist = min(nlist, len(train))
+
+    centroids = kmeans(train, nlist, iterations, rng)
+    residuals = train - centroids[assign(train, centroids)]
+    codebooks = np.stack([
+        kmeans(sub, ksub, iterations, rng)
+        for sub in np.split(residuals, m, axis=1)])
+
+    lists = np.empty(vocab_size, dtype=np.int32)
+    codes = np.empty([vocab_size, m], dtype=np.uint8)
+    for start in xrange(0, vocab_size, CHUNK_ROWS):
+      rows = np.arange(start, min(start + CHUNK_ROWS, vocab_size))
+      x = normalized(rows)
+      lists[rows] = assign(x, centroids)
+      for j, sub in enumerate(np.split(x - centroids[lists[rows]], m, axis=1)):
+        codes[rows, j] = assign(sub, codebooks[j])
+
+    ids = np.argsort(lists, kind="mergesort").astype(np.int32)
+    offsets = np.zeros(nlist + 1, dtype=np.int64)
+    np.cumsum(np.bincount(lists, minlength=nlist), out=offsets[1:])
+    return cls(centroids, offsets, ids, codes[ids], codebooks)
+
+  @classmethod
+  def load(cls, prefix, mmap_mode="r"):
+    return cls(*[np.load("%s.%s.npy" % (prefix, name), mmap_mode=mmap_mode)
+                 for name in _ARRAYS])
+
+  def save(self, prefix):
+    for name in _ARRAYS:
+      np.save("%s.%s.npy" % (prefix, name), getattr(self, name))
+
+  def candidates(self, query, nprobe):
+    """Word ids in the nprobe lists nearest to query, and their PQ scores."""
+    coarse = self.centroids.dot(query)
+    nprobe = min(nprobe, self.nlist)
+    probe = np.argpartition(-coarse, nprobe - 1)[:nprobe]
+    starts, stops = self.offsets[probe], self.offsets[probe + 1]
+    sizes = stops - starts
+    # Positions of every probed list's entries, list by list.
+    pos = np.repeat(starts - np.cumsum(sizes) + sizes, sizes) + np.arange(
+        sizes.sum())
+    m, _, sub_dim = self.codebooks.shape
+    # table[j, k]: similarity of query's sub-vector j to sub-centroid k.
+    table = np.einsum("jkd,jd->jk", self.codebooks,
+                      query.reshape([m, sub_dim]))
+    scores = np.repeat(coarse[probe], sizes) + table[
+        np.arange(m), self.codes[pos]].sum(axis=1)
+    return self.ids[pos], scores
+
+  def search(self, queries, num, nprobe=NPROBE, rerank=RERANK, exact=None,
+             exclude=None):
+    """Approximate nearest neighbors of each query.
+
+    Args:
+      queries: float32 [n, emb_dim] unit query vectors.
+      num: neighbors per query.
+      nprobe: inverted lists scanned per query.
+      rerank: candidates rescored with exact, at least num.
+      exact: maps word ids to their unit vectors; None keeps PQ scores.
+      exclude: optional [n, k] ids never returned for the matching query.
+
+    Returns:
+      ids: int32 [n, num], best first, -1 past the candidates found.
+      scores: float32 [n, num], -inf past the candidates found.
+    """
+    ids = np.full([len(queries), num], -1, dtype=np.int32)
+    scores = np.full([len(queries), num], -np.inf, dtype=np.float32)
+    for i, query in enumerate(queries):
+      found, approx = self.candidates(query, nprobe)
+      if exclude is not None:
+        approx[np.isin(found, exclude[i])] = -np.inf
+      keep = min(num if exact is None else max(rerank, num), len(found))
+      if keep == 0:
+        continue
+      best = np.argpartition(-approx, keep - 1)[:keep]
+      found, approx = found[best], approx[best]
+      if exact is not None:
+        approx = np.where(np.isfinite(approx),
+                          exact(found).dot(query), -np.inf)
+      order = np.argsort(-approx, kind="mergesort")[:num]
+      ids[i, :len(order)] = found[order]
+      scores[i, :len(order)] = approx[order]
+    return ids, scores
+
+
+def load_or_build(export_dir, normalized, vocab_size, **build_args):
+  """The index of the export in export_dir, built and saved if needed.
+
+  The index is rebuilt when emb.npy changed since it was built, or when
+  build_args are given and differ from the ones it was built with.
+  """
+  prefix = os.path.join(export_dir, "ivfpq")
+  stat = os.stat(os.path.join(export_dir, "emb.npy"))
+  meta = {"emb_size": stat.st_size, "emb_mtime": stat.st_mtime_ns,
+          "build_args": build_args}
+  if os.path.isfile(prefix + ".json"):
+    with open(prefix + ".json", "r") as f:
+      saved = json.load(f)
+    if not build_args:
+      saved["build_args"] = {}
+    if saved == meta:
+      return IVFPQIndex.load(prefix)
+  start = time.time()
+  index = IVFPQIndex.build(normalized, vocab_size, **build_args)
+  index.save(prefix)
+  with open(prefix + ".json", "w") as f:
+    json.dump(meta, f)
+  print("Built a %d list IVF-PQ index of %d words in %.1fs" %
+        (index.nlist, vocab_size, time.time() - start))
+  return IVFPQIndex.load(prefix)
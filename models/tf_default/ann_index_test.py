@@ -0,0 +1,67 @@
+# Copyright 2015 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+"""Tests for ann_index module."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+import tensorflow as tf
+
+import ann_index
+import embeddings
+
+
+class IVFPQIndexTest(tf.test.TestCase):
+
+  def setUp(self):
+    rng = np.random.RandomState(0)
+    emb = rng.randn(500, 8).astype(np.float32)
+    self._nemb = emb / np.linalg.norm(emb, axis=1, keepdims=True)
+
+  def testDefaultSubspaces(self):
+    self.assertEqual(ann_index.default_subspaces(200), 50)
+    self.assertEqual(ann_index.default_subspaces(30), 10)
+    self.assertEqual(ann_index.default_subspaces(7), 7)
+
+  def testSearchAllListsIsExact(self):
+    index = ann_index.IVFPQIndex.build(lambda ids: self._nemb[ids], 500,
+                                       nlist=8, ksub=16)
+    self.assertAllEqual(np.sort(index.ids), np.arange(500))
+    self.assertEqual(index.offsets[-1], 500)
+    queries = self._nemb[:5]
+    ids, scores = index.search(queries, 10, nprobe=8, rerank=500,
+                               exact=lambda ids: self._nemb[ids],
+                               exclude=np.arange(5)[:, None])
+    dist = queries.dot(self._nemb.T)
+    dist[np.arange(5), np.arange(5)] = -np.inf
+    self.assertAllEqual(ids, np.argsort(-dist, axis=1)[:, :10])
+    self.assertAllClose(scores, -np.sort(-dist, axis=1)[:, :10])
+
+  def testEmbeddingsIndexIsSaved(self):
+    export_dir = embeddings.export(
+        self.get_temp_dir(), [b"w%d" % i for i in range(500)],
+        np.ones(500), self._nemb)
+    index = embeddings.Embeddings(export_dir).index(nlist=4, ksub=16)
+    # Loading needs no build_args, and neither builds nor reads emb.
+    loaded = ann_index.load_or_build(export_dir, None, 500)
+    self.assertEqual(loaded.nlist, 4)
+    self.assertAllEqual(loaded.codes, index.codes)
+
+
+if __name__ == "__main__":
+  tf.test.main()
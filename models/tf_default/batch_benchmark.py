@@ -0,0 +1,82 @@
+# Copyright 2015 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+"""Throughput and analogy accuracy of word2vec over a sweep of batch sizes.
+
+Trains --epochs_to_train epochs of --train_data with every batch size in
+--batch_sizes, using the word2vec.py flags for everything else, and prints
+the training words/sec and the --eval_data accuracy of each, e.g.
+
+  python batch_benchmark.py --train_data=text8 \
+    --eval_data=questions-words.txt --save_path=/tmp/bench \
+    --batch_sizes=16,256,1024,4096 --lr_scaling=sqrt \
+    --lr_warmup_words=2000000 --concurrent_steps=4
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import time
+
+import tensorflow as tf
+
+import lr_schedule
+import word2vec
+
+flags = tf.app.flags
+
+flags.DEFINE_string("batch_sizes", "16,256,1024,4096",
+                    "Comma separated batch sizes to benchmark.")
+
+FLAGS = flags.FLAGS
+
+
+def train_and_eval(opts):
+  """Trains with opts; returns the training words/sec and the accuracy."""
+  with tf.Graph().as_default(), tf.Session() as session:
+    with tf.device("/cpu:0"):
+      model = word2vec.Word2Vec(opts, session)
+      model.read_analogies()
+    start_words, = session.run([model._words])
+    start = time.time()
+    for _ in range(opts.epochs_to_train):
+      model.train()
+    words, = session.run([model._words])
+    rate = (words - start_words) / (time.time() - start)
+    return rate, model.eval().mean()
+
+
+def main(_):
+  if not FLAGS.train_data or not FLAGS.eval_data or not FLAGS.save_path:
+    print("--train_data --eval_data and --save_path must be specified.")
+    sys.exit(1)
+  results = []
+  for batch_size in [int(b) for b in FLAGS.batch_sizes.split(",")]:
+    opts = word2vec.Options()
+    opts.batch_size = batch_size
+    peak_lr = opts.learning_rate * lr_schedule.batch_scale(
+        batch_size, opts.lr_base_batch_size, opts.lr_scaling)
+    rate, accuracy = train_and_eval(opts)
+    results.append((batch_size, peak_lr, rate, accuracy))
+  print()
+  print("%10s %10s %12s %9s" % ("batch", "peak lr", "words/sec", "accuracy"))
+  for batch_size, lr, rate, accuracy in results:
+    print("%10d %10.4g %12.0f %8.1f%%" % (batch_size, lr, rate,
+                                          accuracy * 100))
+
+
+if __name__ == "__main__":
+  tf.app.run()
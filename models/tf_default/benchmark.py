@@ -0,0 +1,91 @@
+# Copyright 2015 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+"""Training throughput of the word2vec_optimized backends.
+
+Trains one epoch of --train_data with every backend in --backends and
+prints the words/sec of each, e.g.
+
+  python benchmark.py --train_data=text8 --save_path=/tmp/bench \
+    --backends=tf,numpy,numba,processes
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import sys
+import time
+
+import numpy as np
+import tensorflow as tf
+
+import hogwild
+import numpy_backend
+import word2vec_optimized
+
+flags = tf.app.flags
+
+flags.DEFINE_string("backends", "tf,numpy,numba,processes",
+                    "Comma separated backends to benchmark.")
+
+FLAGS = flags.FLAGS
+
+
+def words_per_sec(opts):
+  """Trains one epoch with opts.backend; returns the training words/sec."""
+  if opts.backend == "tf":
+    with tf.Graph().as_default(), tf.Session() as session:
+      with tf.device("/cpu:0"):
+        model = word2vec_optimized.Word2Vec(opts, session)
+      start_words, start = session.run(model._words), time.time()
+      model.train()
+      return (session.run(model._words) - start_words) / (time.time() - start)
+  if opts.backend == "processes":
+    model = hogwild.Word2Vec(opts)
+  else:
+    model = numpy_backend.Word2Vec(opts)
+  if opts.backend == "numba":
+    # Compile the kernel before timing.
+    numpy_backend.hogwild_sgd(
+        np.zeros((1, 1), np.float32), np.zeros((1, 1), np.float32),
+        np.zeros(1, np.int32), np.zeros((1, 1), np.int32),
+        np.zeros(1, np.float32), np.zeros((1, 1), np.float32), np.float32(0))
+  start_words, start = model.words, time.time()
+  model.train()
+  return (model.words - start_words) / (time.time() - start)
+
+
+def main(_):
+  if not FLAGS.train_data or not FLAGS.save_path:
+    print("--train_data and --save_path must be specified.")
+    sys.exit(1)
+  results = []
+  for backend in FLAGS.backends.split(","):
+    if backend == "tf" and word2vec_optimized.word2vec is None:
+      print("Skipping tf: word2vec_ops.so not found")
+      continue
+    if backend == "numba" and numpy_backend.hogwild_sgd is None:
+      print("Skipping numba: not installed")
+      continue
+    opts = word2vec_optimized.Options()
+    opts.backend = backend
+    results.append((backend, words_per_sec(opts)))
+  print()
+  for backend, rate in results:
+    print("%-8s %10.0f words/sec" % (backend, rate))
+
+
+if __name__ == "__main__":
+  tf.app.run()
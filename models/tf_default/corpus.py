@@ -0,0 +1,159 @@
+# Copyright 2015 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+"""Token id cache of a training text file, in the skipgram op's id layout.
+
+Words are separated by ASCII whitespace, as the skipgram_word2vec op reads
+them, and are bytes, whatever their encoding. Id 0
+is UNK and ids 1.. are the words with at least min_count occurrences, most
+frequent first. For a corpus at <path> the cache is the same three files
+data/scripts/corpus_cache.py writes, so either can build it:
+  <path>.ids.npy      uint32 id of every token, memory-mappable
+  <path>.vocab.txt    "b'word' count" per line for ids 1..
+  <path>.cache.json   source size, mtime and sha1, the min_count used and the
+                      tokenizer, so a cache split any other way is rebuilt
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import array
+import ast
+import collections
+import hashlib
+import json
+import os
+
+import numpy as np
+
+UNK = b"UNK"
+
+# Recorded in cache.json; data/scripts/corpus_cache.py uses the same tag for
+# the same split.
+TOKENIZER = "ascii-whitespace"
+
+
+def cache_paths(path):
+  return path + ".ids.npy", path + ".vocab.txt", path + ".cache.json"
+
+
+def file_sha1(path, block_bytes=1 << 23):
+  sha1 = hashlib.sha1()
+  with open(path, "rb") as f:
+    for block in iter(lambda: f.read(block_bytes), b""):
+      sha1.update(block)
+  return sha1.hexdigest()
+
+
+def count_words(path):
+  counts = collections.Counter()
+  with open(path, "rb") as f:
+    for line in f:
+      counts.update(line.split())
+  return counts
+
+
+def encode_corpus(path, min_count):
+  """Writes the id cache of path, see the module docstring."""
+  ids_path, vocab_path, meta_path = cache_paths(path)
+  stat = os.stat(path)
+  counts = count_words(path)
+  num_tokens = sum(counts.values())
+  vocab = sorted(((w, c) for w, c in counts.items() if c >= min_count),
+                 key=lambda x: (-x[1], x[0]))
+  del counts
+  word_id = {w: i + 1 for i, (w, _) in enumerate(vocab)}
+
+  ids = array.array("I")
+  with open(path, "rb") as f:
+    for line in f:
+      ids.extend(word_id.get(w, 0) for w in line.split())
+  np.save(ids_path + ".tmp.npy", np.frombuffer(ids, dtype=np.uint32))
+  with open(vocab_path + ".tmp", "w") as f:
+    for w, c in vocab:
+      f.write("%s %d\n" % (w, c))
+
+  meta = {
+      "source_size": stat.st_size,
+      "source_mtime": stat.st_mtime_ns,
+      "source_sha1": file_sha1(path),
+      "min_count": min_count,
+      "tokenizer": TOKENIZER,
+      "num_tokens": num_tokens,
+      "vocab_size": len(vocab),
+  }
+  os.replace(ids_path + ".tmp.npy", ids_path)
+  os.replace(vocab_path + ".tmp", vocab_path)
+  with open(meta_path, "w") as f:
+    json.dump(meta, f)
+
+
+def is_cache_valid(path, min_count):
+  ids_path, vocab_path, meta_path = cache_paths(path)
+  if not all(os.path.isfile(p) for p in (ids_path, vocab_path, meta_path)):
+    return False
+  with open(meta_path, "r") as f:
+    meta = json.load(f)
+  stat = os.stat(path)
+  if (meta.get("tokenizer") != TOKENIZER or meta["min_count"] != min_count or
+      meta["source_size"] != stat.st_size):
+    return False
+  return (meta["source_mtime"] == stat.st_mtime_ns or
+          meta["source_sha1"] == file_sha1(path))
+
+
+def parse_vocab_bytes(w):
+  """The word of a vocab line's first field, as bytes.
+
+  Vocab files store words as bytes literals, e.g. b'word'; plain words are
+  read as utf-8. This is the one parser of the format, for the models and
+  data/scripts alike.
+  """
+  if w.startswith(("b'", 'b"')):
+    return ast.literal_eval(w)
+  return w.encode("utf-8")
+
+
+def parse_vocab_word(w):
+  """parse_vocab_bytes decoded to str, as the relation pickles key words."""
+  return parse_vocab_bytes(w).decode("utf-8")
+
+
+def read_vocab(vocab_path):
+  words, counts = [], []
+  with open(vocab_path, "r") as f:
+    for line in f:
+      w, c = line.split(" ")
+      words.append(parse_vocab_bytes(w))
+      counts.append(int(c))
+  return words, counts
+
+
+def load_corpus(path, min_count):
+  """The corpus at path as skipgram op ids, encoding it first if needed.
+
+  Returns:
+    ids: read-only uint32 memory map with the id of every token.
+    words: the vocabulary as bytes, UNK first, like the op's vocab_word.
+    counts: int64 count of every word, UNK counting all dropped tokens.
+  """
+  if not is_cache_valid(path, min_count):
+    print("Encoding", path)
+    encode_corpus(path, min_count)
+  ids_path, vocab_path, _ = cache_paths(path)
+  ids = np.load(ids_path, mmap_mode="r")
+  words, counts = read_vocab(vocab_path)
+  counts = np.array([len(ids) - sum(counts)] + counts, dtype=np.int64)
+  return ids, [UNK] + words, counts
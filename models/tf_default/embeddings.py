@@ -0,0 +1,228 @@
+# Copyright 2015 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+"""Standalone embedding export, and a memory-mapped loader to query it.
+
+At the end of training the models write <save_path>/export:
+  emb.npy           [vocab_size, emb_dim] C-contiguous, float32 or float16
+  sm_w_t.npy        the output embeddings, same layout, if asked for
+  norms.npy         float32 [vocab_size], the L2 norm of every emb row
+  words.npy         fixed width bytes [vocab_size], the word of every id
+  word_index.npy    int32 [vocab_size], the ids in sorted word order
+  vocab.txt         "b'word' count" per line, UNK first, as corpus.py reads it
+  export.json       shapes, dtype and the options the vectors were trained with
+
+Embeddings memory-maps the arrays read-only and looks words up by binary
+search, so it loads in milliseconds whatever the vocabulary size, needs
+neither TensorFlow nor the checkpoint, and processes loading the same export
+share its pages. nearby and analogy answer as the models' do, in NumPy, by
+exact search or, with use_index=True, from the export's approximate nearest
+neighbor index (see ann_index.py).
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import json
+import os
+
+from six.moves import xrange  # pylint: disable=redefined-builtin
+
+import numpy as np
+
+import analogy_eval
+import ann_index
+
+EXPORT_DTYPES = ("float32", "float16")
+
+# Rows of emb scored per matmul, which bounds the float32 copy made of a
+# float16 export.
+CHUNK_ROWS = 1 << 16
+
+
+def export(export_dir, words, counts, emb, sm_w_t=None, dtype="float32",
+           **options):
+  """Writes an export of emb, see the module docstring.
+
+  Args:
+    export_dir: directory to write, created if needed.
+    words, counts: the vocabulary as bytes, UNK first, and its counts.
+    emb: [vocab_size, emb_dim] input embeddings.
+    sm_w_t: [vocab_size, emb_dim] output embeddings, or None.
+    dtype: one of EXPORT_DTYPES.
+    **options: training options recorded in export.json.
+  """
+  if dtype not in EXPORT_DTYPES:
+    raise ValueError("Export dtype must be one of %s, not %r" %
+                     (", ".join(EXPORT_DTYPES), dtype))
+  if not os.path.exists(export_dir):
+    os.makedirs(export_dir)
+  path = lambda name: os.path.join(export_dir, name)
+  arrays = {"emb": np.ascontiguousarray(emb, dtype=dtype)}
+  if sm_w_t is not None:
+    arrays["sm_w_t"] = np.ascontiguousarray(sm_w_t, dtype=dtype)
+  # Norms of the rows as stored, so that float16 rows normalize to 1.
+  arrays["norms"] = np.linalg.norm(arrays["emb"].astype(np.float32), axis=1)
+  arrays["words"] = np.array(list(words), dtype=bytes)
+  arrays["word_index"] = np.argsort(arrays["words"],
+                                    kind="mergesort").astype(np.int32)
+  for name, array in arrays.items():
+    np.save(path(name + ".npy"), array)
+  with open(path("vocab.txt"), "w") as f:
+    for w, c in zip(words, counts):
+      f.write("%s %d\n" % (bytes(w), c))
+  meta = {
+      "vocab_size": arrays["emb"].shape[0],
+      "emb_dim": arrays["emb"].shape[1],
+      "dtype": dtype,
+      "sm_w_t": sm_w_t is not None,
+      "options": options,
+  }
+  # Written last: an export without it is incomplete.
+  with open(path("export.json"), "w") as f:
+    json.dump(meta, f, indent=2, sort_keys=True)
+  print("Exported %d x %d %s embeddings to %s" %
+        (meta["vocab_size"], meta["emb_dim"], dtype, export_dir))
+  return export_dir
+
+
+class Embeddings(object):
+  """A read-only, memory-mapped export."""
+
+  def __init__(self, export_dir, mmap_mode="r"):
+    self._export_dir = export_dir
+    self._index = None
+    path = lambda name: os.path.join(export_dir, name)
+    with open(path("export.json"), "r") as f:
+      self.metadata = json.load(f)
+    load = lambda name: np.load(path(name + ".npy"), mmap_mode=mmap_mode)
+    self.emb = load("emb")
+    self.sm_w_t = load("sm_w_t") if self.metadata["sm_w_t"] else None
+    self.words = load("words")
+    self._norms = np.maximum(load("norms"), 1e-12)
+    self._word_index = load("word_index")
+
+  @property
+  def vocab_size(self):
+    return self.emb.shape[0]
+
+  def word_ids(self, words):
+    """int32 ids of words, a list of bytes; UNK (0) for unknown words."""
+    words = np.array(list(words), dtype=bytes)
+    pos = np.searchsorted(self.words, words, sorter=self._word_index)
+    ids = self._word_index[np.minimum(pos, self.vocab_size - 1)]
+    return np.where(self.words[ids] == words, ids, 0).astype(np.int32)
+
+  def normalized(self, ids):
+    """float32 [len(ids), emb_dim] unit rows of emb."""
+    ids = np.asarray(ids)
+    return self.emb[ids].astype(np.float32) / self._norms[ids][:, None]
+
+  def nearest(self, targets, num, exclude=None,
+              memory_bytes=analogy_eval.QUERY_BYTES):
+    """The num words of highest cosine similarity to each target.
+
+    Targets are scored a chunk at a time, so that the similarities of a
+    chunk to every word fit in memory_bytes.
+
+    Args:
+      targets: float32 [n, emb_dim] unit query vectors.
+      num: neighbors per target.
+      exclude: optional [n, k] ids never returned for the matching target.
+      memory_bytes: budget for the float32 similarities of a chunk.
+
+    Returns:
+      ids: int32 [n, num], best first.
+      scores: float32 [n, num], their cosine similarities.
+    """
+    num = min(num, self.vocab_size)
+
+    def query(chunk):
+      dist = np.empty([len(targets[chunk]), self.vocab_size], dtype=np.float32)
+      for start in xrange(0, self.vocab_size, CHUNK_ROWS):
+        rows = slice(start, start + CHUNK_ROWS)
+        dist[:, rows] = (targets[chunk].dot(self.emb[rows].astype(np.float32).T)
+                         / self._norms[rows])
+      if exclude is not None:
+        np.put_along_axis(dist, np.asarray(exclude)[chunk], -np.inf, axis=1)
+      ids = np.argpartition(-dist, num - 1, axis=1)[:, :num]
+      order = np.argsort(-np.take_along_axis(dist, ids, 1), axis=1)
+      ids = np.take_along_axis(ids, order, 1)
+      return ids, np.take_along_axis(dist, ids, 1)
+
+    return analogy_eval.query_chunks(query, len(targets), num,
+                                     self.vocab_size, memory_bytes)
+
+  def index(self, **build_args):
+    """The export's IVF-PQ index, built and saved on first use.
+
+    build_args are passed to ann_index.IVFPQIndex.build.
+    """
+    if self._index is None or build_args:
+      self._index = ann_index.load_or_build(
+          self._export_dir, self.normalized, self.vocab_size, **build_args)
+    return self._index
+
+  def search(self, targets, num, exclude=None, use_index=False,
+             nprobe=ann_index.NPROBE):
+    """nearest, or its approximation by the index with use_index.
+
+    nprobe is the number of inverted lists the index scans per target,
+    trading latency for recall.
+    """
+    if not use_index:
+      return self.nearest(targets, num, exclude=exclude)
+    return self.index().search(targets, num, nprobe=nprobe,
+                               exact=self.normalized, exclude=exclude)
+
+  def analogy(self, w0, w1, w2, use_index=False, nprobe=ann_index.NPROBE):
+    """Predict word w3 as in w0:w1 vs w2:w3."""
+    wid = self.word_ids([w0, w1, w2])
+    nemb = self.normalized(wid)
+    target = nemb[2] + (nemb[1] - nemb[0])
+    # The index takes unit queries.
+    target /= max(np.linalg.norm(target), 1e-12)
+    ids, _ = self.search(target[None, :], 1, exclude=wid[None, :],
+                         use_index=use_index, nprobe=nprobe)
+    print(self.words[ids[0, 0]] if ids[0, 0] >= 0 else "unknown")
+
+  def nearby(self, words, num=20, use_index=False, nprobe=ann_index.NPROBE):
+    """Prints out nearby words given a list of words."""
+    ids, vals = self.search(self.normalized(self.word_ids(words)), num,
+                            use_index=use_index, nprobe=nprobe)
+    for i in xrange(len(words)):
+      print("\n%s\n=====================================" % (words[i]))
+      for (neighbor, distance) in zip(ids[i], vals[i]):
+        if neighbor < 0:
+          break
+        print("%-20s %6.4f" % (self.words[neighbor], distance))
+
+
+def export_model(opts, emb, sm_w_t, global_step):
+  """Exports a trained model to <opts.save_path>/export as opts ask.
+
+  Args:
+    opts: the model's Options, with its vocabulary filled in.
+    emb, sm_w_t: the model's input and output embeddings.
+    global_step: the model's training steps.
+  """
+  if opts.export_dtype == "none":
+    return None
+  if not opts.export_sm_w_t:
+    sm_w_t = None
+  return export(os.path.join(opts.save_path, "export"), opts.vocab_words,
+                opts.vocab_counts, emb, sm_w_t, dtype=opts.export_dtype,
+                global_step=int(global_step), train_data=opts.train_data,
+                min_count=opts.min_count, window_size=opts.window_size)
@@ -0,0 +1,67 @@
+# Copyright 2015 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+"""Tests for embeddings module."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+import tensorflow as tf
+
+import embeddings
+
+
+class EmbeddingsTest(tf.test.TestCase):
+
+  def _export(self, dtype):
+    emb = np.array([[1.0, 0.0], [0.0, 2.0], [3.0, 3.0], [-1.0, 0.1]])
+    export_dir = embeddings.export(
+        self.get_temp_dir() + "/" + dtype, [b"UNK", b"zeta", b"alpha", b"mu"],
+        [4, 3, 2, 1], emb, dtype=dtype, global_step=7)
+    return embeddings.Embeddings(export_dir)
+
+  def testLoad(self):
+    loaded = self._export("float16")
+    self.assertEqual(loaded.emb.dtype, np.float16)
+    self.assertIsInstance(loaded.emb, np.memmap)
+    self.assertIsNone(loaded.sm_w_t)
+    self.assertEqual(loaded.metadata["options"], {"global_step": 7})
+    self.assertAllEqual(loaded.word_ids([b"mu", b"alpha", b"nope", b"zeta"]),
+                        [3, 2, 0, 1])
+
+  def testNearest(self):
+    loaded = self._export("float32")
+    ids, scores = loaded.nearest(loaded.normalized([0]), 3)
+    self.assertAllEqual(ids, [[0, 2, 1]])
+    self.assertAllClose(scores, [[1.0, np.sqrt(0.5), 0.0]])
+    ids, _ = loaded.nearest(loaded.normalized([0]), 2, exclude=[[0]])
+    self.assertAllEqual(ids, [[2, 1]])
+
+  def testNearestChunked(self):
+    loaded = self._export("float32")
+    targets = loaded.normalized([0, 1, 2, 3, 1])
+    exclude = [[0], [1], [2], [3], [2]]
+    ids, scores = loaded.nearest(targets, 2, exclude=exclude)
+    # One target's similarities at a time.
+    chunked_ids, chunked_scores = loaded.nearest(
+        targets, 2, exclude=exclude, memory_bytes=4 * loaded.vocab_size)
+    self.assertAllEqual(ids, chunked_ids)
+    self.assertAllClose(scores, chunked_scores)
+
+
+if __name__ == "__main__":
+  tf.test.main()
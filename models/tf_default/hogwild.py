@@ -0,0 +1,209 @@
+# Copyright 2015 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+"""Hogwild skip-gram training over worker processes, --backend=processes.
+
+numpy_backend.Word2Vec trains in a single process. The Word2Vec here keeps
+w_in and w_out in multiprocessing.shared_memory blocks and trains every
+epoch with concurrent_steps worker processes, each over its own contiguous
+shard of the token id corpus. Workers update the shared matrices without
+locks, as the neg_train_word2vec kernel does across concurrent steps, so
+there is no GIL or session between them.
+
+Each worker also counts its words and steps in a shared progress block. The
+parent polls it to print statistics, and workers read it to decay the
+learning rate over the words trained by all of them.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import multiprocessing
+from multiprocessing import connection
+from multiprocessing import shared_memory
+import sys
+import time
+import weakref
+
+from six.moves import xrange  # pylint: disable=redefined-builtin
+
+import numpy as np
+
+import corpus
+import numpy_backend
+from negative_sampler import unigram_table
+
+# Tokens a worker reads per span. Progress and the learning rate are
+# updated once per span.
+SPAN_TOKENS = 1 << 16
+
+
+class SharedArray(object):
+  """A numpy array in a named shared memory block."""
+
+  def __init__(self, shape, dtype, name=None):
+    """Creates a zeroed block, or attaches to the block called name."""
+    dtype = np.dtype(dtype)
+    size = max(int(np.prod(shape)) * dtype.itemsize, 1)
+    self._shm = shared_memory.SharedMemory(name=name, create=name is None,
+                                           size=size)
+    self._owner = name is None
+    self.array = np.ndarray(shape, dtype=dtype, buffer=self._shm.buf)
+
+  @classmethod
+  def copy_of(cls, array):
+    shared = cls(array.shape, array.dtype)
+    shared.array[...] = array
+    return shared
+
+  @classmethod
+  def attach(cls, spec):
+    name, shape, dtype = spec
+    return cls(shape, dtype, name=name)
+
+  @property
+  def spec(self):
+    """(name, shape, dtype) to attach to the block from another process."""
+    return self._shm.name, self.array.shape, self.array.dtype.str
+
+  def close(self):
+    """Unmaps the block; the owner also removes it."""
+    self.array = None
+    self._shm.close()
+    if self._owner:
+      self._shm.unlink()
+
+
+def _unlink(names):
+  for name in names:
+    try:
+      shared_memory.SharedMemory(name=name).unlink()
+    except FileNotFoundError:
+      pass
+
+
+def _train_shard(opts, relations, specs, worker, start, stop, words_before,
+                 seed):
+  """Worker process: one epoch over ids[start:stop] on the shared matrices.
+
+  Args:
+    opts: the model's options, with its vocabulary filled in.
+    relations: the model's relation tables, or None.
+    specs: SharedArray specs of w_in, w_out and progress.
+    worker: this worker's row of progress, [words, steps].
+    words_before: words trained in the epochs before this one.
+  """
+  w_in, w_out, progress = [SharedArray.attach(spec) for spec in specs]
+  ids_path, _, _ = corpus.cache_paths(opts.train_data)
+  ids = np.load(ids_path, mmap_mode="r")[start:stop]
+  batcher = numpy_backend.SkipgramBatcher(
+      ids, opts.vocab_counts, opts.window_size, opts.subsample,
+      span_tokens=SPAN_TOKENS, seed=seed, num_words=opts.words_per_epoch)
+  # The parent stored the table, so this maps its pages.
+  sampler = unigram_table(opts.save_path, opts.vocab_counts)
+  trainer = numpy_backend.SpanTrainer(opts, sampler, relations, seed)
+  counters = progress.array[worker]
+  while batcher.epoch == 0:
+    span_start = batcher.words
+    examples, labels = batcher.next_span()
+    span_words = batcher.words - span_start
+    # Words of every worker so far; the others keep going meanwhile.
+    words = words_before + progress.array[:, 0].sum()
+    counters[1] += trainer.train(
+        w_in.array, w_out.array, examples, labels,
+        lambda done: numpy_backend.learning_rate(opts, words +
+                                                 span_words * done))
+    counters[0] = batcher.words
+  del counters
+  for shared in (w_in, w_out, progress):
+    shared.close()
+
+
+class Word2Vec(numpy_backend.Word2Vec):
+  """Word2Vec model (Skipgram) trained by concurrent_steps processes."""
+
+  def __init__(self, options, relations=None):
+    numpy_backend.Word2Vec.__init__(self, options, relations)
+    opts = self._options
+    num_workers = max(1, opts.concurrent_steps)
+    self._shared = [SharedArray.copy_of(self._w_in),
+                    SharedArray.copy_of(self._w_out),
+                    SharedArray([num_workers, 2], np.int64)]
+    # eval, nearby and save read the shared matrices directly.
+    self._w_in = self._shared[0].array
+    self._w_out = self._shared[1].array
+    self._progress = self._shared[2].array
+    # Contiguous shards of the corpus, about the same size each.
+    self._shards = np.linspace(0, opts.words_per_epoch,
+                               num_workers + 1).astype(np.int64)
+    self._epoch = 0
+    self._words_before = 0
+    # Remove the blocks even if close() is never called.
+    self._finalizer = weakref.finalize(
+        self, _unlink, [shared.spec[0] for shared in self._shared])
+
+  @property
+  def words(self):
+    return self._words_before + int(self._progress[:, 0].sum())
+
+  def train(self):
+    """Train the model for one epoch."""
+    opts = self._options
+    self._progress[...] = 0
+    context = multiprocessing.get_context()
+    specs = [shared.spec for shared in self._shared]
+    workers = []
+    for i in xrange(len(self._shards) - 1):
+      p = context.Process(
+          target=_train_shard,
+          args=(opts, self._relations, specs, i, self._shards[i],
+                self._shards[i + 1], self._words_before,
+                self._rng.randint(1 << 31)))
+      p.start()
+      workers.append(p)
+
+    last_words, last_time = self.words, time.time()
+    while any(p.is_alive() for p in workers):
+      # Reports our progress once a while.
+      connection.wait([p.sentinel for p in workers], timeout=5)
+      now = time.time()
+      if now - last_time < 5:
+        continue
+      words = self.words
+      rate = (words - last_words) / (now - last_time)
+      last_words, last_time = words, now
+      print("Epoch %4d Step %8d: lr = %5.3f words/sec = %8.0f\r" %
+            (self._epoch, self.global_step + self._progress[:, 1].sum(),
+             self.learning_rate(words), rate), end="")
+      sys.stdout.flush()
+
+    for i, p in enumerate(workers):
+      p.join()
+      if p.exitcode != 0:
+        raise RuntimeError("Worker %d exited with code %d" % (i, p.exitcode))
+    self.global_step += int(self._progress[:, 1].sum())
+    self._words_before = self.words
+    self._progress[...] = 0
+    self._epoch += 1
+    self.refresh_normalized()
+    return self._epoch
+
+  def close(self):
+    """Frees the shared memory; the model is unusable afterwards."""
+    self._w_in = self._w_out = self._progress = None
+    for shared in self._shared:
+      shared.close()
+    self._shared = []
+    self._finalizer.detach()
@@ -0,0 +1,183 @@
+# Copyright 2015 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+"""tf.data skip-gram input for word2vec and word2vec_dlce, --input=dataset.
+
+The skipgram_word2vec op builds every batch inside the training step, under
+one lock shared by all concurrent_steps threads. SkipgramInput makes the
+same (example, label) batches ahead of time from corpus.py's token id cache:
+* the corpus is cut into spans of SPAN_TOKENS tokens, read and subsampled
+  (Eq. 5 in http://arxiv.org/abs/1310.4546) by a py_func,
+* input_threads parallel map calls turn spans into pairs with a random
+  window of 1..window_size words on each side, in TF ops,
+* pairs are rebatched to batch_size and input_prefetch batches are kept
+  ready ahead of the training threads.
+
+Training steps read a batch and update the words counter, from which the
+epoch and the learning rate follow as with the op. A second iterator over
+the same dataset measures how fast the input stage alone runs, so that
+training can report when it is waiting for input.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import time
+
+import numpy as np
+import tensorflow as tf
+
+import corpus
+
+# Tokens per span. Windows do not cross span boundaries, as they do not
+# cross the op's 1000-word sentences.
+SPAN_TOKENS = 1 << 14
+
+# Fraction of the input stage's own rate above which training is reported
+# as input bound.
+INPUT_BOUND = 0.9
+
+
+def span_pairs(span, window_size):
+  """(example, label) pairs of a span of ids, ordered as the op emits them.
+
+  Every position gets a window of 1..window_size words on each side, and
+  its labels come left to right.
+  """
+  n = tf.size(span, out_type=tf.int64)
+  skip = tf.random_uniform(tf.shape(span), 1, window_size + 1,
+                           dtype=tf.int64)
+  offsets = np.concatenate([np.arange(-window_size, 0),
+                            np.arange(1, window_size + 1)]).astype(np.int64)
+  positions = tf.expand_dims(tf.range(n), 1) + offsets  # [n, 2 * window]
+  mask = tf.logical_and(
+      tf.expand_dims(skip, 1) >= np.abs(offsets),
+      tf.logical_and(positions >= 0, positions < n))
+  # Row major, so pairs stay grouped by example.
+  idx = tf.where(mask)
+  examples = tf.gather(span, idx[:, 0])
+  labels = tf.gather(span, tf.gather_nd(positions, idx))
+  return examples, labels
+
+
+class SkipgramInput(object):
+  """Batches of (example, label) ids built by a tf.data pipeline."""
+
+  def __init__(self, opts, seed=None, min_count=None):
+    """Loads the id cache of opts.train_data and builds the pipeline.
+
+    After this, vocab_words, vocab_counts and words_per_epoch are set as the
+    op would return them, and epoch, words, examples and labels are the
+    tensors to train on. seed fixes the subsampling of every span, and
+    min_count, opts.min_count by default, the words the cache keeps.
+    """
+    if min_count is None:
+      min_count = opts.min_count
+    ids, words, counts = corpus.load_corpus(opts.train_data, min_count)
+    self.vocab_words = np.array(words, dtype=object)
+    self.vocab_counts = counts.astype(np.int32)
+    self.words_per_epoch = len(ids)
+    self._ids = ids
+    self._num_spans = -(-len(ids) // SPAN_TOKENS)
+    self._keep_prob = None
+    if opts.subsample > 0:
+      # See Eq. 5 in http://arxiv.org/abs/1310.4546
+      t = opts.subsample * len(ids)
+      freq = np.maximum(counts, 1).astype(np.float64)
+      self._keep_prob = (np.sqrt(freq / t) + 1) * t / freq
+    # Spans are read by parallel map calls in any order, so each draws from
+    # its own generator, seeded by the span and epoch.
+    self._seed = np.random.RandomState(seed).randint(1 << 31)
+    self._id_map = None
+    self._input_rate = None
+    self._reported = False
+
+    self._dataset = self.dataset(opts)
+    self._iterator = self._dataset.make_initializable_iterator()
+    self._probe = self._dataset.make_initializable_iterator()
+    self._probe_batch = self._probe.get_next()
+
+    # Corpus words read up to the latest batch, counted over all epochs.
+    # Concurrent steps raise it with a locked scatter_max, so a step that
+    # finishes late never moves it back.
+    self._words = tf.Variable([0], dtype=tf.int64, trainable=False,
+                              collections=[], name="input_words")
+    self.words = self._words[0]
+    examples, labels, batch_words = self._iterator.get_next()
+    update = tf.scatter_max(self._words, [0], [tf.reduce_max(batch_words)],
+                            use_locking=True)
+    with tf.control_dependencies([update]):
+      self.examples = tf.identity(examples)
+      self.labels = tf.identity(labels)
+    self.epoch = tf.cast(self.words // self.words_per_epoch, tf.int32)
+
+  def _read_span(self, index):
+    """Ids of span index, subsampled, and the corpus words read after it."""
+    epoch, span = divmod(int(index), self._num_spans)
+    start = span * SPAN_TOKENS
+    stop = min(start + SPAN_TOKENS, self.words_per_epoch)
+    ids = np.asarray(self._ids[start:stop], dtype=np.int32)
+    if self._keep_prob is not None:
+      rng = np.random.RandomState([self._seed, epoch, span])
+      ids = ids[rng.random_sample(len(ids)) < self._keep_prob[ids]]
+    if self._id_map is not None:
+      ids = self._id_map[ids]
+    return ids, np.int64(epoch * self.words_per_epoch + stop)
+
+  def remap(self, words, counts, id_map):
+    """Trains in another vocabulary, words and counts, in which the id
+    cache's id i is id_map[i]. Subsampling keeps the cache's counts."""
+    self.vocab_words = np.array(words, dtype=object)
+    self.vocab_counts = np.asarray(counts).astype(np.int32)
+    self._id_map = np.asarray(id_map, dtype=np.int32)
+
+  def dataset(self, opts):
+    """The endless dataset of (examples, labels, words) batches."""
+
+    def span_batch(index):
+      span, words = tf.py_func(self._read_span, [index],
+                               [tf.int32, tf.int64], stateful=True)
+      span.set_shape([None])
+      examples, labels = span_pairs(span, opts.window_size)
+      return examples, labels, tf.fill(tf.shape(examples), words)
+
+    spans = tf.data.Dataset.range(np.iinfo(np.int64).max)
+    pairs = spans.map(span_batch, num_parallel_calls=opts.input_threads)
+    pairs = pairs.flat_map(
+        lambda *t: tf.data.Dataset.from_tensor_slices(t))
+    return pairs.batch(opts.batch_size).prefetch(opts.input_prefetch)
+
+  def initialize(self, session, probe_seconds=2.0):
+    """Starts the pipeline and measures its own words/sec."""
+    session.run([self._words.initializer, self._iterator.initializer,
+                 self._probe.initializer])
+    _, _, words = session.run(self._probe_batch)
+    first_words, start = words.max(), time.time()
+    while time.time() - start < probe_seconds:
+      _, _, words = session.run(self._probe_batch)
+    elapsed = time.time() - start
+    if words.max() > first_words:
+      self._input_rate = (words.max() - first_words) / elapsed
+      print("Input words/sec = %8.0f" % self._input_rate)
+
+  def report(self, rate):
+    """Tells, once, when training at rate words/sec is input bound."""
+    if (self._reported or not self._input_rate or
+        rate < INPUT_BOUND * self._input_rate):
+      return
+    self._reported = True
+    print("\nInput bound: training runs at %.0f%% of the %.0f words/sec the "
+          "input stage makes; raise --input_threads." %
+          (100.0 * rate / self._input_rate, self._input_rate))
@@ -0,0 +1,79 @@
+# Copyright 2015 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+"""Tests for input_pipeline module."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import collections
+import os
+
+from six.moves import xrange  # pylint: disable=redefined-builtin
+
+import numpy as np
+import tensorflow as tf
+
+from input_pipeline import SkipgramInput
+from input_pipeline import span_pairs
+
+
+class SpanPairsTest(tf.test.TestCase):
+
+  def testSpanPairs(self):
+    span = tf.constant(np.arange(100, 150, dtype=np.int32))
+    examples, labels = span_pairs(span, 3)
+    with self.test_session() as session:
+      examples, labels = session.run([examples, labels])
+    # Grouped by example in span order, labels left to right.
+    self.assertAllEqual(np.sort(examples, kind="stable"), examples)
+    for example in np.unique(examples):
+      window = labels[examples == example]
+      self.assertAllEqual(np.sort(window), window)
+      self.assertNotIn(example, window)
+      self.assertLessEqual(np.abs(window - example).max(), 3)
+      self.assertEqual(np.unique(window).size, window.size)
+    # Both ends of the span have neighbors on one side only.
+    self.assertEqual(labels[examples == 100].min(), 101)
+    self.assertEqual(labels[examples == 149].max(), 148)
+
+
+Options = collections.namedtuple(
+    "Options", ["train_data", "min_count", "subsample", "window_size",
+                "input_threads", "batch_size", "input_prefetch"])
+
+
+class SkipgramInputTest(tf.test.TestCase):
+
+  def testSeededSubsampling(self):
+    train_data = os.path.join(self.get_temp_dir(), "input-text.txt")
+    with open(train_data, "w") as f:
+      f.write(" ".join("w%d" % (i % 7) for i in xrange(5000)))
+    opts = Options(train_data, 0, 1e-3, 2, 2, 16, 1)
+    with tf.Graph().as_default():
+      first = SkipgramInput(opts, seed=3)
+      second = SkipgramInput(opts, seed=3)
+    # Spans read in another order subsample the same tokens.
+    ids, words = first._read_span(0)
+    second._read_span(1)
+    again, again_words = second._read_span(0)
+    self.assertLess(len(ids), 5000)
+    self.assertAllEqual(ids, again)
+    self.assertEqual(words, again_words)
+
+
+if __name__ == "__main__":
+  tf.test.main()
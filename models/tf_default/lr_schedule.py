@@ -0,0 +1,63 @@
+# Copyright 2015 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+"""Learning rate schedule of the minibatch models, word2vec and word2vec_dlce.
+
+The loss is averaged over the batch, so a batch of thousands of examples
+takes far smaller per-example steps than the default batch of 16 at the
+same learning rate. Large batches scale the rate with the batch size and
+ramp it up over a warmup, as in (Goyal, et. al.) Accurate, Large Minibatch
+SGD, https://arxiv.org/abs/1706.02677:
+  lr(words) = learning_rate * scale * max(0.0001, min(warmup, decay))
+where
+* scale is 1 for lr_scaling=none, and (batch_size / lr_base_batch_size) for
+  linear or its square root for sqrt.
+* warmup rises linearly from 0 to 1 over the first lr_warmup_words words.
+* decay falls linearly from 1 to 0 over epochs_to_train epochs.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import math
+
+import tensorflow as tf
+
+SCALING_RULES = ("none", "sqrt", "linear")
+
+
+def batch_scale(batch_size, base_batch_size, scaling):
+  """Multiplier of the learning rate for batch_size examples per step."""
+  if scaling not in SCALING_RULES:
+    raise ValueError("lr_scaling must be one of %s, got %r" %
+                     (", ".join(SCALING_RULES), scaling))
+  ratio = batch_size / float(base_batch_size)
+  if scaling == "linear":
+    return ratio
+  if scaling == "sqrt":
+    return math.sqrt(ratio)
+  return 1.0
+
+
+def learning_rate(opts, words):
+  """The learning rate tensor after words training words, see above."""
+  words = tf.cast(words, tf.float32)
+  words_to_train = float(opts.words_per_epoch * opts.epochs_to_train)
+  schedule = 1.0 - words / words_to_train
+  if opts.lr_warmup_words > 0:
+    schedule = tf.minimum(schedule, words / float(opts.lr_warmup_words))
+  scale = batch_scale(opts.batch_size, opts.lr_base_batch_size,
+                      opts.lr_scaling)
+  return opts.learning_rate * scale * tf.maximum(0.0001, schedule)
@@ -0,0 +1,135 @@
+# Copyright 2015 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+"""Walker alias table for unigram^0.75 negative sampling.
+
+The table is built once from the vocabulary counts in O(vocab_size) and
+draws in O(1): pick a column k uniformly, then keep k with probability
+prob[k] or take alias[k] otherwise. It is stored next to vocab.txt as
+  unigram_<distortion>.prob.npy    float32 [vocab_size], memory-mappable
+  unigram_<distortion>.alias.npy   int32 [vocab_size], memory-mappable
+  unigram_<distortion>.json        vocab size and sha1 of the counts
+and rebuilt when the counts change.
+
+AliasTable.sample draws in NumPy, for numpy_backend; alias_variables and
+sample_alias draw inside a TF graph, for word2vec and word2vec_dlce, and
+only sample_alias imports TensorFlow.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from relation_table import fed_variable
+
+
+def counts_sha1(counts):
+  return hashlib.sha1(
+      np.ascontiguousarray(counts, dtype=np.int64).tobytes()).hexdigest()
+
+
+class AliasTable(object):
+  """Draws word ids with probability proportional to count^distortion."""
+
+  def __init__(self, prob, alias):
+    self.prob = prob
+    self.alias = alias
+
+  @classmethod
+  def from_counts(cls, counts, distortion=0.75):
+    """Vose's construction of the alias table of count^distortion."""
+    weights = np.power(np.asarray(counts, dtype=np.float64), distortion)
+    n = len(weights)
+    prob = weights * (n / weights.sum())
+    alias = np.arange(n, dtype=np.int32)
+    small = list(np.nonzero(prob < 1.0)[0])
+    large = list(np.nonzero(prob >= 1.0)[0])
+    while small and large:
+      s, l = small.pop(), large.pop()
+      # Column s is topped up with l's excess mass.
+      alias[s] = l
+      prob[l] -= 1.0 - prob[s]
+      (small if prob[l] < 1.0 else large).append(l)
+    # Whatever is left is 1 up to rounding.
+    prob[small] = 1.0
+    prob[large] = 1.0
+    return cls(prob.astype(np.float32), alias)
+
+  @classmethod
+  def load(cls, prefix, mmap_mode="r"):
+    return cls(np.load(prefix + ".prob.npy", mmap_mode=mmap_mode),
+               np.load(prefix + ".alias.npy", mmap_mode=mmap_mode))
+
+  def save(self, prefix):
+    np.save(prefix + ".prob.npy", np.asarray(self.prob, dtype=np.float32))
+    np.save(prefix + ".alias.npy", np.asarray(self.alias, dtype=np.int32))
+
+  @property
+  def vocab_size(self):
+    return len(self.prob)
+
+  def sample(self, shape, rng):
+    """int32 word ids of the given shape, drawn with replacement."""
+    k = rng.randint(self.vocab_size, size=shape)
+    keep = rng.random_sample(shape) < self.prob[k]
+    return np.where(keep, k, self.alias[k]).astype(np.int32)
+
+
+def unigram_table(save_path, counts, distortion=0.75):
+  """The alias table of counts stored in save_path, built if needed."""
+  prefix = os.path.join(save_path, "unigram_%g" % distortion)
+  meta = {"vocab_size": len(counts), "counts_sha1": counts_sha1(counts)}
+  if os.path.isfile(prefix + ".json"):
+    with open(prefix + ".json", "r") as f:
+      if json.load(f) == meta:
+        return AliasTable.load(prefix)
+  table = AliasTable.from_counts(counts, distortion)
+  table.save(prefix)
+  with open(prefix + ".json", "w") as f:
+    json.dump(meta, f)
+  return table
+
+
+def alias_variables(table, name="unigram"):
+  """Non-trainable (prob, alias) variables holding table.
+
+  See relation_table.fed_variable.
+
+  Returns:
+    variables: the (prob, alias) pair.
+    inits: (initializer, feed_dict) pairs to run once per session.
+  """
+  variables, inits = [], []
+  for part, array in (("prob", np.asarray(table.prob, dtype=np.float32)),
+                      ("alias", np.asarray(table.alias, dtype=np.int32))):
+    var, init = fed_variable(array, "%s_%s" % (name, part))
+    variables.append(var)
+    inits.append(init)
+  return tuple(variables), inits
+
+
+def sample_alias(variables, num):
+  """Draws num int64 word ids from the (prob, alias) variables."""
+  import tensorflow as tf  # pylint: disable=g-import-not-at-top
+  prob, alias = variables
+  vocab_size = tf.shape(alias, out_type=tf.int64)[0]
+  k = tf.random_uniform([num], maxval=vocab_size, dtype=tf.int64)
+  keep = tf.random_uniform([num]) < tf.gather(prob, k)
+  return tf.where(keep, k, tf.cast(tf.gather(alias, k), tf.int64))
@@ -0,0 +1,59 @@
+# Copyright 2015 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+"""Tests for negative_sampler module."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import numpy as np
+import tensorflow as tf
+
+from negative_sampler import AliasTable, unigram_table
+
+
+class AliasTableTest(tf.test.TestCase):
+
+  def setUp(self):
+    self.counts = np.array([0, 100, 40, 10, 10, 1], dtype=np.int64)
+    weights = np.power(self.counts.astype(np.float64), 0.75)
+    self.expected = weights / weights.sum()
+
+  def testFromCounts(self):
+    table = AliasTable.from_counts(self.counts)
+    # Column k gives k prob[k] of the time and alias[k] the rest.
+    mass = table.prob.astype(np.float64) / len(self.counts)
+    np.add.at(mass, table.alias, (1 - table.prob) / len(self.counts))
+    self.assertAllClose(mass, self.expected, atol=1e-6)
+
+  def testSample(self):
+    table = AliasTable.from_counts(self.counts)
+    ids = table.sample((200000,), np.random.RandomState(0))
+    freq = np.bincount(ids, minlength=len(self.counts)) / len(ids)
+    self.assertEqual(freq[0], 0)
+    self.assertAllClose(freq, self.expected, atol=0.01)
+
+  def testUnigramTable(self):
+    table = unigram_table(self.get_temp_dir(), self.counts)
+    loaded = unigram_table(self.get_temp_dir(), self.counts)
+    self.assertIsInstance(loaded.prob, np.memmap)
+    self.assertAllEqual(loaded.alias, table.alias)
+    rebuilt = unigram_table(self.get_temp_dir(), self.counts[::-1])
+    self.assertNotIsInstance(rebuilt.prob, np.memmap)
+
+
+if __name__ == "__main__":
+  tf.test.main()
@@ -0,0 +1,448 @@
+# Copyright 2015 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+"""Skip-gram negative sampling trainer in NumPy, without word2vec_ops.so.
+
+A drop-in for word2vec_optimized.Word2Vec (and word2vec_dlce_optimized's
+model when given relation tables) that needs neither the compiled ops nor a
+TF session. Selected with --backend:
+* numpy: minibatches of batch_size examples, one vectorized SGD step each.
+* numba: Hogwild SGD, every example of a chunk updated in place by a
+  parallel loop over numba threads. Needs numba.
+* processes: numpy minibatches in concurrent_steps processes at once, see
+  hogwild.py.
+
+The batcher and learning rate schedule follow the skipgram_word2vec and
+neg_train_word2vec ops: subsampling as in Eq. 5 of
+http://arxiv.org/abs/1310.4546, a random window of 1..window_size words on
+each side, unigram^0.75 negatives and linear learning rate decay.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import sys
+import time
+
+from six.moves import xrange  # pylint: disable=redefined-builtin
+
+import numpy as np
+
+import analogy_eval
+import corpus
+import embeddings
+from negative_sampler import unigram_table
+from relation_table import RelationTable
+
+try:
+  import numba
+except ImportError:
+  numba = None
+
+
+def sigmoid(x):
+  return 0.5 * (1.0 + np.tanh(0.5 * x))
+
+
+class SkipgramBatcher(object):
+  """(example, label) pairs of a token id corpus, one span at a time."""
+
+  def __init__(self, ids, counts, window_size, subsample,
+               span_tokens=1 << 20, seed=None, num_words=None):
+    """num_words is the corpus size subsampling is relative to, by default
+    len(ids); a shard of a corpus passes the size of the whole corpus."""
+    self._ids = ids
+    self._window_size = window_size
+    self._span_tokens = span_tokens
+    self._rng = np.random.RandomState(seed)
+    if subsample > 0:
+      # See Eq. 5 in http://arxiv.org/abs/1310.4546
+      t = subsample * (len(ids) if num_words is None else num_words)
+      freq = np.maximum(counts, 1).astype(np.float64)
+      self._keep_prob = (np.sqrt(freq / t) + 1) * t / freq
+    else:
+      self._keep_prob = None
+    self._pos = 0
+    self.epoch = 0
+    self.words = 0
+
+  def next_span(self):
+    """Pairs of the next span_tokens tokens, ordered by example position.
+
+    Returns:
+      examples, labels: int32 vectors of word ids.
+    """
+    span = np.asarray(self._ids[self._pos:self._pos + self._span_tokens],
+                      dtype=np.int32)
+    self.words += len(span)
+    self._pos += len(span)
+    if self._pos >= len(self._ids):
+      self._pos = 0
+      self.epoch += 1
+    if self._keep_prob is not None:
+      span = span[self._rng.random_sample(len(span)) <
+                  self._keep_prob[span]]
+    skip = self._rng.randint(1, self._window_size + 1, size=len(span))
+    centers, contexts = [], []
+    for d in xrange(1, self._window_size + 1):
+      # Positions i whose window reaches i + d, and those reaching i - d.
+      right = np.nonzero(skip[:len(span) - d] >= d)[0]
+      left = np.nonzero(skip[d:] >= d)[0] + d
+      centers.extend([right, left])
+      contexts.extend([right + d, left - d])
+    centers = np.concatenate(centers)
+    order = np.argsort(centers, kind="stable")
+    centers = centers[order]
+    contexts = np.concatenate(contexts)[order]
+    return span[centers], span[contexts]
+
+
+def relation_targets(examples, syns, ants, contexts, num_syns, num_ants, rng):
+  """Context targets of the dLCE terms, as word2vec_dlce.relation_logits.
+
+  Every example gets num_syns + num_ants slots, its synonyms then its
+  antonyms, and each filled slot one context sampled uniformly from the
+  related word's contexts. syns, ants and contexts are RelationTables.
+
+  Returns:
+    targets: [n, num_syns + num_ants] int32 context ids.
+    labels: [num_syns + num_ants] float32, 1 for synonyms, 0 for antonyms.
+    weights: [n, num_syns + num_ants] float32, 1 / (number of synonyms or
+      antonyms of the example) for filled slots with contexts, else 0.
+  """
+  related, weights = [], []
+  for table, width in ((syns, num_syns), (ants, num_ants)):
+    starts = table.indptr[examples]
+    lengths = np.minimum(table.indptr[examples + 1] - starts, width)
+    mask = np.arange(width) < lengths[:, None]
+    idx = np.where(mask, starts[:, None] + np.arange(width), 0)
+    related.append(np.where(mask, table.values[idx], 0))
+    weights.append(mask / np.maximum(lengths, 1)[:, None])
+  related = np.concatenate(related, axis=1)
+  weights = np.concatenate(weights, axis=1)
+
+  starts = contexts.indptr[related]
+  lengths = contexts.indptr[related + 1] - starts
+  weights *= lengths > 0
+  offsets = (rng.random_sample(related.shape) * lengths).astype(np.int64)
+  offsets = np.minimum(offsets, np.maximum(lengths - 1, 0))
+  targets = np.where(lengths > 0,
+                     contexts.values[np.where(lengths > 0, starts + offsets, 0)],
+                     0)
+  labels = np.concatenate([np.ones(num_syns), np.zeros(num_ants)])
+  return (targets.astype(np.int32), labels.astype(np.float32),
+          weights.astype(np.float32))
+
+
+def training_targets(labels, negatives, relations=None):
+  """Output words, their labels and weights for a batch of examples.
+
+  Column 0 is the true label, then the negatives (weight 0 where a negative
+  equals the label, as the ops skip those), then any relation targets.
+
+  Returns:
+    targets: [n, t] int32, y: [t] float32, weights: [n, t] float32.
+  """
+  targets = [labels[:, None], negatives]
+  y = [np.ones(1), np.zeros(negatives.shape[1])]
+  weights = [np.ones((len(labels), 1)), negatives != labels[:, None]]
+  if relations is not None:
+    rel_targets, rel_labels, rel_weights = relations
+    targets.append(rel_targets)
+    y.append(rel_labels)
+    weights.append(rel_weights)
+  return (np.concatenate(targets, axis=1).astype(np.int32),
+          np.concatenate(y).astype(np.float32),
+          np.concatenate(weights, axis=1).astype(np.float32))
+
+
+def sgd_step(w_in, w_out, examples, targets, y, weights, lr):
+  """One minibatch SGD step of the weighted logistic loss, in place.
+
+  The loss of example i and target j is
+  -weights[i, j] * log(sigmoid(+/-w_in[examples[i]] . w_out[targets[i, j]]))
+  with the sign given by y[j].
+  """
+  v_in = w_in[examples]
+  v_out = w_out[targets]
+  dots = np.einsum("bd,btd->bt", v_in, v_out)
+  g = (lr * weights * (y - sigmoid(dots))).astype(np.float32)
+  np.add.at(w_out, targets.ravel(),
+            (g[:, :, None] * v_in[:, None, :]).reshape(-1, w_in.shape[1]))
+  np.add.at(w_in, examples, np.einsum("bt,btd->bd", g, v_out))
+
+
+if numba is not None:
+
+  @numba.njit(parallel=True, nogil=True, fastmath=True)
+  def hogwild_sgd(w_in, w_out, examples, targets, y, weights, lr):
+    """sgd_step with example-at-a-time updates over numba threads.
+
+    Threads update w_in and w_out without locks, like the
+    neg_train_word2vec kernel does across concurrent steps.
+    """
+    dims = w_in.shape[1]
+    for i in numba.prange(len(examples)):
+      v_in = w_in[examples[i]]
+      buf = np.zeros(dims, dtype=np.float32)
+      for j in range(targets.shape[1]):
+        if weights[i, j] == 0:
+          continue
+        v_out = w_out[targets[i, j]]
+        dot = np.float32(0)
+        for k in range(dims):
+          dot += v_in[k] * v_out[k]
+        g = lr * weights[i, j] * (y[j] - 1 / (1 + np.exp(-dot)))
+        for k in range(dims):
+          buf[k] += g * v_out[k]
+          v_out[k] += g * v_in[k]
+      for k in range(dims):
+        v_in[k] += buf[k]
+
+else:
+  hogwild_sgd = None
+
+
+def learning_rate(opts, words):
+  """Linear decay over epochs_to_train epochs, as in the ops."""
+  words_to_train = float(opts.words_per_epoch * opts.epochs_to_train)
+  return opts.learning_rate * max(0.0001, 1.0 - words / words_to_train)
+
+
+class SpanTrainer(object):
+  """Negative sampling SGD over the pairs of a span, in place.
+
+  The numpy backend steps batch_size examples at a time with sgd_step, the
+  numba backend hands chunks of 65536 examples to hogwild_sgd.
+  """
+
+  def __init__(self, options, sampler, relations=None, seed=None):
+    """sampler is a negative_sampler.AliasTable, relations are the model's
+    (syns, ants, contexts) RelationTables."""
+    self._options = options
+    self._rng = np.random.RandomState(seed)
+    self._sampler = sampler
+    self._relations = relations
+
+  def train(self, w_in, w_out, examples, labels, lr_at):
+    """Trains w_in and w_out on the (examples, labels) pairs of a span.
+
+    Args:
+      lr_at: learning rate of a step given the fraction of the span trained
+        before it.
+
+    Returns:
+      The number of steps taken.
+    """
+    opts = self._options
+    chunk = 1 << 16 if opts.backend == "numba" else opts.batch_size
+    steps = 0
+    for start in xrange(0, len(examples), chunk):
+      ex = examples[start:start + chunk]
+      lab = labels[start:start + chunk]
+      lr = np.float32(lr_at(start / max(len(examples), 1)))
+      negatives = self._sampler.sample((len(ex), opts.num_samples), self._rng)
+      relations = None
+      if self._relations is not None:
+        syns, ants, contexts = self._relations
+        relations = relation_targets(ex, syns, ants, contexts,
+                                     opts.num_syns, opts.num_ants, self._rng)
+      targets, y, weights = training_targets(lab, negatives, relations)
+      if opts.backend == "numba":
+        hogwild_sgd(w_in, w_out, ex, targets, y, weights, lr)
+      else:
+        sgd_step(w_in, w_out, ex, targets, y, weights, lr)
+      steps += 1
+    return steps
+
+
+class Word2Vec(object):
+  """Word2Vec model (Skipgram) trained in NumPy."""
+
+  def __init__(self, options, relations=None):
+    """Loads the corpus and sets up the model.
+
+    Args:
+      options: word2vec_optimized.Options, whose backend is numpy or numba,
+        or a subclass with num_syns and num_ants when relations are given.
+      relations: optional relation_table.VocabRelations; adds the dLCE
+        synonym and antonym terms to the loss.
+    """
+    if options.backend == "numba" and hogwild_sgd is None:
+      raise ImportError("--backend=numba needs numba, try --backend=numpy")
+    self._options = options
+    opts = options
+    ids, words, counts = corpus.load_corpus(opts.train_data, opts.min_count)
+    opts.vocab_words = np.array(words, dtype=object)
+    opts.vocab_counts = counts.astype(np.int32)
+    opts.words_per_epoch = len(ids)
+    opts.vocab_size = len(words)
+    print("Data file: ", opts.train_data)
+    print("Vocab size: ", opts.vocab_size - 1, " + UNK")
+    print("Words per epoch: ", opts.words_per_epoch)
+
+    self._id2word = opts.vocab_words
+    self._word2id = {w: i for i, w in enumerate(words)}
+    self._rng = np.random.RandomState()
+    self._batcher = SkipgramBatcher(ids, counts, opts.window_size,
+                                    opts.subsample)
+    self._relations = None
+    if relations is not None:
+      # A trailing entry keeps every values array non-empty, so masked
+      # lookups of index 0 stay in range.
+      self._relations = [
+          RelationTable(table.indptr, np.append(table.values, -1))
+          for table in relations.model_tables(self._word2id, opts.vocab_size)]
+    self._sampler = unigram_table(opts.save_path, counts)
+    self._trainer = SpanTrainer(opts, self._sampler, self._relations,
+                                self._rng.randint(1 << 31))
+
+    self._w_in = self._rng.uniform(
+        -0.5 / opts.emb_dim, 0.5 / opts.emb_dim,
+        [opts.vocab_size, opts.emb_dim]).astype(np.float32)
+    self._w_out = np.zeros([opts.vocab_size, opts.emb_dim], dtype=np.float32)
+    self.global_step = 0
+    self.refresh_normalized()
+    self.save_vocab()
+
+  def read_analogies(self):
+    """Reads through the analogy question file, see analogy_eval."""
+    (self._analogy_questions, self._analogy_categories,
+     self._analogy_category_names) = analogy_eval.read_analogies(
+         self._options.eval_data, self._word2id)
+
+  def save_vocab(self):
+    """Save the vocabulary to a file so the model can be reloaded."""
+    opts = self._options
+    with open(os.path.join(opts.save_path, "vocab.txt"), "w") as f:
+      for i in xrange(opts.vocab_size):
+        f.write("%s %d\n" % (opts.vocab_words[i], opts.vocab_counts[i]))
+
+  def learning_rate(self, words):
+    return learning_rate(self._options, words)
+
+  @property
+  def words(self):
+    """Words trained on so far, over all epochs."""
+    return self._batcher.words
+
+  def _train_span(self, examples, labels, words_before, span_words):
+    self.global_step += self._trainer.train(
+        self._w_in, self._w_out, examples, labels,
+        lambda done: self.learning_rate(words_before + span_words * done))
+
+  def train(self):
+    """Train the model for one epoch."""
+    initial_epoch = self._batcher.epoch
+    last_words, last_time = self._batcher.words, time.time()
+    while self._batcher.epoch == initial_epoch:
+      words_before = self._batcher.words
+      examples, labels = self._batcher.next_span()
+      self._train_span(examples, labels, words_before,
+                       self._batcher.words - words_before)
+      now = time.time()
+      if now - last_time > 5:  # Reports our progress once a while.
+        words = self._batcher.words
+        rate = (words - last_words) / (now - last_time)
+        last_words, last_time = words, now
+        print("Epoch %4d Step %8d: lr = %5.3f words/sec = %8.0f\r" %
+              (initial_epoch, self.global_step, self.learning_rate(words),
+               rate), end="")
+        sys.stdout.flush()
+    self.refresh_normalized()
+    return self._batcher.epoch
+
+  def refresh_normalized(self):
+    """Snapshots the normalized w_in that eval and nearby read."""
+    self._nemb = self._w_in / np.maximum(
+        np.linalg.norm(self._w_in, axis=1, keepdims=True), 1e-12)
+
+  def _predict_correct(self, analogy):
+    """Whether the best answer to each analogy question is its 4th word."""
+    return analogy_eval.analogy_correct_numpy(self._nemb, analogy)
+
+  def eval(self):
+    """Evaluate analogy questions and reports accuracy.
+
+    Returns:
+      A [n] bool vector, whether each question was answered correctly.
+    """
+    try:
+      questions = self._analogy_questions
+    except AttributeError as e:
+      raise AttributeError("Need to read analogy questions.")
+    return analogy_eval.evaluate(questions, self._analogy_categories,
+                                 self._analogy_category_names,
+                                 self._predict_correct)
+
+  def _query(self, a, b, c, k):
+    return analogy_eval.query_numpy(self._nemb, a, b, c, k)
+
+  def nearby_batch(self, words, num=20):
+    """The num nearest words of each word, by cosine similarity.
+
+    Args:
+      words: [n] word ids, or words as bytes; unknown words count as UNK.
+      num: neighbors per word, the word itself usually first.
+
+    Returns:
+      ids: int32 [n, num] word ids, best first.
+      scores: float32 [n, num] their cosine similarities.
+    """
+    ids = analogy_eval.word_ids(words, self._word2id)
+    return analogy_eval.batch_query(self._query, ids, ids, ids, num,
+                                    self._options.vocab_size)
+
+  def analogy_batch(self, analogies, num=1):
+    """The num best answers w3 to each w0:w1 vs w2:w3, other than w0..w2.
+
+    Args:
+      analogies: [n, 3] word ids, or words as bytes.
+      num: answers per analogy.
+
+    Returns:
+      ids: int32 [n, num] word ids, best first.
+      scores: float32 [n, num] their similarities to w2 + (w1 - w0).
+    """
+    q = analogy_eval.word_ids(analogies, self._word2id).reshape([-1, 3])
+    return analogy_eval.batch_query(self._query, q[:, 0], q[:, 1], q[:, 2],
+                                    num, self._options.vocab_size,
+                                    exclude=True)
+
+  def analogy(self, w0, w1, w2):
+    """Predict word w3 as in w0:w1 vs w2:w3."""
+    idx, _ = self.analogy_batch([[w0, w1, w2]])
+    print(self._id2word[idx[0, 0]])
+
+  def nearby(self, words, num=20):
+    """Prints out nearby words given a list of words."""
+    idx, vals = self.nearby_batch(words, num)
+    for i in xrange(len(words)):
+      print("\n%s\n=====================================" % (words[i]))
+      for (neighbor, distance) in zip(idx[i], vals[i]):
+        print("%-20s %6.4f" % (self._id2word[neighbor], distance))
+
+  def save(self):
+    """Saves w_in and w_out to <save_path>/model-<global_step>.npz."""
+    path = os.path.join(self._options.save_path,
+                        "model-%d.npz" % self.global_step)
+    np.savez(path, w_in=self._w_in, w_out=self._w_out)
+    return path
+
+  def export(self):
+    """Exports the embeddings for embeddings.Embeddings to load."""
+    embeddings.export_model(self._options, self._w_in, self._w_out,
+                            self.global_step)
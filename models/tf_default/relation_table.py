@@ -0,0 +1,272 @@
+# Copyright 2015 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+"""Word relation tables (synonyms, antonyms, contexts) in CSR layout.
+
+Row i of a table holds the ids related to word i as
+values[indptr[i]:indptr[i + 1]], so rows of different lengths need no
+padding. A table is stored as two .npy files, <prefix>.indptr.npy (int64,
+num_rows + 1 entries) and <prefix>.values.npy (int32), which load
+memory-mapped.
+
+VocabRelations holds the synonym, antonym and context tables built from the
+pickles of a vocabs_root directory (see data/scripts/extract_wn_syn_ant.py)
+and maps them onto the word ids of a model. fed_variable and
+relation_variables import TensorFlow when called, so that numpy_backend
+can use the tables without it.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import json
+import os
+import pickle
+
+import numpy as np
+
+from corpus import parse_vocab_word
+
+
+def parse_vocab_to_id_word_dict(vocab_path, min_freq):
+  id_word = {}
+  with open(vocab_path, 'r') as v:
+    for i, l in enumerate(v.readlines()):
+        w, freq = l.split(' ')
+        if int(freq) >= min_freq:
+            id_word[i] = parse_vocab_word(w)
+  return id_word
+
+
+def word_dict_to_id_dict(id_word, pickle_path):
+  word_id = {w: i for i, w in id_word.items()}
+
+  id_dict = {}
+
+  with open(pickle_path, 'rb') as f:
+    d = pickle.load(f)
+    for w, ss in d.items():
+      if w in word_id:
+        id_dict[word_id[w]] = list(map(lambda s: word_id[s], filter(lambda xs: xs in word_id, ss)))
+
+  return id_dict
+
+
+def read_id_dict(pickle_path):
+  with open(pickle_path, 'rb') as f:
+    return pickle.load(f)
+
+
+class RelationTable(object):
+  """Rows of related word ids as CSR offsets plus values."""
+
+  def __init__(self, indptr, values):
+    self.indptr = indptr
+    self.values = values
+
+  @classmethod
+  def from_pairs(cls, rows, values, num_rows):
+    """Builds a table from parallel arrays of row ids and related ids.
+
+    Entries keep their relative order within a row.
+    """
+    rows = np.asarray(rows, dtype=np.int64)
+    order = np.argsort(rows, kind="stable")
+    indptr = np.zeros(num_rows + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=num_rows), out=indptr[1:])
+    return cls(indptr, np.asarray(values, dtype=np.int32)[order])
+
+  @classmethod
+  def from_dict(cls, id_dict, num_rows):
+    """Builds a table from a {row id: [related ids]} dict.
+
+    Rows outside [0, num_rows) are dropped, missing rows are empty.
+    """
+    keys = [k for k, v in id_dict.items() if 0 <= k < num_rows and v]
+    lengths = [len(id_dict[k]) for k in keys]
+    rows = np.repeat(np.array(keys, dtype=np.int64), lengths)
+    values = [v for k in keys for v in id_dict[k]]
+    return cls.from_pairs(rows, values, num_rows)
+
+  @classmethod
+  def load(cls, prefix, mmap_mode="r"):
+    return cls(np.load(prefix + ".indptr.npy", mmap_mode=mmap_mode),
+               np.load(prefix + ".values.npy", mmap_mode=mmap_mode))
+
+  @staticmethod
+  def exists(prefix):
+    return (os.path.isfile(prefix + ".indptr.npy") and
+            os.path.isfile(prefix + ".values.npy"))
+
+  def save(self, prefix):
+    np.save(prefix + ".indptr.npy", np.asarray(self.indptr, dtype=np.int64))
+    np.save(prefix + ".values.npy", np.asarray(self.values, dtype=np.int32))
+
+  @property
+  def num_rows(self):
+    return len(self.indptr) - 1
+
+  def lengths(self):
+    return np.diff(self.indptr)
+
+  def row(self, i):
+    return self.values[self.indptr[i]:self.indptr[i + 1]]
+
+  def row_ids(self):
+    """Row id of every entry of values."""
+    return np.repeat(np.arange(self.num_rows, dtype=np.int64), self.lengths())
+
+  def cut(self, num, seed=None):
+    """Keeps a random sample of at most num entries of every row."""
+    rows = self.row_ids()
+    rng = np.random.RandomState(seed)
+    # Rows stay grouped after sorting by (row, random key), so an entry's
+    # rank within its row is its position minus the row start.
+    order = np.lexsort((rng.random_sample(len(rows)), rows))
+    rank = np.arange(len(rows)) - self.indptr[rows]
+    keep = np.sort(order[rank < num])
+    return RelationTable.from_pairs(rows[keep], self.values[keep],
+                                    self.num_rows)
+
+  def remap(self, id_map, num_rows):
+    """Translates row and value ids through id_map, -1 meaning no mapping.
+
+    Ids past the end of id_map are unmapped too. Entries whose row or value
+    is unmapped are dropped.
+    """
+    id_map = np.append(np.asarray(id_map, dtype=np.int64), -1)
+    rows = id_map[np.minimum(self.row_ids(), len(id_map) - 1)]
+    values = id_map[np.minimum(np.asarray(self.values, dtype=np.int64),
+                               len(id_map) - 1)]
+    # Negative values (old padding) map to the trailing -1 as well.
+    values[np.asarray(self.values) < 0] = -1
+    keep = (rows >= 0) & (values >= 0)
+    return RelationTable.from_pairs(rows[keep], values[keep], num_rows)
+
+
+def load_relation_table(prefix, source_paths, build):
+  """Memory-maps the table cached at prefix.
+
+  The cache is rebuilt with build() when it is missing or when any of
+  source_paths changed size or mtime since it was built. The sizes and
+  mtimes are kept in <prefix>.json.
+  """
+  meta = {"sources": {}}
+  for path in source_paths:
+    stat = os.stat(path)
+    meta["sources"][os.path.basename(path)] = [stat.st_size, stat.st_mtime_ns]
+  if RelationTable.exists(prefix) and os.path.isfile(prefix + ".json"):
+    with open(prefix + ".json", "r") as f:
+      if json.load(f) == meta:
+        return RelationTable.load(prefix)
+  build().save(prefix)
+  with open(prefix + ".json", "w") as f:
+    json.dump(meta, f)
+  return RelationTable.load(prefix)
+
+
+class VocabRelations(object):
+  """Synonym, antonym and context tables of a vocabs_root directory.
+
+  The tables come from syn.pickle, ant.pickle and context.pickle, cut to
+  at most num_syns, num_ants and num_ctx entries per word. Their rows and
+  values are vocab.txt line ids; model_tables translates them to model ids.
+  """
+
+  def __init__(self, vocabs_root, min_count, num_syns, num_ants, num_ctx):
+    self.vocabs_root = vocabs_root
+    print('Parsing vocab ids')
+    vocab_path = os.path.join(vocabs_root, "vocab.txt")
+    self.vocab_path = vocab_path
+    self.word_id = parse_vocab_to_id_word_dict(vocab_path, min_count)
+    # Tables are cached over every vocab.txt line, whatever the min_count.
+    all_words = parse_vocab_to_id_word_dict(vocab_path, 0)
+    self.num_rows = len(all_words)
+    print('Parsing syn ids')
+    self.syns = self.load(
+        "syn", num_syns, lambda path: word_dict_to_id_dict(all_words, path))
+    print('Parsing ant ids')
+    self.ants = self.load(
+        "ant", num_ants, lambda path: word_dict_to_id_dict(all_words, path))
+    print('Parsing contexts')
+    self.contexts = self.load("context", num_ctx, read_id_dict)
+
+  def load(self, name, num, read):
+    """RelationTable of <name>.pickle, at most num entries per word.
+
+    The table is cached as <name>_<num>.{indptr,values}.npy next to the
+    pickle, and rebuilt when the pickle or vocab.txt, whose line ids it
+    holds, changes.
+    """
+    source = os.path.join(self.vocabs_root, name + ".pickle")
+    prefix = os.path.join(self.vocabs_root, "%s_%d" % (name, num))
+    return load_relation_table(
+        prefix, [source, self.vocab_path],
+        lambda: RelationTable.from_dict(read(source), self.num_rows).cut(num))
+
+  def id_map(self, word2id):
+    """Model id of every vocab.txt line, -1 if the word is not trained.
+
+    word2id maps the model's words, as bytes, to ids.
+    """
+    id_map = np.full(self.num_rows, -1, dtype=np.int64)
+    for i, w in self.word_id.items():
+      id_map[i] = word2id.get(w.encode("utf-8"), -1)
+    return id_map
+
+  def model_tables(self, word2id, vocab_size):
+    """(syns, ants, contexts) with rows and values in model ids."""
+    id_map = self.id_map(word2id)
+    return tuple(table.remap(id_map, vocab_size)
+                 for table in (self.syns, self.ants, self.contexts))
+
+
+def fed_variable(array, name):
+  """A non-trainable variable holding array, fed once per session.
+
+  The variable starts out uninitialized with its initial value fed through
+  a placeholder, so the data never enters the GraphDef. It is in no
+  collection, which keeps it out of global_variables_initializer() and of
+  the Saver's checkpoints.
+
+  Returns:
+    var: the variable.
+    init: (initializer, feed_dict) to run once per session.
+  """
+  import tensorflow as tf  # pylint: disable=g-import-not-at-top
+  value = tf.placeholder(tf.as_dtype(array.dtype), shape=array.shape,
+                         name="%s_value" % name)
+  var = tf.Variable(value, trainable=False, collections=[], name=name)
+  return var, (var.initializer, {value: array})
+
+
+def relation_variables(table, name):
+  """Non-trainable (indptr, values) variables holding table.
+
+  See fed_variable.
+
+  Returns:
+    variables: the (indptr, values) pair.
+    inits: (initializer, feed_dict) pairs to run once per session.
+  """
+  # A trailing -1 keeps values non-empty, so masked gathers of index 0
+  # stay in range even for a table without entries.
+  values = np.append(np.asarray(table.values, dtype=np.int32), -1)
+  variables, inits = [], []
+  for part, array in (("indptr", np.asarray(table.indptr)), ("values", values)):
+    var, init = fed_variable(array, "%s_%s" % (name, part))
+    variables.append(var)
+    inits.append(init)
+  return tuple(variables), inits
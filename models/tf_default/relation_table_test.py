@@ -0,0 +1,85 @@
+# Copyright 2015 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+"""Tests for relation_table module."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+
+import numpy as np
+import tensorflow as tf
+
+from relation_table import RelationTable
+from relation_table import load_relation_table
+
+
+class RelationTableTest(tf.test.TestCase):
+
+  def setUp(self):
+    self.table = RelationTable.from_dict(
+        {0: [3, 1, 2], 2: [0], 4: [1, 1, 2, 3, 0], 9: [1]}, 5)
+
+  def testFromDict(self):
+    self.assertAllEqual(self.table.indptr, [0, 3, 3, 4, 4, 9])
+    self.assertAllEqual(self.table.values, [3, 1, 2, 0, 1, 1, 2, 3, 0])
+
+  def testCut(self):
+    cut = self.table.cut(2, seed=0)
+    self.assertAllEqual(cut.lengths(), [2, 0, 1, 0, 2])
+    for i in range(5):
+      self.assertTrue(set(cut.row(i)) <= set(self.table.row(i)))
+
+  def testRemap(self):
+    remapped = self.table.remap([1, 0, -1, 2], 3)
+    self.assertAllEqual(remapped.indptr, [0, 0, 2, 2])
+    self.assertAllEqual(remapped.values, [2, 0])
+
+  def testSaveLoad(self):
+    prefix = os.path.join(self.get_temp_dir(), "syn_10")
+    self.table.save(prefix)
+    self.assertTrue(RelationTable.exists(prefix))
+    loaded = RelationTable.load(prefix)
+    self.assertIsInstance(loaded.values, np.memmap)
+    self.assertAllEqual(loaded.indptr, self.table.indptr)
+    self.assertAllEqual(loaded.values, self.table.values)
+
+  def testLoadRebuildsOnNewVocab(self):
+    prefix = os.path.join(self.get_temp_dir(), "ant_3")
+    sources = [os.path.join(self.get_temp_dir(), name)
+               for name in ("ant.pickle", "vocab.txt")]
+    for path in sources:
+      with open(path, "w") as f:
+        f.write("b'word' 5\n")
+    builds = []
+
+    def build():
+      builds.append(1)
+      return self.table
+
+    load_relation_table(prefix, sources, build)
+    load_relation_table(prefix, sources, build)
+    self.assertEqual(len(builds), 1)
+    # A vocab.txt regenerated with another min_count.
+    with open(sources[1], "w") as f:
+      f.write("b'word' 5\nb'other' 1\n")
+    load_relation_table(prefix, sources, build)
+    self.assertEqual(len(builds), 2)
+
+
+if __name__ == "__main__":
+  tf.test.main()
@@ -0,0 +1,92 @@
+# Copyright 2015 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+"""Continued training of word2vec_dlce on a new shard, --warm_start.
+
+The model of a previous run is its save_path: vocab.txt plus the latest
+checkpoint. A warm start keeps every word of that vocabulary at its old id,
+however rare it is in the new shard, appends the words the shard admits
+(min_count occurrences in the shard) after them, and adds the shard's counts
+to the old ones. The shard is therefore encoded with min_count 1, and
+min_count applies only to new words. The trained rows of
+emb, sm_w_t and sm_b are restored; the rows of new words keep their fresh
+initialization. Training then runs over the new shard only.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+
+import numpy as np
+import tensorflow as tf
+
+import corpus
+
+
+def grow_vocab(old_words, old_counts, words, counts, min_count=0):
+  """Appends the words of a shard vocabulary missing from an old one.
+
+  Args:
+    old_words, old_counts: the previous vocabulary, UNK first.
+    words, counts: the shard's vocabulary, UNK first.
+    min_count: shard count below which a new word maps to UNK.
+
+  Returns:
+    words: the old words then the new ones.
+    counts: int64 counts, old plus shard.
+    id_map: int32 id in the grown vocabulary of every shard id.
+  """
+  word_id = {w: i for i, w in enumerate(old_words)}
+  grown = list(old_words)
+  grown_counts = list(old_counts)
+  id_map = np.zeros(len(words), dtype=np.int32)
+  for i, (w, c) in enumerate(zip(words, counts)):
+    # Shard UNK stays UNK whatever its spelling.
+    j = 0 if i == 0 else word_id.get(w)
+    if j is None and c < min_count:
+      j = 0
+    elif j is None:
+      j = len(grown)
+      grown.append(w)
+      grown_counts.append(0)
+    grown_counts[j] += c
+    id_map[i] = j
+  return grown, np.array(grown_counts, dtype=np.int64), id_map
+
+
+def read_model_vocab(model_path):
+  """Words and counts of the vocab.txt written by save_vocab."""
+  words, counts = corpus.read_vocab(os.path.join(model_path, "vocab.txt"))
+  return words, np.array(counts, dtype=np.int64)
+
+
+def restore_rows(session, model_path, variables):
+  """Overwrites the leading rows of variables with a checkpoint's values.
+
+  Each variable is restored from the tensor of the same name in the latest
+  checkpoint of model_path, which may have fewer rows.
+  """
+  checkpoint = tf.train.latest_checkpoint(model_path)
+  if checkpoint is None:
+    raise ValueError("No checkpoint in %s" % model_path)
+  reader = tf.train.NewCheckpointReader(checkpoint)
+  for var in variables:
+    saved = reader.get_tensor(var.op.name)
+    value = session.run(var)
+    value[:saved.shape[0]] = saved
+    var.load(value, session)
+  print("Restored %s from %s" %
+        (", ".join(var.op.name for var in variables), checkpoint))
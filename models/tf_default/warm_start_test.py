@@ -0,0 +1,51 @@
+# Copyright 2015 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+"""Tests for warm_start module."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import tensorflow as tf
+
+from warm_start import grow_vocab
+
+
+class GrowVocabTest(tf.test.TestCase):
+
+  def testGrowVocab(self):
+    words, counts, id_map = grow_vocab(
+        [b"UNK", b"the", b"cat"], [7, 50, 9],
+        [b"UNK", b"the", b"dog", b"cat", b"emu"], [3, 20, 6, 5, 5])
+    self.assertEqual(words, [b"UNK", b"the", b"cat", b"dog", b"emu"])
+    self.assertAllEqual(counts, [10, 70, 14, 6, 5])
+    self.assertAllEqual(id_map, [0, 1, 3, 2, 4])
+
+  def testGrowVocabKeepsRareOldWords(self):
+    # The shard encoded with min_count 1: cat, an old word, appears once.
+    words, counts, id_map = grow_vocab(
+        [b"UNK", b"the", b"cat"], [7, 50, 9],
+        [b"UNK", b"the", b"dog", b"cat", b"emu"], [0, 20, 6, 1, 1],
+        min_count=5)
+    self.assertEqual(words, [b"UNK", b"the", b"cat", b"dog"])
+    # cat keeps its id and count; only the rare new word emu is UNK.
+    self.assertEqual(id_map[3], 2)
+    self.assertAllEqual(counts, [8, 70, 10, 6])
+    self.assertAllEqual(id_map, [0, 1, 3, 2, 0])
+
+
+if __name__ == "__main__":
+  tf.test.main()
@@ -36,20 +36,35 @@ import os
 import sys
 import threading
 import time
-import pickle
-from collections import OrderedDict
 
 from six.moves import xrange  # pylint: disable=redefined-builtin
-import random
 import pandas as pd
 
 import numpy as np
 import tensorflow as tf
 
-word2vec = tf.load_op_library(os.path.join(os.path.dirname(os.path.realpath(__file__)), 'word2vec_ops.so'))
+import analogy_eval
+import embeddings
+import input_pipeline
+import lr_schedule
+from negative_sampler import alias_variables, sample_alias, unigram_table
+from relation_table import VocabRelations, relation_variables
+import warm_start
+
+try:
+  word2vec = tf.load_op_library(os.path.join(os.path.dirname(os.path.realpath(__file__)), 'word2vec_ops.so'))
+except tf.errors.NotFoundError:
+  # Only --input=dataset can train without the compiled ops.
+  word2vec = None
 
 flags = tf.app.flags
 
+flags.DEFINE_string("warm_start", None,
+                    "save_path of a previous run to continue training from: "
+                    "its vocabulary grows by the new words of --train_data "
+                    "and emb, sm_w_t and sm_b start from its latest "
+                    "checkpoint. Needs --input=dataset.")
+
 flags.DEFINE_string("vocabs_root", '/tmp/bnc', "Directory to get vocabulary, synonyms and antonyms from.")
 
 flags.DEFINE_integer("syn_threshold", 3, "Minimal number of synonyms target word must have")
@@ -80,8 +95,26 @@ flags.DEFINE_integer("num_neg_samples", 100,
 flags.DEFINE_integer("batch_size", 16,
                      "Number of training examples processed per step "
                      "(size of a minibatch).")
+flags.DEFINE_string("lr_scaling", "none",
+                    "How the learning rate grows with batch_size: none, "
+                    "sqrt or linear in batch_size / lr_base_batch_size. "
+                    "See lr_schedule.py.")
+flags.DEFINE_integer("lr_base_batch_size", 16,
+                     "Batch size learning_rate is tuned for.")
+flags.DEFINE_integer("lr_warmup_words", 0,
+                     "Number of training words over which the learning rate "
+                     "ramps up linearly from 0. Large batches want a few "
+                     "million.")
 flags.DEFINE_integer("concurrent_steps", 12,
                      "The number of concurrent training steps.")
+flags.DEFINE_string("input", "dataset",
+                    "Where training batches come from: dataset (the tf.data "
+                    "pipeline of input_pipeline.py) or op (the "
+                    "skipgram_word2vec op).")
+flags.DEFINE_integer("input_threads", 4,
+                     "Parallel map calls of the dataset input.")
+flags.DEFINE_integer("input_prefetch", 64,
+                     "Batches the dataset input prepares ahead of training.")
 flags.DEFINE_integer("window_size", 5,
                      "The number of words to predict to the left and right "
                      "of the target word.")
@@ -97,6 +130,13 @@ flags.DEFINE_boolean(
     "If true, enters an IPython interactive session to play with the trained "
     "model. E.g., try model.analogy(b'france', b'paris', b'russia') and "
     "model.nearby([b'proton', b'elephant', b'maxwell'])")
+flags.DEFINE_string(
+    "export_dtype", "float32",
+    "float32 or float16: dtype of the embeddings exported to "
+    "<save_path>/export at the end of training, see embeddings.py. none "
+    "skips the export.")
+flags.DEFINE_boolean("export_sm_w_t", False,
+                     "Also export the output embeddings sm_w_t.")
 flags.DEFINE_integer("statistics_interval", 5,
                      "Print statistics every n seconds.")
 flags.DEFINE_integer("summary_interval", 5,
@@ -108,47 +148,6 @@ flags.DEFINE_integer("checkpoint_interval", 600,
 
 FLAGS = flags.FLAGS
 
-def parse_vocab_to_id_word_dict(vocab_path, min_freq):
-  id_word = {}
-  with open(vocab_path, 'r') as v:
-    for i, l in enumerate(v.readlines()):
-        w, freq = l.split(' ')
-        if int(freq) >= min_freq:
-            id_word[i] = w
-  return id_word
-
-
-def pad_id_dict(id_dict, pad):
-  max_length = max(map(lambda x: len(x), id_dict.values()))
-
-  for k, v in id_dict.items():
-    id_dict[k] += [pad] * (max_length - len(v))
-
-  return id_dict
-
-
-def cut_id_dict(id_dict, cut):
-  for k, v in id_dict.items():
-    if len(v) > cut:
-      id_dict[k] = random.sample(v, cut)
-
-  return id_dict
-
-
-def word_dict_to_id_dict(id_word, pickle_path):
-  word_id = {w: i for i, w in id_word.items()}
-
-  id_dict = {}
-
-  with open(pickle_path, 'rb') as f:
-    d = pickle.load(f)
-    for w, ss in d.items():
-      if w in word_id:
-        id_dict[word_id[w]] = list(map(lambda s: word_id[s], filter(lambda xs: xs in word_id, ss)))
-
-  return id_dict
-
-
 class Options(object):
   """Options used by our word2vec model."""
 
@@ -172,6 +171,12 @@ class Options(object):
     # rate decays linearly to zero and the training stops.
     self.epochs_to_train = FLAGS.epochs_to_train
 
+    # Learning rate scaling rule for the batch size, the batch size
+    # learning_rate is meant for, and the warmup. See lr_schedule.py.
+    self.lr_scaling = FLAGS.lr_scaling
+    self.lr_base_batch_size = FLAGS.lr_base_batch_size
+    self.lr_warmup_words = FLAGS.lr_warmup_words
+
     # Concurrent training steps.
     self.concurrent_steps = FLAGS.concurrent_steps
 
@@ -188,6 +193,12 @@ class Options(object):
     # Subsampling threshold for word occurrence.
     self.subsample = FLAGS.subsample
 
+    # Training input: the tf.data pipeline or the skipgram op, and the
+    # pipeline's parallelism and prefetch depth.
+    self.input = FLAGS.input
+    self.input_threads = FLAGS.input_threads
+    self.input_prefetch = FLAGS.input_prefetch
+
     # How often to print statistics.
     self.statistics_interval = FLAGS.statistics_interval
 
@@ -208,8 +219,15 @@ class Options(object):
     # The text file for eval.
     self.eval_data = FLAGS.eval_data
 
+    # Export at the end of training, see embeddings.py.
+    self.export_dtype = FLAGS.export_dtype
+    self.export_sm_w_t = FLAGS.export_sm_w_t
+
     self.vocabs_root = FLAGS.vocabs_root
 
+    # save_path of the model to continue training, see warm_start.py.
+    self.warm_start = FLAGS.warm_start
+
     self.syn_threshold = FLAGS.syn_threshold
     self.num_syns = FLAGS.num_syns
 
@@ -228,51 +246,21 @@ class Word2Vec(object):
     self._word2id = {}
     self._id2word = []
     self.temp_output = []
-    print('Parsing vocab ids')
-    self.word_id = parse_vocab_to_id_word_dict(os.path.join(options.vocabs_root, "vocab.txt"), options.min_count)
-    print('Parsing syn ids')
-    self.syns = pad_id_dict(cut_id_dict(word_dict_to_id_dict(self.word_id, os.path.join(options.vocabs_root, "syn.pickle")), options.num_syns), -1)
-    print('Parsing ant ids')
-    self.ants = pad_id_dict(cut_id_dict(word_dict_to_id_dict(self.word_id, os.path.join(options.vocabs_root, "ant.pickle")), options.num_ants), -1)
-    print('Parsing contexts')
-    with open(os.path.join(options.vocabs_root, "context.pickle"), 'rb') as ct:
-        self.contexts = pad_id_dict(cut_id_dict(pickle.load(ct), options.num_ctx), -1)
-    # print('Parsing lmi')
-    # if os.path.isfile(os.path.join(options.vocabs_root, "lmi.pickle")):
-    #     self.lmi_df = pd.read_pickle(os.path.join(options.vocabs_root, "lmi.pickle"))
-    # else:
-    #     lmi = lambda x: x.index.to_series().apply(lambda y: 1.0 * self.contexts[y].count(x.name) * pd.np.log2(self.contexts[y].count(x.name) / (len(self.contexts[y]) * len(self.contexts[x.name]))))
-    #     lmi_df = pd.DataFrame(columns=list(self.word_id.keys()), index=list(self.word_id.keys()))
-    #     self.lmi_df = lmi_df.apply(lmi, axis=1)
-    #     pd.to_pickle(self.lmi_df, os.path.join(options.vocabs_root, "lmi.pickle"))
+    self._relation_inits = []
+    self.relations = VocabRelations(
+        options.vocabs_root, options.min_count,
+        options.num_syns, options.num_ants, options.num_ctx)
+    self.word_id = self.relations.word_id
     self.build_graph()
     self.build_eval_graph()
+    self.refresh_normalized()
     self.save_vocab()
 
   def read_analogies(self):
-    """Reads through the analogy question file.
-
-    Returns:
-      questions: a [n, 4] numpy array containing the analogy question's
-                 word ids.
-      questions_skipped: questions skipped due to unknown words.
-    """
-    questions = []
-    questions_skipped = 0
-    with open(self._options.eval_data, "rb") as analogy_f:
-      for line in analogy_f:
-        if line.startswith(b":"):  # Skip comments.
-          continue
-        words = line.strip().lower().split(b" ")
-        ids = [self._word2id.get(w.strip()) for w in words]
-        if None in ids or len(ids) != 4:
-          questions_skipped += 1
-        else:
-          questions.append(np.array(ids))
-    print("Eval analogy file: ", self._options.eval_data)
-    print("Questions: ", len(questions))
-    print("Skipped: ", questions_skipped)
-    self._analogy_questions = np.array(questions, dtype=np.int32)
+    """Reads through the analogy question file, see analogy_eval."""
+    (self._analogy_questions, self._analogy_categories,
+     self._analogy_category_names) = analogy_eval.read_analogies(
+         self._options.eval_data, self._word2id)
 
   def forward(self, examples, labels):
     """Build the graph for the forward pass."""
@@ -287,14 +275,18 @@ class Word2Vec(object):
         name="emb")
     self._emb = emb
 
-    # Synonyms: [vocab_size, opts.num_syns]
-    syn_table = tf.constant(list(OrderedDict(sorted(self.syns.items(), key=lambda t: t[0])).values()))
+    # Relation tables over model ids, each an (indptr, values) CSR pair:
+    # indptr [vocab_size + 1] and values [number of related pairs].
+    syns, ants, contexts = self.relations.model_tables(
+        self._word2id, opts.vocab_size)
+    # Synonyms: at most opts.num_syns per word.
+    syn_table = self.relation_tensors(syns, "syn")
 
-    # Antonyms: [vocab_size, opts.num_ants]
-    ant_table = tf.constant(list(OrderedDict(sorted(self.ants.items(), key=lambda t: t[0])).values()))
+    # Antonyms: at most opts.num_ants per word.
+    ant_table = self.relation_tensors(ants, "ant")
 
-    # Contexts: [vocab_size, opts.num_ctx]
-    ctx_table = tf.constant(list(OrderedDict(sorted(self.contexts.items(), key=lambda t: t[0])).values()))
+    # Contexts: at most opts.num_ctx per word.
+    ctx_table = self.relation_tensors(contexts, "ctx")
 
     # LMI: [vocab_size, vocab_size]
     # lmi_table = tf.constant(self.lmi_df.values)
@@ -306,25 +298,18 @@ class Word2Vec(object):
 
     # Softmax bias: [vocab_size].
     sm_b = tf.Variable(tf.zeros([opts.vocab_size]), name="sm_b")
+    self._sm_w_t = sm_w_t
+    self._sm_b = sm_b
 
     # Global step: scalar, i.e., shape [].
     self.global_step = tf.Variable(0, name="global_step")
 
-    # Nodes to compute the nce loss w/ candidate sampling.
-    labels_matrix = tf.reshape(
-        tf.cast(labels,
-                dtype=tf.int64),
-        [opts.batch_size, 1])
-
-    # Negative sampling.
-    sampled_ids, _, _ = (tf.nn.fixed_unigram_candidate_sampler(
-        true_classes=labels_matrix,
-        num_true=1,
-        num_sampled=opts.num_samples,
-        unique=True,
-        range_max=opts.vocab_size,
-        distortion=0.75,
-        unigrams=opts.vocab_counts.tolist()))
+    # Negative sampling from the unigram^0.75 alias table, stored next to
+    # vocab.txt and fed into variables rather than baked into the graph.
+    alias_vars, inits = alias_variables(
+        unigram_table(opts.save_path, opts.vocab_counts))
+    self._relation_inits.extend(inits)
+    sampled_ids = sample_alias(alias_vars, opts.num_samples)
 
     # Embeddings for examples: [batch_size, emb_dim]
     example_emb = tf.nn.embedding_lookup(emb, examples)
@@ -337,25 +322,9 @@ class Word2Vec(object):
 
     # labels_plmi_syns = self.get_plmi(labels, lmi_table)
 
-    # examples_all_syns = self.get_nonyms(examples, syn_table)
-    examples_syns = self.get_nonyms(examples, syn_table)
-    # examples_syns = tf.sets.intersection(examples_all_syns, labels_plmi_syns)
-    # self.temp_output.extend([tf.Variable("Synonyms"), examples_syns])
-
-    syn_logits = tf.where(tf.shape(examples_syns) < 1,
-                   self.get_logits(ctx_table, example_emb, examples_syns, opts.num_syns, sm_b, sm_w_t),
-                   tf.zeros_like(examples_syns, dtype='float')
-    )
-
-    # examples_all_ants = self.get_nonyms(examples, ant_table)
-    examples_ants = self.get_nonyms(examples, ant_table)
-    # examples_ants = tf.sets.intersection(examples_all_ants, labels_plmi_syns)
-    # self.temp_output.extend([tf.Variable("Antonyms"), examples_ants])
-
-    ant_logits = tf.where(tf.shape(examples_ants) < 1,
-                   self.get_logits(ctx_table, example_emb, examples_ants, opts.num_ants, sm_b, sm_w_t),
-                   tf.zeros_like(examples_ants, dtype='float')
-    )
+    # dLCE terms: [batch_size, num_syns + num_ants] each.
+    rel_logits, rel_labels, rel_weights = self.relation_logits(
+        example_emb, examples, syn_table, ant_table, ctx_table, sm_w_t, sm_b)
 
     # Weights for sampled ids: [num_sampled, emb_dim]
     sampled_w = tf.nn.embedding_lookup(sm_w_t, sampled_ids)
@@ -373,44 +342,113 @@ class Word2Vec(object):
                                sampled_w,
                                transpose_b=True) + sampled_b_vec
 
-    return true_logits, sampled_logits, syn_logits, ant_logits
+    return (true_logits, sampled_logits,
+            rel_logits, rel_labels, rel_weights)
 
-  def get_logits(self, ctx_table, example_emb, examples, num, sm_b, sm_w_t):
-    labels = self.get_labels(examples, ctx_table)
-    self.temp_output.extend([tf.Variable("-- Labels"), labels])
-    true_w = tf.nn.embedding_lookup(sm_w_t, labels)
-    true_b = tf.nn.embedding_lookup(sm_b, examples)
-    logits = (tf.reduce_sum(tf.multiply(example_emb, true_w), 1) + true_b) / num
-    return logits
+  def relation_logits(self, example_emb, examples, syn_table, ant_table,
+                      ctx_table, sm_w_t, sm_b):
+    """Logits of the synonym and antonym terms for the whole batch.
 
-  def get_nonyms(self, examples, table):
-    examples_with_missing = tf.reshape(tf.gather(table, examples), [-1, 1])
-    return tf.boolean_mask(examples_with_missing, tf.greater(examples_with_missing, -1))
+    Every example gets num_syns + num_ants relation slots, its synonyms then
+    its antonyms padded with -1. One context is sampled for each related
+    word in a single pass, and the example is scored against that context,
+    with label 1 for synonyms and 0 for antonyms. Each kind of relation
+    weighs 1 in total per example, split evenly over its filled slots.
+
+    Returns:
+      logits, labels, weights: [batch_size, num_syns + num_ants] each. Empty
+      slots, and related words without contexts, have weight 0.
+    """
+    opts = self._options
+    syns = self.gather_relations(syn_table, examples, opts.num_syns)
+    ants = self.gather_relations(ant_table, examples, opts.num_ants)
+
+    syn_mask = tf.cast(syns >= 0, tf.float32)
+    ant_mask = tf.cast(ants >= 0, tf.float32)
+    weights = tf.concat([
+        syn_mask / tf.maximum(tf.reduce_sum(syn_mask, 1, keep_dims=True), 1.0),
+        ant_mask / tf.maximum(tf.reduce_sum(ant_mask, 1, keep_dims=True), 1.0)
+    ], 1)
+    labels = tf.concat([tf.ones_like(syn_mask), tf.zeros_like(ant_mask)], 1)
+
+    related = tf.concat([syns, ants], 1)
+    contexts, has_context = self.sample_relations(
+        ctx_table, tf.maximum(related, 0))
+    contexts = tf.reshape(tf.maximum(contexts, 0), tf.shape(related))
+    weights *= tf.cast(tf.reshape(has_context, tf.shape(related)), tf.float32)
+
+    # [batch_size, num_syns + num_ants, emb_dim]
+    context_w = tf.nn.embedding_lookup(sm_w_t, contexts)
+    context_b = tf.nn.embedding_lookup(sm_b, contexts)
+    logits = tf.reduce_sum(
+        tf.expand_dims(example_emb, 1) * context_w, 2) + context_b
+    return logits, labels, weights
+
+  def relation_tensors(self, table, name):
+    """(indptr, values) variables of table, see relation_variables."""
+    variables, inits = relation_variables(table, name)
+    self._relation_inits.extend(inits)
+    return variables
+
+  def init_relation_tables(self):
+    """Feeds the relation tables into their variables, once per session."""
+    for initializer, feed in self._relation_inits:
+      self._session.run(initializer, feed)
+    # The session holds the only copy we need from here on.
+    self._relation_inits = []
+
+  def gather_relations(self, table, rows, width=None):
+    """Gathers the related ids of rows from an (indptr, values) table.
+
+    Returns:
+      A [n, width] int32 matrix padded with -1 and cut at width entries.
+      Without a width it is as wide as the longest of the gathered rows
+      rather than the longest of the whole table.
+    """
+    indptr, values = table
+    starts = tf.gather(indptr, rows)
+    lengths = tf.gather(indptr, rows + 1) - starts
+    if width is None:
+      offsets = tf.range(tf.reduce_max(lengths))
+    else:
+      offsets = tf.range(width, dtype=tf.int64)
+    mask = tf.expand_dims(offsets, 0) < tf.expand_dims(lengths, 1)
+    idx = tf.expand_dims(starts, 1) + tf.expand_dims(offsets, 0)
+    related = tf.gather(values, tf.where(mask, idx, tf.zeros_like(idx)))
+    return tf.where(mask, related, -tf.ones_like(related))
 
   # def get_plmi(self, examples, table):
   #   examples_with_negative = tf.reshape(tf.gather(table, examples), [-1, 1])
   #   return tf.boolean_mask(examples_with_negative, tf.greater(examples_with_negative, 0))
 
-  def get_labels(self, examples, ctx_table):
-    partial_labels_table = tf.gather(ctx_table, examples)
-    labels_idx = tf.multinomial(tf.ones_like(partial_labels_table, dtype='float'), 1)
-    labels = tf.gather_nd(partial_labels_table,
-                          tf.concat(values=[
-                            tf.cast(tf.reshape(tf.range(tf.shape(labels_idx)[0]), [-1, 1]), tf.int64),
-                            labels_idx
-                          ], axis=1)
-                          )
-    return labels
+  def sample_relations(self, table, rows):
+    """Draws one related id per row, uniformly among that row's entries.
+
+    Only the row lengths and the drawn entry are read, so the cost is O(n)
+    whatever the length of the rows.
+
+    Returns:
+      sampled: [n] int32 ids, -1 for rows without entries.
+      valid: [n] bool, whether the row has any entry.
+    """
+    indptr, values = table
+    rows = tf.reshape(rows, [-1])
+    starts = tf.gather(indptr, rows)
+    lengths = tf.gather(indptr, rows + 1) - starts
+    valid = lengths > 0
+    # floor(u * length) with u in [0, 1), clipped against rounding up.
+    offsets = tf.cast(tf.random_uniform(tf.shape(lengths), dtype=tf.float64) *
+                      tf.cast(lengths, tf.float64), tf.int64)
+    offsets = tf.minimum(offsets, tf.maximum(lengths - 1, 0))
+    sampled = tf.gather(values, tf.where(valid, starts + offsets, tf.zeros_like(starts)))
+    return tf.where(valid, sampled, -tf.ones_like(sampled)), valid
 
   def optimize(self, loss):
     """Build the graph to optimize the loss function."""
 
     # Optimizer nodes.
-    # Linear learning rate decay.
-    opts = self._options
-    words_to_train = float(opts.words_per_epoch * opts.epochs_to_train)
-    lr = opts.learning_rate * tf.maximum(
-        0.0001, 1.0 - tf.cast(self._words, tf.float32) / words_to_train)
+    # Linear learning rate decay, scaled to the batch size after a warmup.
+    lr = lr_schedule.learning_rate(self._options, self._words)
     self._lr = lr
     optimizer = tf.train.GradientDescentOptimizer(lr)
     train = optimizer.minimize(loss,
@@ -432,9 +470,11 @@ class Word2Vec(object):
     analogy_a = tf.placeholder(dtype=tf.int32)  # [N]
     analogy_b = tf.placeholder(dtype=tf.int32)  # [N]
     analogy_c = tf.placeholder(dtype=tf.int32)  # [N]
+    analogy_d = tf.placeholder(dtype=tf.int32)  # [N]
 
-    # Normalized word embeddings of shape [vocab_size, emb_dim].
-    nemb = tf.nn.l2_normalize(self._emb, 1)
+    # Normalized word embeddings of shape [vocab_size, emb_dim], as of the
+    # last refresh_normalized().
+    nemb, self._refresh_nemb = analogy_eval.normalized_snapshot(self._emb)
 
     # Each row of a_emb, b_emb, c_emb is a word's embedding vector.
     # They all have the shape [N, emb_dim]
@@ -450,40 +490,64 @@ class Word2Vec(object):
     # dist has shape [N, vocab_size].
     dist = tf.matmul(target, nemb, transpose_b=True)
 
-    # For each question (row in dist), find the top 4 words.
-    _, pred_idx = tf.nn.top_k(dist, 4)
+    # Whether the nearest word other than a, b and c is d.
+    correct = analogy_eval.analogy_correct(dist, analogy_a, analogy_b,
+                                           analogy_c, analogy_d)
 
-    # Nodes for computing neighbors for a given word according to
-    # their cosine distance.
-    nearby_word = tf.placeholder(dtype=tf.int32)  # word id
-    nearby_emb = tf.gather(nemb, nearby_word)
-    nearby_dist = tf.matmul(nearby_emb, nemb, transpose_b=True)
-    nearby_val, nearby_idx = tf.nn.top_k(nearby_dist,
-                                         min(1000, self._options.vocab_size))
+    # Nodes for batch nearby and analogy queries, see analogy_eval.
+    batch_query = analogy_eval.BatchQuery(nemb)
 
     # Nodes in the construct graph which are used by training and
     # evaluation to run/feed/fetch.
     self._analogy_a = analogy_a
     self._analogy_b = analogy_b
     self._analogy_c = analogy_c
-    self._analogy_pred_idx = pred_idx
-    self._nearby_word = nearby_word
-    self._nearby_val = nearby_val
-    self._nearby_idx = nearby_idx
+    self._analogy_d = analogy_d
+    self._analogy_correct = correct
+    self._batch_query = batch_query
 
   def build_graph(self):
     """Build the graph for the full model."""
 
     opts = self._options
     # The training data. A text file.
-    (words, counts, words_per_epoch, self._epoch, self._words, examples,
-     labels) = word2vec.skipgram_word2vec(filename=opts.train_data,
-                                          batch_size=opts.batch_size,
-                                          window_size=opts.window_size,
-                                          min_count=opts.min_count,
-                                          subsample=opts.subsample)
-    (opts.vocab_words, opts.vocab_counts,
-     opts.words_per_epoch) = self._session.run([words, counts, words_per_epoch])
+    self._input = None
+    if opts.input == "dataset":
+      # A warm start keeps every old word whatever its count in the shard,
+      # so the shard is encoded in full and min_count applies to new words.
+      self._input = input_pipeline.SkipgramInput(
+          opts, min_count=1 if opts.warm_start else None)
+      (opts.vocab_words, opts.vocab_counts,
+       opts.words_per_epoch) = (self._input.vocab_words,
+                                self._input.vocab_counts,
+                                self._input.words_per_epoch)
+      if opts.warm_start:
+        # Old words keep their ids, the shard's new words come after them.
+        old_words, old_counts = warm_start.read_model_vocab(opts.warm_start)
+        self._input.remap(*warm_start.grow_vocab(
+            old_words, old_counts, opts.vocab_words, opts.vocab_counts,
+            opts.min_count))
+        opts.vocab_words = self._input.vocab_words
+        opts.vocab_counts = self._input.vocab_counts
+        print("Warm start: ", len(old_words), " words from ",
+              opts.warm_start)
+      self._epoch, self._words = self._input.epoch, self._input.words
+      examples, labels = self._input.examples, self._input.labels
+    else:
+      if opts.warm_start:
+        raise ValueError("--warm_start needs --input=dataset.")
+      if word2vec is None:
+        raise ImportError("--input=op needs word2vec_ops.so, build it as "
+                          "README.md shows or use --input=dataset.")
+      (words, counts, words_per_epoch, self._epoch, self._words, examples,
+       labels) = word2vec.skipgram_word2vec(filename=opts.train_data,
+                                            batch_size=opts.batch_size,
+                                            window_size=opts.window_size,
+                                            min_count=opts.min_count,
+                                            subsample=opts.subsample)
+      (opts.vocab_words, opts.vocab_counts,
+       opts.words_per_epoch) = self._session.run(
+           [words, counts, words_per_epoch])
     opts.vocab_size = len(opts.vocab_words)
 
     print("Data file: ", opts.train_data)
@@ -498,14 +562,22 @@ class Word2Vec(object):
     for i, w in enumerate(self._id2word):
       self._word2id[w] = i
 
-    true_logits, sampled_logits, syn_logits, ant_logits = self.forward(examples, labels)
-    loss = self.nce_loss(true_logits, sampled_logits, syn_logits, ant_logits)
+    (true_logits, sampled_logits,
+     rel_logits, rel_labels, rel_weights) = self.forward(examples, labels)
+    loss = self.nce_loss(true_logits, sampled_logits,
+                         rel_logits, rel_labels, rel_weights)
     tf.summary.scalar("NCE loss", loss)
     self._loss = loss
     self.optimize(loss)
 
     # Properly initialize all variables.
     tf.global_variables_initializer().run()
+    self.init_relation_tables()
+    if opts.warm_start:
+      warm_start.restore_rows(self._session, opts.warm_start,
+                              [self._emb, self._sm_w_t, self._sm_b])
+    if self._input is not None:
+      self._input.initialize(self._session)
 
     self.saver = tf.train.Saver()
 
@@ -518,8 +590,9 @@ class Word2Vec(object):
         f.write("%s %d\n" % (vocab_word,
                              opts.vocab_counts[i]))
 
-  def nce_loss(self, true_logits, sampled_logits, syn_logits, ant_logits):
-    """Build the graph for the NCE loss."""
+  def nce_loss(self, true_logits, sampled_logits,
+               rel_logits, rel_labels, rel_weights):
+    """Build the graph for the NCE loss plus the dLCE relation terms."""
 
     # cross-entropy(logits, labels)
     opts = self._options
@@ -527,11 +600,15 @@ class Word2Vec(object):
         labels=tf.ones_like(true_logits), logits=true_logits)
     sampled_xent = tf.nn.sigmoid_cross_entropy_with_logits(
         labels=tf.zeros_like(sampled_logits), logits=sampled_logits)
+    rel_xent = tf.nn.sigmoid_cross_entropy_with_logits(
+        labels=rel_labels, logits=rel_logits)
 
     # NCE-loss is the sum of the true and noise (sampled words)
-    # contributions, averaged over the batch.
+    # contributions, plus the weighted synonym and antonym terms, averaged
+    # over the batch.
     nce_loss_tensor = (tf.reduce_sum(true_xent) +
-                       tf.reduce_sum(sampled_xent)) / opts.batch_size
+                       tf.reduce_sum(sampled_xent) +
+                       tf.reduce_sum(rel_weights * rel_xent)) / opts.batch_size
     return nce_loss_tensor
 
   def _train_thread_body(self):
@@ -578,6 +655,8 @@ class Word2Vec(object):
       print("Epoch %4d Step %8d: lr = %5.3f loss = %6.2f words/sec = %8.0f\r" %
             (epoch, step, lr, loss, rate), end="")
       sys.stdout.flush()
+      if self._input is not None:
+        self._input.report(rate)
       if now - last_summary_time > opts.summary_interval:
         summary_str = self._session.run(summary_op)
         summary_writer.add_summary(summary_str, step)
@@ -593,71 +672,83 @@ class Word2Vec(object):
     for t in workers:
       t.join()
 
+    self.refresh_normalized()
     return epoch
 
-  def _predict(self, analogy):
-    """Predict the top 4 answers for analogy questions."""
-    idx, = self._session.run([self._analogy_pred_idx], {
+  def refresh_normalized(self):
+    """Snapshots the normalized embeddings that eval and nearby read."""
+    self._session.run(self._refresh_nemb)
+
+  def export(self):
+    """Exports the embeddings for embeddings.Embeddings to load."""
+    emb, sm_w_t, step = self._session.run(
+        [self._emb, self._sm_w_t, self.global_step])
+    embeddings.export_model(self._options, emb, sm_w_t, step)
+
+  def _predict_correct(self, analogy):
+    """Whether the best answer to each analogy question is its 4th word."""
+    correct, = self._session.run([self._analogy_correct], {
         self._analogy_a: analogy[:, 0],
         self._analogy_b: analogy[:, 1],
-        self._analogy_c: analogy[:, 2]
+        self._analogy_c: analogy[:, 2],
+        self._analogy_d: analogy[:, 3]
     })
-    return idx
+    return correct
 
   def eval(self):
-    """Evaluate analogy questions and reports accuracy."""
-
-    # How many questions we get right at precision@1.
-    correct = 0
+    """Evaluate analogy questions and reports accuracy.
 
+    Returns:
+      A [n] bool vector, whether each question was answered correctly.
+    """
     try:
-      total = self._analogy_questions.shape[0]
+      questions = self._analogy_questions
     except AttributeError as e:
       raise AttributeError("Need to read analogy questions.")
+    return analogy_eval.evaluate(questions, self._analogy_categories,
+                                 self._analogy_category_names,
+                                 self._predict_correct)
+
+  def nearby_batch(self, words, num=20):
+    """The num nearest words of each word, by cosine similarity.
 
-    good_idx = []
-
-    start = 0
-    while start < total:
-      limit = start + 2500
-      sub = self._analogy_questions[start:limit, :]
-      idx = self._predict(sub)
-      start = limit
-      for i,question in enumerate(xrange(sub.shape[0])):
-        for j in xrange(4):
-          if idx[question, j] == sub[question, 3]:
-            # Bingo! We predicted correctly. E.g., [italy, rome, france, paris].
-            correct += 1
-            good_idx.append(i+(start-2500))
-            break
-          elif idx[question, j] in sub[question, :3]:
-            # We need to skip words already in the question.
-            continue
-          else:
-            # The correct label is not the precision@1
-            break
-    print(good_idx)
-    print("Eval %4d/%d accuracy = %4.1f%%" % (correct, total,
-                                              correct * 100.0 / total))
+    Args:
+      words: [n] word ids, or words as bytes; unknown words count as UNK.
+      num: neighbors per word, the word itself usually first.
+
+    Returns:
+      ids: int32 [n, num] word ids, best first.
+      scores: float32 [n, num] their cosine similarities.
+    """
+    ids = analogy_eval.word_ids(words, self._word2id)
+    return self._batch_query.run(self._session, ids, ids, ids, num)
+
+  def analogy_batch(self, analogies, num=1):
+    """The num best answers w3 to each w0:w1 vs w2:w3, other than w0..w2.
+
+    Args:
+      analogies: [n, 3] word ids, or words as bytes.
+      num: answers per analogy.
+
+    Returns:
+      ids: int32 [n, num] word ids, best first.
+      scores: float32 [n, num] their similarities to w2 + (w1 - w0).
+    """
+    q = analogy_eval.word_ids(analogies, self._word2id).reshape([-1, 3])
+    return self._batch_query.run(self._session, q[:, 0], q[:, 1], q[:, 2],
+                                 num, exclude=True)
 
   def analogy(self, w0, w1, w2):
     """Predict word w3 as in w0:w1 vs w2:w3."""
-    wid = np.array([[self._word2id.get(w, 0) for w in [w0, w1, w2]]])
-    idx = self._predict(wid)
-    for c in [self._id2word[i] for i in idx[0, :]]:
-      if c not in [w0, w1, w2]:
-        print(c)
-        break
-    print("unknown")
+    idx, _ = self.analogy_batch([[w0, w1, w2]])
+    print(self._id2word[idx[0, 0]])
 
   def nearby(self, words, num=20):
     """Prints out nearby words given a list of words."""
-    ids = np.array([self._word2id.get(x, 0) for x in words])
-    vals, idx = self._session.run(
-        [self._nearby_val, self._nearby_idx], {self._nearby_word: ids})
+    idx, vals = self.nearby_batch(words, num)
     for i in xrange(len(words)):
       print("\n%s\n=====================================" % (words[i]))
-      for (neighbor, distance) in zip(idx[i, :num], vals[i, :num]):
+      for (neighbor, distance) in zip(idx[i], vals[i]):
         print("%-20s %6.4f" % (self._id2word[neighbor], distance))
 
 
@@ -688,6 +779,7 @@ def main(_):
     model.saver.save(session,
                      os.path.join(opts.save_path, "model.ckpt"),
                      global_step=model.global_step)
+    model.export()
     if FLAGS.interactive:
       # E.g.,
       # [0]: model.analogy(b'france', b'paris', b'russia')
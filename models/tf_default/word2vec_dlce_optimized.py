@@ -0,0 +1,130 @@
+# Copyright 2015 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+"""Multi-threaded dLCE skip-gram model trained with true SGD.
+
+Trains word2vec_optimized's unbatched skip-gram model with the synonym and
+antonym terms of word2vec_dlce added to its objective.
+
+The key ops used are:
+* skipgram custom op that does input processing.
+* neg_train_dlce custom op that applies the negative sampling gradient and
+  the synonym attraction and antonym repulsion gradients in one in-place
+  pass over w_in and w_out.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import sys
+
+from six.moves import xrange  # pylint: disable=redefined-builtin
+
+import tensorflow as tf
+
+import word2vec_optimized
+from relation_table import VocabRelations, relation_variables
+
+flags = tf.app.flags
+
+flags.DEFINE_string("vocabs_root", '/tmp/bnc', "Directory to get vocabulary, synonyms and antonyms from.")
+flags.DEFINE_integer("num_syns", 10, "How many synonyms to use")
+flags.DEFINE_integer("num_ants", 3, "How many antonyms to use")
+flags.DEFINE_integer("num_ctx", 1000, "How many context words to use")
+
+FLAGS = flags.FLAGS
+
+
+class Options(word2vec_optimized.Options):
+  """Options used by our dLCE model."""
+
+  def __init__(self):
+    word2vec_optimized.Options.__init__(self)
+
+    # Directory with vocab.txt and the syn, ant and context pickles.
+    self.vocabs_root = FLAGS.vocabs_root
+
+    # Maximum number of synonyms, antonyms and contexts used per word.
+    self.num_syns = FLAGS.num_syns
+    self.num_ants = FLAGS.num_ants
+    self.num_ctx = FLAGS.num_ctx
+
+
+class Word2Vec(word2vec_optimized.Word2Vec):
+  """dLCE model (Skipgram with synonym and antonym terms)."""
+
+  def __init__(self, options, session):
+    self._relation_inits = []
+    self.relations = VocabRelations(
+        options.vocabs_root, options.min_count,
+        options.num_syns, options.num_ants, options.num_ctx)
+    word2vec_optimized.Word2Vec.__init__(self, options, session)
+
+  def _train_op(self, w_in, w_out, examples, labels, lr):
+    opts = self._options
+    tables = []
+    for name, table in zip(("syn", "ant", "ctx"), self.relations.model_tables(
+        self._word2id, opts.vocab_size)):
+      variables, inits = relation_variables(table, name)
+      tables.extend(variables)
+      self._relation_inits.extend(inits)
+    return word2vec_optimized.word2vec.neg_train_dlce(
+        w_in, w_out, examples, labels, lr, *tables,
+        vocab_count=opts.vocab_counts.tolist(),
+        num_negative_samples=opts.num_samples,
+        num_syns=opts.num_syns,
+        num_ants=opts.num_ants)
+
+  def build_eval_graph(self):
+    word2vec_optimized.Word2Vec.build_eval_graph(self)
+    # The relation tables are left out of the global initializer.
+    for initializer, feed in self._relation_inits:
+      self._session.run(initializer, feed)
+    self._relation_inits = []
+
+
+def main(_):
+  """Train a dLCE model."""
+  if not FLAGS.train_data or not FLAGS.eval_data or not FLAGS.save_path:
+    print("--train_data --eval_data and --save_path must be specified.")
+    sys.exit(1)
+  opts = Options()
+  if opts.backend != "tf":
+    word2vec_optimized.train_numpy(opts, VocabRelations(
+        opts.vocabs_root, opts.min_count,
+        opts.num_syns, opts.num_ants, opts.num_ctx))
+    return
+  word2vec_optimized.check_ops(opts)
+  with tf.Graph().as_default(), tf.Session() as session:
+    with tf.device("/cpu:0"):
+      model = Word2Vec(opts, session)
+      model.read_analogies() # Read analogy questions
+    for _ in xrange(opts.epochs_to_train):
+      model.train()  # Process one epoch
+      model.eval()  # Eval analogies.
+    # Perform a final save.
+    model.saver.save(session, os.path.join(opts.save_path, "model.ckpt"),
+                     global_step=model.global_step)
+    model.export()
+    if FLAGS.interactive:
+      # E.g.,
+      # [0]: model.analogy(b'france', b'paris', b'russia')
+      # [1]: model.nearby([b'proton', b'elephant', b'maxwell'])
+      word2vec_optimized._start_shell(locals())
+
+
+if __name__ == "__main__":
+  tf.app.run()
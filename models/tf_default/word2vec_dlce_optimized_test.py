@@ -0,0 +1,105 @@
+# Copyright 2015 The TensorFlow Authors. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ==============================================================================
+
+"""Tests for word2vec_dlce_optimized module."""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import pickle
+
+import numpy as np
+import tensorflow as tf
+
+import numpy_backend
+import word2vec_dlce_optimized
+import word2vec_optimized
+
+flags = tf.app.flags
+
+FLAGS = flags.FLAGS
+
+
+class Word2VecTest(tf.test.TestCase):
+
+  def setUp(self):
+    FLAGS.train_data = os.path.join(self.get_temp_dir() + "test-text.txt")
+    FLAGS.eval_data = os.path.join(self.get_temp_dir() + "eval-text.txt")
+    FLAGS.save_path = self.get_temp_dir()
+    with open(FLAGS.train_data, "w") as f:
+      f.write(
+          """alice was beginning to get very tired of sitting by her sister on
+          the bank, and of having nothing to do: once or twice she had peeped
+          into the book her sister was reading, but it had no pictures or
+          conversations in it, 'and what is the use of a book,' thought alice
+          'without pictures or conversations?' So she was considering in her own
+          mind (as well as she could, for the hot day made her feel very sleepy
+          and stupid), whether the pleasure of making a daisy-chain would be
+          worth the trouble of getting up and picking the daisies, when suddenly
+          a White rabbit with pink eyes ran close by her.\n""")
+      with open(FLAGS.eval_data, "w") as f:
+        f.write("alice she rabbit once\n")
+    FLAGS.vocabs_root = self.get_temp_dir()
+    words = ["her", "alice", "she", "sister", "rabbit", "book"]
+    with open(os.path.join(FLAGS.vocabs_root, "vocab.txt"), "w") as f:
+      for word in words:
+        f.write("%s 2\n" % word.encode("utf-8"))
+    with open(os.path.join(FLAGS.vocabs_root, "syn.pickle"), "wb") as f:
+      pickle.dump({"alice": ["she"], "sister": ["her", "she"]}, f)
+    with open(os.path.join(FLAGS.vocabs_root, "ant.pickle"), "wb") as f:
+      pickle.dump({"alice": ["rabbit"]}, f)
+    with open(os.path.join(FLAGS.vocabs_root, "context.pickle"), "wb") as f:
+      pickle.dump({0: [1, 3], 2: [0, 5, 3], 4: [5]}, f)
+
+  def testWord2VecDlceOptimized(self):
+    FLAGS.batch_size = 5
+    FLAGS.num_neg_samples = 10
+    FLAGS.epochs_to_train = 1
+    FLAGS.min_count = 0
+    word2vec_dlce_optimized.main([])
+    self.assertTrue(os.path.isfile(
+        os.path.join(FLAGS.save_path, "export", "export.json")))
+
+  def testNegTrainDlceMatchesNumpy(self):
+    if word2vec_optimized.word2vec is None:
+      self.skipTest("word2vec_ops.so is not built")
+    rng = np.random.RandomState(0)
+    w_in = rng.uniform(-1, 1, [4, 3]).astype(np.float32)
+    w_out = rng.uniform(-1, 1, [4, 3]).astype(np.float32)
+    # Word 0 predicts 1, has synonym 2 with the single context 3, and
+    # antonym 3 with the single context 2, so no step draws randomly.
+    indptr = lambda *lengths: np.cumsum([0] + list(lengths)).astype(np.int64)
+    tables = [indptr(1, 0, 0, 0), np.array([2], dtype=np.int32),
+              indptr(1, 0, 0, 0), np.array([3], dtype=np.int32),
+              indptr(0, 0, 1, 1), np.array([3, 2], dtype=np.int32)]
+    with self.test_session() as session:
+      v_in, v_out = tf.Variable(w_in), tf.Variable(w_out)
+      train = word2vec_optimized.word2vec.neg_train_dlce(
+          v_in, v_out, [0], [1], 0.5, *tables, vocab_count=[1, 1, 1, 1],
+          num_negative_samples=0, num_syns=1, num_ants=1)
+      tf.global_variables_initializer().run()
+      session.run(train)
+      got_in, got_out = session.run([v_in, v_out])
+    numpy_backend.sgd_step(w_in, w_out, np.array([0]), np.array([[1, 3, 2]]),
+                           np.array([1, 1, 0], dtype=np.float32),
+                           np.ones([1, 3], dtype=np.float32), 0.5)
+    self.assertAllClose(w_in, got_in)
+    self.assertAllClose(w_out, got_out)
+
+
+if __name__ == "__main__":
+  tf.test.main()
@@ -42,6 +42,9 @@ from six.moves import xrange  # pylint: disable=redefined-builtin
 import numpy as np
 import tensorflow as tf
 
+import analogy_eval
+import embeddings
+
 word2vec = tf.load_op_library(os.path.join(os.path.dirname(os.path.realpath(__file__)), 'word2vec_ops.so'))
 
 flags = tf.app.flags
@@ -83,6 +86,13 @@ flags.DEFINE_boolean(
     "If true, enters an IPython interactive session to play with the trained "
     "model. E.g., try model.analogy(b'france', b'paris', b'russia') and "
     "model.nearby([b'proton', b'elephant', b'maxwell'])")
+flags.DEFINE_string(
+    "export_dtype", "float32",
+    "float32 or float16: dtype of the embeddings exported to "
+    "<save_path>/export at the end of training, see embeddings.py. none "
+    "skips the export.")
+flags.DEFINE_boolean("export_sm_w_t", False,
+                     "Also export the output embeddings sm_w_t.")
 flags.DEFINE_integer("statistics_interval", 5,
                      "Print statistics every n seconds.")
 flags.DEFINE_integer("summary_interval", 5,
@@ -161,6 +171,10 @@ class Options(object):
     # The text file for eval.
     self.eval_data = FLAGS.eval_data
 
+    # Export at the end of training, see embeddings.py.
+    self.export_dtype = FLAGS.export_dtype
+    self.export_sm_w_t = FLAGS.export_sm_w_t
+
 
 class Word2Vec(object):
   """Word2Vec model (Skipgram)."""
@@ -172,32 +186,14 @@ class Word2Vec(object):
     self._id2word = []
     self.build_graph()
     self.build_eval_graph()
+    self.refresh_normalized()
     self.save_vocab()
 
   def read_analogies(self):
-    """Reads through the analogy question file.
-
-    Returns:
-      questions: a [n, 4] numpy array containing the analogy question's
-                 word ids.
-      questions_skipped: questions skipped due to unknown words.
-    """
-    questions = []
-    questions_skipped = 0
-    with open(self._options.eval_data, "rb") as analogy_f:
-      for line in analogy_f:
-        if line.startswith(b":"):  # Skip comments.
-          continue
-        words = line.strip().lower().split(b" ")
-        ids = [self._word2id.get(w.strip()) for w in words]
-        if None in ids or len(ids) != 4:
-          questions_skipped += 1
-        else:
-          questions.append(np.array(ids))
-    print("Eval analogy file: ", self._options.eval_data)
-    print("Questions: ", len(questions))
-    print("Skipped: ", questions_skipped)
-    self._analogy_questions = np.array(questions, dtype=np.int32)
+    """Reads through the analogy question file, see analogy_eval."""
+    (self._analogy_questions, self._analogy_categories,
+     self._analogy_category_names) = analogy_eval.read_analogies(
+         self._options.eval_data, self._word2id)
 
   def forward(self, examples, labels):
     """Build the graph for the forward pass."""
@@ -216,6 +212,7 @@ class Word2Vec(object):
     sm_w_t = tf.Variable(
         tf.zeros([opts.vocab_size, opts.emb_dim]),
         name="sm_w_t")
+    self._sm_w_t = sm_w_t
 
     # Softmax bias: [vocab_size].
     sm_b = tf.Variable(tf.zeros([opts.vocab_size]), name="sm_b")
@@ -310,9 +307,11 @@ class Word2Vec(object):
     analogy_a = tf.placeholder(dtype=tf.int32)  # [N]
     analogy_b = tf.placeholder(dtype=tf.int32)  # [N]
     analogy_c = tf.placeholder(dtype=tf.int32)  # [N]
+    analogy_d = tf.placeholder(dtype=tf.int32)  # [N]
 
-    # Normalized word embeddings of shape [vocab_size, emb_dim].
-    nemb = tf.nn.l2_normalize(self._emb, 1)
+    # Normalized word embeddings of shape [vocab_size, emb_dim], as of the
+    # last refresh_normalized().
+    nemb, self._refresh_nemb = analogy_eval.normalized_snapshot(self._emb)
 
     # Each row of a_emb, b_emb, c_emb is a word's embedding vector.
     # They all have the shape [N, emb_dim]
@@ -328,26 +327,21 @@ class Word2Vec(object):
     # dist has shape [N, vocab_size].
     dist = tf.matmul(target, nemb, transpose_b=True)
 
-    # For each question (row in dist), find the top 4 words.
-    _, pred_idx = tf.nn.top_k(dist, 4)
+    # Whether the nearest word other than a, b and c is d.
+    correct = analogy_eval.analogy_correct(dist, analogy_a, analogy_b,
+                                           analogy_c, analogy_d)
 
-    # Nodes for computing neighbors for a given word according to
-    # their cosine distance.
-    nearby_word = tf.placeholder(dtype=tf.int32)  # word id
-    nearby_emb = tf.gather(nemb, nearby_word)
-    nearby_dist = tf.matmul(nearby_emb, nemb, transpose_b=True)
-    nearby_val, nearby_idx = tf.nn.top_k(nearby_dist,
-                                         min(1000, self._options.vocab_size))
+    # Nodes for batch nearby and analogy queries, see analogy_eval.
+    batch_query = analogy_eval.BatchQuery(nemb)
 
     # Nodes in the construct graph which are used by training and
     # evaluation to run/feed/fetch.
     self._analogy_a = analogy_a
     self._analogy_b = analogy_b
     self._analogy_c = analogy_c
-    self._analogy_pred_idx = pred_idx
-    self._nearby_word = nearby_word
-    self._nearby_val = nearby_val
-    self._nearby_idx = nearby_idx
+    self._analogy_d = analogy_d
+    self._analogy_correct = correct
+    self._batch_query = batch_query
 
   def build_graph(self):
     """Build the graph for the full model."""
@@ -438,68 +432,82 @@ class Word2Vec(object):
     for t in workers:
       t.join()
 
+    self.refresh_normalized()
     return epoch
 
-  def _predict(self, analogy):
-    """Predict the top 4 answers for analogy questions."""
-    idx, = self._session.run([self._analogy_pred_idx], {
+  def refresh_normalized(self):
+    """Snapshots the normalized embeddings that eval and nearby read."""
+    self._session.run(self._refresh_nemb)
+
+  def export(self):
+    """Exports the embeddings for embeddings.Embeddings to load."""
+    emb, sm_w_t, step = self._session.run([self._emb, self._sm_w_t, self.global_step])
+    embeddings.export_model(self._options, emb, sm_w_t, step)
+
+  def _predict_correct(self, analogy):
+    """Whether the best answer to each analogy question is its 4th word."""
+    correct, = self._session.run([self._analogy_correct], {
         self._analogy_a: analogy[:, 0],
         self._analogy_b: analogy[:, 1],
-        self._analogy_c: analogy[:, 2]
+        self._analogy_c: analogy[:, 2],
+        self._analogy_d: analogy[:, 3]
     })
-    return idx
+    return correct
 
   def eval(self):
-    """Evaluate analogy questions and reports accuracy."""
-
-    # How many questions we get right at precision@1.
-    correct = 0
+    """Evaluate analogy questions and reports accuracy.
 
+    Returns:
+      A [n] bool vector, whether each question was answered correctly.
+    """
     try:
-      total = self._analogy_questions.shape[0]
+      questions = self._analogy_questions
     except AttributeError as e:
       raise AttributeError("Need to read analogy questions.")
+    return analogy_eval.evaluate(questions, self._analogy_categories,
+                                 self._analogy_category_names,
+                                 self._predict_correct)
 
-    start = 0
-    while start < total:
-      limit = start + 2500
-      sub = self._analogy_questions[start:limit, :]
-      idx = self._predict(sub)
-      start = limit
-      for question in xrange(sub.shape[0]):
-        for j in xrange(4):
-          if idx[question, j] == sub[question, 3]:
-            # Bingo! We predicted correctly. E.g., [italy, rome, france, paris].
-            correct += 1
-            break
-          elif idx[question, j] in sub[question, :3]:
-            # We need to skip words already in the question.
-            continue
-          else:
-            # The correct label is not the precision@1
-            break
-    print()
-    print("Eval %4d/%d accuracy = %4.1f%%" % (correct, total,
-                                              correct * 100.0 / total))
+  def nearby_batch(self, words, num=20):
+    """The num nearest words of each word, by cosine similarity.
+
+    Args:
+      words: [n] word ids, or words as bytes; unknown words count as UNK.
+      num: neighbors per word, the word itself usually first.
+
+    Returns:
+      ids: int32 [n, num] word ids, best first.
+      scores: float32 [n, num] their cosine similarities.
+    """
+    ids = analogy_eval.word_ids(words, self._word2id)
+    return self._batch_query.run(self._session, ids, ids, ids, num)
+
+  def analogy_batch(self, analogies, num=1):
+    """The num best answers w3 to each w0:w1 vs w2:w3, other than w0..w2.
+
+    Args:
+      analogies: [n, 3] word ids, or words as bytes.
+      num: answers per analogy.
+
+    Returns:
+      ids: int32 [n, num] word ids, best first.
+      scores: float32 [n, num] their similarities to w2 + (w1 - w0).
+    """
+    q = analogy_eval.word_ids(analogies, self._word2id).reshape([-1, 3])
+    return self._batch_query.run(self._session, q[:, 0], q[:, 1], q[:, 2],
+                                 num, exclude=True)
 
   def analogy(self, w0, w1, w2):
     """Predict word w3 as in w0:w1 vs w2:w3."""
-    wid = np.array([[self._word2id.get(w, 0) for w in [w0, w1, w2]]])
-    idx = self._predict(wid)
-    for c in [self._id2word[i] for i in idx[0, :]]:
-      if c not in [w0, w1, w2]:
-        print(c)
-        break
-    print("unknown")
+    idx, _ = self.analogy_batch([[w0, w1, w2]])
+    print(self._id2word[idx[0, 0]])
 
   def nearby(self, words, num=20):
     """Prints out nearby words given a list of words."""
-    ids = np.array([self._word2id.get(x, 0) for x in words])
-    vals, idx = self._session.run(
-        [self._nearby_val, self._nearby_idx], {self._nearby_word: ids})
+    idx, vals = self.nearby_batch(words, num)
     for i in xrange(len(words)):
       print("\n%s\n=====================================" % (words[i]))
-      for (neighbor, distance) in zip(idx[i, :num], vals[i, :num]):
+      for (neighbor, distance) in zip(idx[i], vals[i]):
         print("%-20s %6.4f" % (self._id2word[neighbor], distance))
 
 
@@ -530,6 +538,7 @@ def main(_):
     model.saver.save(session,
                      os.path.join(opts.save_path, "model.ckpt"),
                      global_step=model.global_step)
+    model.export()
     if FLAGS.interactive:
       # E.g.,
       # [0]: model.analogy(b'france', b'paris', b'russia')
@@ -352,4 +352,167 @@ class NegTrainWord2vecOp : public OpKernel {
 
 REGISTER_KERNEL_BUILDER(Name("NegTrainWord2vec").Device(DEVICE_CPU), NegTrainWord2vecOp);
 
+class NegTrainDlceOp : public OpKernel {
+ public:
+  explicit NegTrainDlceOp(OpKernelConstruction* ctx) : OpKernel(ctx) {
+    base_.Init(0, 0);
+
+    OP_REQUIRES_OK(ctx, ctx->GetAttr("num_negative_samples", &num_samples_));
+    OP_REQUIRES_OK(ctx, ctx->GetAttr("num_syns", &num_syns_));
+    OP_REQUIRES_OK(ctx, ctx->GetAttr("num_ants", &num_ants_));
+
+    std::vector<int32> vocab_count;
+    OP_REQUIRES_OK(ctx, ctx->GetAttr("vocab_count", &vocab_count));
+
+    std::vector<float> vocab_weights;
+    vocab_weights.reserve(vocab_count.size());
+    for (const auto& f : vocab_count) {
+      float r = std::pow(static_cast<float>(f), 0.75f);
+      vocab_weights.push_back(r);
+    }
+    sampler_ = new random::DistributionSampler(vocab_weights);
+  }
+
+  ~NegTrainDlceOp() { delete sampler_; }
+
+  void Compute(OpKernelContext* ctx) override {
+    Tensor w_in = ctx->mutable_input(0, false);
+    OP_REQUIRES(ctx, TensorShapeUtils::IsMatrix(w_in.shape()),
+                errors::InvalidArgument("Must be a matrix"));
+    Tensor w_out = ctx->mutable_input(1, false);
+    OP_REQUIRES(ctx, w_in.shape() == w_out.shape(),
+                errors::InvalidArgument("w_in.shape == w_out.shape"));
+    const Tensor& examples = ctx->input(2);
+    OP_REQUIRES(ctx, TensorShapeUtils::IsVector(examples.shape()),
+                errors::InvalidArgument("Must be a vector"));
+    const Tensor& labels = ctx->input(3);
+    OP_REQUIRES(ctx, examples.shape() == labels.shape(),
+                errors::InvalidArgument("examples.shape == labels.shape"));
+    const Tensor& learning_rate = ctx->input(4);
+    OP_REQUIRES(ctx, TensorShapeUtils::IsScalar(learning_rate.shape()),
+                errors::InvalidArgument("Must be a scalar"));
+    const int64 vocab_size = w_in.dim_size(0);
+    for (int t = 5; t < 11; t += 2) {
+      OP_REQUIRES(ctx, TensorShapeUtils::IsVector(ctx->input(t).shape()) &&
+                           TensorShapeUtils::IsVector(ctx->input(t + 1).shape()),
+                  errors::InvalidArgument("Relation tables must be vectors"));
+      OP_REQUIRES(ctx, ctx->input(t).dim_size(0) == vocab_size + 1,
+                  errors::InvalidArgument("indptr size mismatches: ",
+                                          ctx->input(t).dim_size(0), " vs. ",
+                                          vocab_size + 1));
+    }
+
+    auto Tw_in = w_in.matrix<float>();
+    auto Tw_out = w_out.matrix<float>();
+    auto Texamples = examples.flat<int32>();
+    auto Tlabels = labels.flat<int32>();
+    auto lr = learning_rate.scalar<float>()();
+    auto Tsyn_indptr = ctx->input(5).flat<int64>();
+    auto Tsyn_values = ctx->input(6).flat<int32>();
+    auto Tant_indptr = ctx->input(7).flat<int64>();
+    auto Tant_values = ctx->input(8).flat<int32>();
+    auto Tctx_indptr = ctx->input(9).flat<int64>();
+    auto Tctx_values = ctx->input(10).flat<int32>();
+    const int64 dims = w_in.dim_size(1);
+    const int64 batch_size = examples.dim_size(0);
+    OP_REQUIRES(ctx, vocab_size == sampler_->num(),
+                errors::InvalidArgument("vocab_size mismatches: ", vocab_size,
+                                        " vs. ", sampler_->num()));
+
+    // Gradient accumulator for v_in.
+    Tensor buf(DT_FLOAT, TensorShape({dims}));
+    auto Tbuf = buf.flat<float>();
+
+    // Scalar buffer to hold sigmoid(+/- dot).
+    Tensor g_buf(DT_FLOAT, TensorShape({}));
+    auto g = g_buf.scalar<float>();
+
+    // Negative samples take 2 random 32-bit values and context draws 1; we
+    // reserve 8 per draw just in case the underlying implementation changes.
+    auto rnd = base_.ReserveSamples32(
+        batch_size * (num_samples_ + num_syns_ + num_ants_) * 8);
+    random::SimplePhilox srnd(&rnd);
+
+    for (int64 i = 0; i < batch_size; ++i) {
+      const int32 example = Texamples(i);
+      DCHECK(0 <= example && example < vocab_size) << example;
+      const int32 label = Tlabels(i);
+      DCHECK(0 <= label && label < vocab_size) << label;
+      auto v_in = Tw_in.chip<0>(example);
+
+      // Positive: example predicts label.
+      //   forward: x = v_in' * v_out
+      //            l = log(sigmoid(x))
+      //   backward: dl/dx = g = sigmoid(-x)
+      //             dl/d(v_in) = g * v_out'
+      //             dl/d(v_out) = v_in' * g
+      {
+        auto v_out = Tw_out.chip<0>(label);
+        auto dot = (v_in * v_out).sum();
+        g = (dot.exp() + 1.f).inverse();
+        Tbuf = v_out * (g() * lr);
+        v_out += v_in * (g() * lr);
+      }
+
+      // Negative samples:
+      //   forward: x = v_in' * v_sample
+      //            l = log(sigmoid(-x))
+      //   backward: dl/dx = g = -sigmoid(x)
+      //             dl/d(v_in) = g * v_out'
+      //             dl/d(v_out) = v_in' * g
+      for (int j = 0; j < num_samples_; ++j) {
+        const int sample = sampler_->Sample(&srnd);
+        if (sample == label) continue;  // Skip.
+        auto v_sample = Tw_out.chip<0>(sample);
+        auto dot = (v_in * v_sample).sum();
+        g = -((-dot).exp() + 1.f).inverse();
+        Tbuf += v_sample * (g() * lr);
+        v_sample += v_in * (g() * lr);
+      }
+
+      // Synonyms (sign = 1) and antonyms (sign = -1), each through one
+      // context c sampled uniformly from the related word's contexts:
+      //   forward: x = v_in' * v_c
+      //            l = w * log(sigmoid(sign * x))
+      //   backward: dl/dx = g = sign * w * sigmoid(-sign * x)
+      // where w = 1 / (number of synonyms, or antonyms, of the example).
+      for (int sign = 1; sign >= -1; sign -= 2) {
+        const auto& indptr = sign > 0 ? Tsyn_indptr : Tant_indptr;
+        const auto& values = sign > 0 ? Tsyn_values : Tant_values;
+        const int64 start = indptr(example);
+        const int64 num = std::min<int64>(indptr(example + 1) - start,
+                                          sign > 0 ? num_syns_ : num_ants_);
+        for (int64 k = 0; k < num; ++k) {
+          const int32 related = values(start + k);
+          DCHECK(0 <= related && related < vocab_size) << related;
+          const int64 ctx_start = Tctx_indptr(related);
+          const int64 num_ctx = Tctx_indptr(related + 1) - ctx_start;
+          if (num_ctx == 0) continue;
+          const int32 context = Tctx_values(
+              ctx_start + srnd.Uniform(static_cast<uint32>(num_ctx)));
+          DCHECK(0 <= context && context < vocab_size) << context;
+          auto v_ctx = Tw_out.chip<0>(context);
+          auto dot = (v_in * v_ctx).sum();
+          g = ((dot * static_cast<float>(sign)).exp() + 1.f).inverse();
+          const float step = sign * g() * lr / num;
+          Tbuf += v_ctx * step;
+          v_ctx += v_in * step;
+        }
+      }
+
+      // Applies the gradient on v_in.
+      v_in += Tbuf;
+    }
+  }
+
+ private:
+  int32 num_samples_ = 0;
+  int32 num_syns_ = 0;
+  int32 num_ants_ = 0;
+  random::DistributionSampler* sampler_ = nullptr;
+  GuardedPhiloxRandom base_;
+};
+
+REGISTER_KERNEL_BUILDER(Name("NegTrainDlce").Device(DEVICE_CPU), NegTrainDlceOp);
+
 }  // end namespace tensorflow
@@ -70,4 +70,45 @@ vocab_count: Count of words in the vocabulary.
 num_negative_samples: Number of negative samples per example.
 )doc");
 
+REGISTER_OP("NegTrainDlce")
+    .Input("w_in: Ref(float)")
+    .Input("w_out: Ref(float)")
+    .Input("examples: int32")
+    .Input("labels: int32")
+    .Input("lr: float")
+    .Input("syn_indptr: int64")
+    .Input("syn_values: int32")
+    .Input("ant_indptr: int64")
+    .Input("ant_values: int32")
+    .Input("ctx_indptr: int64")
+    .Input("ctx_values: int32")
+    .SetIsStateful()
+    .Attr("vocab_count: list(int)")
+    .Attr("num_negative_samples: int")
+    .Attr("num_syns: int")
+    .Attr("num_ants: int")
+    .Doc(R"doc(
+Training via negative sampling plus the dLCE synonym and antonym terms.
+
+Besides the skip-gram negative sampling update, every synonym of an example
+is pulled towards, and every antonym pushed away from, one context sampled
+uniformly from that synonym's or antonym's contexts. Relation tables are in
+CSR layout: the entries of word i are values[indptr[i]:indptr[i + 1]].
+
+w_in: input word embedding.
+w_out: output word embedding.
+examples: A vector of word ids.
+labels: A vector of word ids.
+syn_indptr: Offsets of the synonyms of every word, vocab_size + 1 entries.
+syn_values: Synonym word ids.
+ant_indptr: Offsets of the antonyms of every word, vocab_size + 1 entries.
+ant_values: Antonym word ids.
+ctx_indptr: Offsets of the contexts of every word, vocab_size + 1 entries.
+ctx_values: Context word ids.
+vocab_count: Count of words in the vocabulary.
+num_negative_samples: Number of negative samples per example.
+num_syns: Maximum number of synonyms used per example.
+num_ants: Maximum number of antonyms used per example.
+)doc");
+
 }  // end namespace tensorflow
@@ -41,7 +41,16 @@ from six.moves import xrange  # pylint: disable=redefined-builtin
 import numpy as np
 import tensorflow as tf
 
-word2vec = tf.load_op_library(os.path.join(os.path.dirname(os.path.realpath(__file__)), 'word2vec_ops.so'))
+import analogy_eval
+import embeddings
+import hogwild
+import numpy_backend
+
+try:
+  word2vec = tf.load_op_library(os.path.join(os.path.dirname(os.path.realpath(__file__)), 'word2vec_ops.so'))
+except tf.errors.NotFoundError:
+  # Only --backend=numpy or numba can train without the compiled ops.
+  word2vec = None
 
 flags = tf.app.flags
 
@@ -80,6 +89,20 @@ flags.DEFINE_boolean(
     "If true, enters an IPython interactive session to play with the trained "
     "model. E.g., try model.analogy(b'france', b'paris', b'russia') and "
     "model.nearby([b'proton', b'elephant', b'maxwell'])")
+flags.DEFINE_string(
+    "export_dtype", "float32",
+    "float32 or float16: dtype of the embeddings exported to "
+    "<save_path>/export at the end of training, see embeddings.py. none "
+    "skips the export.")
+flags.DEFINE_boolean("export_sm_w_t", False,
+                     "Also export the output embeddings (w_out), as sm_w_t.")
+
+flags.DEFINE_string(
+    "backend", "tf",
+    "Training backend: tf (the word2vec_ops.so custom ops), numpy "
+    "(vectorized minibatch SGD), numba (Hogwild SGD over numba threads) or "
+    "processes (Hogwild numpy SGD over concurrent_steps processes sharing "
+    "the embeddings).")
 
 FLAGS = flags.FLAGS
 
@@ -134,6 +157,13 @@ class Options(object):
     # The text file for eval.
     self.eval_data = FLAGS.eval_data
 
+    # Export at the end of training, see embeddings.py.
+    self.export_dtype = FLAGS.export_dtype
+    self.export_sm_w_t = FLAGS.export_sm_w_t
+
+    # Which trainer to use, see numpy_backend.
+    self.backend = FLAGS.backend
+
 
 class Word2Vec(object):
   """Word2Vec model (Skipgram)."""
@@ -145,32 +175,14 @@ class Word2Vec(object):
     self._id2word = []
     self.build_graph()
     self.build_eval_graph()
+    self.refresh_normalized()
     self.save_vocab()
 
   def read_analogies(self):
-    """Reads through the analogy question file.
-
-    Returns:
-      questions: a [n, 4] numpy array containing the analogy question's
-                 word ids.
-      questions_skipped: questions skipped due to unknown words.
-    """
-    questions = []
-    questions_skipped = 0
-    with open(self._options.eval_data, "rb") as analogy_f:
-      for line in analogy_f:
-        if line.startswith(b":"):  # Skip comments.
-          continue
-        words = line.strip().lower().split(b" ")
-        ids = [self._word2id.get(w.strip()) for w in words]
-        if None in ids or len(ids) != 4:
-          questions_skipped += 1
-        else:
-          questions.append(np.array(ids))
-    print("Eval analogy file: ", self._options.eval_data)
-    print("Questions: ", len(questions))
-    print("Skipped: ", questions_skipped)
-    self._analogy_questions = np.array(questions, dtype=np.int32)
+    """Reads through the analogy question file, see analogy_eval."""
+    (self._analogy_questions, self._analogy_categories,
+     self._analogy_category_names) = analogy_eval.read_analogies(
+         self._options.eval_data, self._word2id)
 
   def build_graph(self):
     """Build the model graph."""
@@ -217,15 +229,10 @@ class Word2Vec(object):
     # Training nodes.
     inc = global_step.assign_add(1)
     with tf.control_dependencies([inc]):
-      train = word2vec.neg_train_word2vec(w_in,
-                                          w_out,
-                                          examples,
-                                          labels,
-                                          lr,
-                                          vocab_count=opts.vocab_counts.tolist(),
-                                          num_negative_samples=opts.num_samples)
+      train = self._train_op(w_in, w_out, examples, labels, lr)
 
     self._w_in = w_in
+    self._w_out = w_out
     self._examples = examples
     self._labels = labels
     self._lr = lr
@@ -234,6 +241,17 @@ class Word2Vec(object):
     self._epoch = current_epoch
     self._words = total_words_processed
 
+  def _train_op(self, w_in, w_out, examples, labels, lr):
+    """The op applying one step of in-place SGD for a batch of examples."""
+    opts = self._options
+    return word2vec.neg_train_word2vec(w_in,
+                                       w_out,
+                                       examples,
+                                       labels,
+                                       lr,
+                                       vocab_count=opts.vocab_counts.tolist(),
+                                       num_negative_samples=opts.num_samples)
+
   def save_vocab(self):
     """Save the vocabulary to a file so the model can be reloaded."""
     opts = self._options
@@ -258,9 +276,11 @@ class Word2Vec(object):
     analogy_a = tf.placeholder(dtype=tf.int32)  # [N]
     analogy_b = tf.placeholder(dtype=tf.int32)  # [N]
     analogy_c = tf.placeholder(dtype=tf.int32)  # [N]
+    analogy_d = tf.placeholder(dtype=tf.int32)  # [N]
 
-    # Normalized word embeddings of shape [vocab_size, emb_dim].
-    nemb = tf.nn.l2_normalize(self._w_in, 1)
+    # Normalized word embeddings of shape [vocab_size, emb_dim], as of the
+    # last refresh_normalized().
+    nemb, self._refresh_nemb = analogy_eval.normalized_snapshot(self._w_in)
 
     # Each row of a_emb, b_emb, c_emb is a word's embedding vector.
     # They all have the shape [N, emb_dim]
@@ -276,26 +296,21 @@ class Word2Vec(object):
     # dist has shape [N, vocab_size].
     dist = tf.matmul(target, nemb, transpose_b=True)
 
-    # For each question (row in dist), find the top 4 words.
-    _, pred_idx = tf.nn.top_k(dist, 4)
+    # Whether the nearest word other than a, b and c is d.
+    correct = analogy_eval.analogy_correct(dist, analogy_a, analogy_b,
+                                           analogy_c, analogy_d)
 
-    # Nodes for computing neighbors for a given word according to
-    # their cosine distance.
-    nearby_word = tf.placeholder(dtype=tf.int32)  # word id
-    nearby_emb = tf.gather(nemb, nearby_word)
-    nearby_dist = tf.matmul(nearby_emb, nemb, transpose_b=True)
-    nearby_val, nearby_idx = tf.nn.top_k(nearby_dist,
-                                         min(1000, opts.vocab_size))
+    # Nodes for batch nearby and analogy queries, see analogy_eval.
+    batch_query = analogy_eval.BatchQuery(nemb)
 
     # Nodes in the construct graph which are used by training and
     # evaluation to run/feed/fetch.
     self._analogy_a = analogy_a
     self._analogy_b = analogy_b
     self._analogy_c = analogy_c
-    self._analogy_pred_idx = pred_idx
-    self._nearby_word = nearby_word
-    self._nearby_val = nearby_val
-    self._nearby_idx = nearby_idx
+    self._analogy_d = analogy_d
+    self._analogy_correct = correct
+    self._batch_query = batch_query
 
     # Properly initialize all variables.
     tf.global_variables_initializer().run()
@@ -338,70 +353,82 @@ class Word2Vec(object):
 
     for t in workers:
       t.join()
+    self.refresh_normalized()
+
+  def refresh_normalized(self):
+    """Snapshots the normalized embeddings that eval and nearby read."""
+    self._session.run(self._refresh_nemb)
 
-  def _predict(self, analogy):
-    """Predict the top 4 answers for analogy questions."""
-    idx, = self._session.run([self._analogy_pred_idx], {
+  def export(self):
+    """Exports the embeddings for embeddings.Embeddings to load."""
+    emb, sm_w_t, step = self._session.run(
+        [self._w_in, self._w_out, self.global_step])
+    embeddings.export_model(self._options, emb, sm_w_t, step)
+
+  def _predict_correct(self, analogy):
+    """Whether the best answer to each analogy question is its 4th word."""
+    correct, = self._session.run([self._analogy_correct], {
         self._analogy_a: analogy[:, 0],
         self._analogy_b: analogy[:, 1],
-        self._analogy_c: analogy[:, 2]
+        self._analogy_c: analogy[:, 2],
+        self._analogy_d: analogy[:, 3]
     })
-    return idx
+    return correct
 
   def eval(self):
-    """Evaluate analogy questions and reports accuracy."""
-
-    # How many questions we get right at precision@1.
-    correct = 0
+    """Evaluate analogy questions and reports accuracy.
 
+    Returns:
+      A [n] bool vector, whether each question was answered correctly.
+    """
     try:
-      total = self._analogy_questions.shape[0]
+      questions = self._analogy_questions
     except AttributeError as e:
       raise AttributeError("Need to read analogy questions.")
+    return analogy_eval.evaluate(questions, self._analogy_categories,
+                                 self._analogy_category_names,
+                                 self._predict_correct)
+
+  def nearby_batch(self, words, num=20):
+    """The num nearest words of each word, by cosine similarity.
+
+    Args:
+      words: [n] word ids, or words as bytes; unknown words count as UNK.
+      num: neighbors per word, the word itself usually first.
+
+    Returns:
+      ids: int32 [n, num] word ids, best first.
+      scores: float32 [n, num] their cosine similarities.
+    """
+    ids = analogy_eval.word_ids(words, self._word2id)
+    return self._batch_query.run(self._session, ids, ids, ids, num)
+
+  def analogy_batch(self, analogies, num=1):
+    """The num best answers w3 to each w0:w1 vs w2:w3, other than w0..w2.
 
-    good_idx = []
-
-    start = 0
-    while start < total:
-      limit = start + 2500
-      sub = self._analogy_questions[start:limit, :]
-      idx = self._predict(sub)
-      start = limit
-      for i,question in enumerate(xrange(sub.shape[0])):
-        for j in xrange(4):
-          if idx[question, j] == sub[question, 3]:
-            # Bingo! We predicted correctly. E.g., [italy, rome, france, paris].
-            correct += 1
-            good_idx.append(i+(start-2500))
-            break
-          elif idx[question, j] in sub[question, :3]:
-            # We need to skip words already in the question.
-            continue
-          else:
-            # The correct label is not the precision@1
-            break
-    print(good_idx)
-    print("Eval %4d/%d accuracy = %4.1f%%" % (correct, total,
-                                              correct * 100.0 / total))
+    Args:
+      analogies: [n, 3] word ids, or words as bytes.
+      num: answers per analogy.
+
+    Returns:
+      ids: int32 [n, num] word ids, best first.
+      scores: float32 [n, num] their similarities to w2 + (w1 - w0).
+    """
+    q = analogy_eval.word_ids(analogies, self._word2id).reshape([-1, 3])
+    return self._batch_query.run(self._session, q[:, 0], q[:, 1], q[:, 2],
+                                 num, exclude=True)
 
   def analogy(self, w0, w1, w2):
     """Predict word w3 as in w0:w1 vs w2:w3."""
-    wid = np.array([[self._word2id.get(w, 0) for w in [w0, w1, w2]]])
-    idx = self._predict(wid)
-    for c in [self._id2word[i] for i in idx[0, :]]:
-      if c not in [w0, w1, w2]:
-        print(c)
-        break
-    print("unknown")
+    idx, _ = self.analogy_batch([[w0, w1, w2]])
+    print(self._id2word[idx[0, 0]])
 
   def nearby(self, words, num=20):
     """Prints out nearby words given a list of words."""
-    ids = np.array([self._word2id.get(x, 0) for x in words])
-    vals, idx = self._session.run(
-        [self._nearby_val, self._nearby_idx], {self._nearby_word: ids})
+    idx, vals = self.nearby_batch(words, num)
     for i in xrange(len(words)):
       print("\n%s\n=====================================" % (words[i]))
-      for (neighbor, distance) in zip(idx[i, :num], vals[i, :num]):
+      for (neighbor, distance) in zip(idx[i], vals[i]):
         print("%-20s %6.4f" % (self._id2word[neighbor], distance))
 
 
@@ -415,12 +442,43 @@ def _start_shell(local_ns=None):
   IPython.start_ipython(argv=[], user_ns=user_ns)
 
 
+def train_numpy(opts, relations=None):
+  """Trains with numpy_backend or hogwild instead of the custom ops."""
+  if opts.backend == "processes":
+    model = hogwild.Word2Vec(opts, relations)
+  else:
+    model = numpy_backend.Word2Vec(opts, relations)
+  model.read_analogies() # Read analogy questions
+  for _ in xrange(opts.epochs_to_train):
+    model.train()  # Process one epoch
+    model.eval()  # Eval analogies.
+  # Perform a final save.
+  model.save()
+  model.export()
+  if FLAGS.interactive:
+    # E.g.,
+    # [0]: model.analogy(b'france', b'paris', b'russia')
+    # [1]: model.nearby([b'proton', b'elephant', b'maxwell'])
+    _start_shell(locals())
+
+
+def check_ops(opts):
+  if opts.backend == "tf" and word2vec is None:
+    print("word2vec_ops.so not found: build it as README.md shows, "
+          "or use --backend=numpy.")
+    sys.exit(1)
+
+
 def main(_):
   """Train a word2vec model."""
   if not FLAGS.train_data or not FLAGS.eval_data or not FLAGS.save_path:
     print("--train_data --eval_data and --save_path must be specified.")
     sys.exit(1)
   opts = Options()
+  if opts.backend != "tf":
+    train_numpy(opts)
+    return
+  check_ops(opts)
   with tf.Graph().as_default(), tf.Session() as session:
     with tf.device("/cpu:0"):
       model = Word2Vec(opts, session)
@@ -431,6 +489,7 @@ def main(_):
     # Perform a final save.
     model.saver.save(session, os.path.join(opts.save_path, "model.ckpt"),
                      global_step=model.global_step)
+    model.export()
     if FLAGS.interactive:
       # E.g.,
       # [0]: model.analogy(b'france', b'paris', b'russia')
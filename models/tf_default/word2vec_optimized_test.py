@@ -36,6 +36,7 @@ class Word2VecTest(tf.test.TestCase):
     FLAGS.train_data = os.path.join(self.get_temp_dir() + "test-text.txt")
     FLAGS.eval_data = os.path.join(self.get_temp_dir() + "eval-text.txt")
     FLAGS.save_path = self.get_temp_dir()
+    FLAGS.backend = "tf"
     with open(FLAGS.train_data, "w") as f:
       f.write(
           """alice was beginning to get very tired of sitting by her sister on
@@ -57,6 +58,23 @@ class Word2VecTest(tf.test.TestCase):
     FLAGS.min_count = 0
     word2vec_optimized.main([])
 
+  def testWord2VecOptimizedNumpy(self):
+    FLAGS.backend = "numpy"
+    FLAGS.batch_size = 5
+    FLAGS.num_neg_samples = 10
+    FLAGS.epochs_to_train = 1
+    FLAGS.min_count = 0
+    word2vec_optimized.main([])
+
+  def testWord2VecOptimizedProcesses(self):
+    FLAGS.backend = "processes"
+    FLAGS.concurrent_steps = 2
+    FLAGS.batch_size = 5
+    FLAGS.num_neg_samples = 10
+    FLAGS.epochs_to_train = 1
+    FLAGS.min_count = 0
+    word2vec_optimized.main([])
+
 
 if __name__ == "__main__":
   tf.test.main()
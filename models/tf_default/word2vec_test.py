@@ -36,6 +36,9 @@ class Word2VecTest(tf.test.TestCase):
     FLAGS.train_data = os.path.join(self.get_temp_dir(), "test-text.txt")
     FLAGS.eval_data = os.path.join(self.get_temp_dir(), "eval-text.txt")
     FLAGS.save_path = self.get_temp_dir()
+    # The flag defaults, which testWord2VecLargeBatch changes.
+    FLAGS.lr_scaling = "none"
+    FLAGS.lr_warmup_words = 0
     with open(FLAGS.train_data, "w") as f:
       f.write(
           """alice was beginning to get very tired of sitting by her sister on
@@ -57,6 +60,15 @@ class Word2VecTest(tf.test.TestCase):
     FLAGS.min_count = 0
     word2vec.main([])
 
+  def testWord2VecLargeBatch(self):
+    FLAGS.batch_size = 64
+    FLAGS.lr_scaling = "sqrt"
+    FLAGS.lr_warmup_words = 50
+    FLAGS.num_neg_samples = 10
+    FLAGS.epochs_to_train = 1
+    FLAGS.min_count = 0
+    word2vec.main([])
+
 
 if __name__ == "__main__":
   tf.test.main()